@@ -1,5 +1,3 @@
-from linkedin_api import Linkedin
-from linkedin_api.client import ChallengeException
 """
 Tom-quirk Linkedin API wrapper
 https://linkedin-api.readthedocs.io/en/latest/api.html
@@ -9,16 +7,33 @@ https://github.com/tomquirk/linkedin-api
 from data import (
     get_offset,
     profile_data_try,
+    job_data_try,
     jsonSetCombiner,
+    job_jsonSetCombiner,
     update_json,
-    get_unchecked_profiles,
     add_search_to_main,
     job_data_search,
-    get_unscraped_jobs,
-    divide_list,
-    get_unchecked_companies,
     company_data_agg,
-    company_jsonSetCombiner
+    company_jsonSetCombiner,
+    get_company_urn,
+    get_job_urn
+    )
+
+from metrics import (
+    MetricsRegistry,
+    instrument_client
+    )
+
+from profiling import (
+    Profiler,
+    profiled
+    )
+
+from tracing import Tracer
+
+from store import (
+    JsonStore,
+    open_file
     )
 
 from proxies import (
@@ -26,9 +41,7 @@ from proxies import (
     close_proxies
     )
 
-from challenge import login as challenge_login
 import logging
-import json
 from time import sleep, time
 import random
 import queue
@@ -39,6 +52,41 @@ logger = logging.getLogger(__name__)
 class NoAvailableLoginsException(Exception):
     pass
 
+
+class WorkQueue(queue.Queue):
+    """
+    Pending items shared by the scraping threads, each thread pulls its next item
+    from here so a slow or blocked login doesn't hold on to a share of the work.
+    An item that errors is put back once for another login to try, after that
+    it's dropped until the next run
+    """
+
+    _MAX_ATTEMPTS_ = 2
+
+    def __init__(self, items):
+        super().__init__()
+        self.attempts = {}
+        for item in items:
+            self.put(item)
+
+    def retry(self, item):
+        """
+        :rtype bool
+        :return True if the item was put back
+        """
+
+        with self.mutex:
+            self.attempts[item] = self.attempts.get(item, 1) + 1
+            attempts = self.attempts[item]
+        if attempts > self._MAX_ATTEMPTS_:
+            return False
+        self.put(item)
+        return True
+
+def evade_delay():
+    return 30 + random.random()*3.5
+
+
 def default_evade():
     """
     Rather long random sleep method, this is to try and evade Linkedin Bot detection
@@ -46,7 +94,46 @@ def default_evade():
     waiting
     """
 
-    sleep(30 + random.random()*3.5)
+    sleep(evade_delay())
+
+
+def linkedin_client(username, password, **kwargs):
+    """
+    Default client_factory, linkedin_api (and requests with it) is only imported
+    once a client is needed, importing this module stays cheap
+
+    :rtype linkedin_api.Linkedin
+    """
+
+    from linkedin_api import Linkedin
+    return Linkedin(username, password, **kwargs)
+
+
+def search_pages(search, keyword, offset=0, limit=-1, page_size=49):
+    """
+    Pages through one of the api's search methods instead of letting it collect
+    every result before returning. Each call asks for at most one page
+
+    :param 'search' function - api.search_people/api.search_jobs
+    :param 'keyword' str
+    :param 'offset' int - where to start
+    :param 'limit' int - max results over all pages, -1 for everything
+    :param 'page_size' int - results per request
+    :rtype generator
+    :return (offset of the page, page of results)
+    """
+
+    fetched = 0
+    while limit < 0 or fetched < limit:
+        count = page_size if limit < 0 else min(page_size, limit - fetched)
+        page = search(keyword, offset=offset, limit=count)
+        if not page:
+            return
+        yield offset, page
+        offset += len(page)
+        fetched += len(page)
+        if len(page) < count:
+            return
 
     
 class Linkedin_scraper(object):
@@ -64,48 +151,165 @@ class Linkedin_scraper(object):
     _PATH_TO_CONFIG_ = "config.json"
     _PATH_TO_LOGINS_ = "input.txt"
 
+    # results per request when streaming searches, the api's max search count
+    _SEARCH_PAGE_SIZE_ = 49
+
     def __init__(
         self,
         *,
         config=None,
         use_proxies=True,
         debug=False,
-        new_logins=False
+        new_logins=False,
+        journal=False,
+        store=None,
+        client_factory=linkedin_client,
+        evade=default_evade,
+        engine="threads",
+        engine_threads=4,
+        cache=None,
+        compact_records=False,
+        lazy=False,
+        codec="json-indent",
+        metrics=None,
+        profile=None,
+        trace=None,
+        shards=None,
+        leases=None,
+        quota=None
     ):
-        """Constructor"""
+        """
+        Constructor
+
+        :param 'journal' bool - append changed records to a journal file instead of
+            rewriting the data files on every write_files(), see journal.py. Per-item
+            commits go through the journal either way, see commit_files()
+        :param 'store' JsonStore/SqliteStore - where state is kept, defaults to the
+            json files, see store.py
+        :param 'client_factory' callable - builds the api client, called like
+            Linkedin(username, password, proxies=, debug=), see replay.py for an offline one
+        :param 'evade' callable - sleep between profile visits
+        :param 'engine' str - "threads" runs a thread per login (thread_scraping), "asyncio"
+            runs every login on one event loop, see async_engine.py
+        :param 'engine_threads' int - thread pool size of the asyncio engine
+        :param 'cache' ResponseCache - raw responses are served from here before a
+            login's quota is spent on them, see cache.py. None to always fetch
+        :param 'compact_records' bool - keep profiles in memory as compact records
+            instead of dicts, see records.py. json store only
+        :param 'lazy' bool - memory-map the data files and parse records as they're used,
+            job data is only opened by the job/company methods, see lazy.py. json store only
+        :param 'codec' str/dict - format the data/config files are written in, "json-indent"
+            (default), "json", "orjson" or "msgpack", see codec.py. json store only
+        :param 'metrics' MetricsRegistry - request/pipeline metrics, exported at the end of
+            every phase if it has a directory, see metrics.py. One is made if not given
+        :param 'profile' str - directory for cProfile/tracemalloc reports of every stage,
+            written at the end of every phase, see profiling.py. None to not profile
+        :param 'trace' str - file to write a Chrome trace-event timeline of the api calls,
+            parsing, commits and sleeps to, see tracing.py. None to not trace
+        :param 'shards' int - split the data files into this many shard files by key, only
+            the shards with changes get rewritten, see shards.py. json store only
+        :param 'leases' LeaseManager - claim pending items a batch at a time under a lease
+            instead of scraping every pending item, so several processes can share one
+            sqlite store, see leasing.py. None for a single process
+        :param 'quota' QuotaLedger - every profile visit reserves and commits against the
+            login's quota over a rolling 24h window, shared by threads and processes on the
+            same ledger file, see quota.py. None counts in config["logins"] only
+        """
 
         logging.basicConfig(level=logging.DEBUG if debug else logging.INFO)
         logging.getLogger("botocore").setLevel(logging.CRITICAL) #botocore logger has a lot to say
         self.logger = logger
-        
-        self.logger.info("Accessing profile datafile")
-        self.profile_data = self.open_file(self._PATH_TO_PROFILE_DATA_)
 
-        self.logger.info("Accessing job datafile")
-        self.job_data = self.open_file(self._PATH_TO_JOB_DATA_)
+        self.use_proxies = use_proxies
+        self.debug = debug
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.client_factory = instrument_client(client_factory, self.metrics)
+        self.evade = evade
+        self.profiler = Profiler(profile, logger=self.logger)
+        self.tracer = Tracer(trace, logger=self.logger)
+
+        self._records_ingested = self.metrics.counter("records_ingested_total", "records merged into the store")
+        self._cache_lookups = self.metrics.counter("response_cache_total", "response cache lookups by result")
+        self._write_seconds = self.metrics.histogram("write_files_seconds", "write_files duration")
+        self._commit_seconds = self.metrics.histogram("commit_files_seconds", "commit_files duration")
+        self._open_seconds = self.metrics.histogram("open_file_seconds", "state file load duration")
+
+        if engine not in ("threads", "asyncio"):
+            raise ValueError(f"Unknown engine {engine}")
+        self.engine = engine
+        self.engine_threads = engine_threads
+        self.cache = cache
+        self.leases = leases
+
+        self.quota = quota
+        if quota is not None:
+            quota.limits = {"profile_visits": self._PROFILE_LIMIT_TOTAL__, "searches": self._SEARCH_LIMIT_TOTAL_, **quota.limits}
+        # login -> open quota reservation, a login has one request in flight at a time
+        self._reservations = {}
+
+        if store is None:
+            with self._open_seconds.time(file="store"):
+                store = JsonStore(
+                    self._PATH_TO_PROFILE_DATA_,
+                    self._PATH_TO_JOB_DATA_,
+                    self._PATH_TO_CONFIG_,
+                    journal=journal,
+                    compact_records=compact_records,
+                    lazy=lazy,
+                    codec=codec,
+                    shards=shards,
+                    logger=self.logger
+                    )
+        self.store = store
+
+        # scraping threads commit every item through commit_*(), one at a time
+        self._commit_lock = threading.Lock()
+        self._stop_event = threading.Event()
 
         if not config:
-            if not self.open_file(self._PATH_TO_CONFIG_):
+            if not self.store.load_config():
                 #if getting error, must populate input.txt file with usernames and passwords
                 self.construct_config_file()
-            self.config = self.open_file(self._PATH_TO_CONFIG_)
+            self.config = self.store.load_config()
+        else:
+            self.config = config
 
         self.new_day()
-
-        self.use_proxies = use_proxies
-        self.debug = debug
         
         if new_logins:
             self.proxy_logins()
 
 
-    def search_profiles(self, keyword, limit=-1 ):
+    # profile/job data live in the store, these keep self.profile_data/self.job_data working
+    @property
+    def profile_data(self):
+        return self.store.profile_data
+
+    @profile_data.setter
+    def profile_data(self, value):
+        self.store.profile_data = value
+
+    @property
+    def job_data(self):
+        return self.store.job_data
+
+    @job_data.setter
+    def job_data(self, value):
+        self.store.job_data = value
+
+
+    @profiled("search_profiles")
+    def search_profiles(self, keyword, limit=-1, stream=False):
         """
         This method searches for profiles regarding the keyword, aggregates
         data from multiple searches efficiently using the offset feature.
         Creates proxy servers at beginning and deletes once one is used, doesn't
         use threading because of offset functionality
 
+        With stream=True results are requested a page at a time (see search_pages), every
+        page is merged, the keyword offset advanced and the files written before the next
+        one is requested. Memory stays at one page and a crash loses at most one page
+
         It's worth noting that further functionality can be achieved with this method and others
         paramters such as network distance, company, etc..
         see https://linkedin-api.readthedocs.io/en/latest/api.html#linkedin_api.Linkedin.search_people
@@ -118,7 +322,7 @@ class Linkedin_scraper(object):
         for index, email in enumerate(logins):
         
             #add use_cookies checker
-            api = Linkedin(email, '',
+            api = self.client_factory(email, '',
                 proxies=proxies[index],
                 debug=self.debug,
                 )
@@ -127,72 +331,347 @@ class Linkedin_scraper(object):
 
             offset = get_offset(self.config, keyword, "profile_keyword")
 
-            search_data = api.search_people(keyword, offset=offset, limit=limit)
-
-            self.updateConfig({"profile_keyword": {keyword: (offset+len(search_data))}}, email=email, searches=self._SEARCH_LIMIT_TOTAL_)
+            if stream:
+                found = 0
+                search = self.tracer.wrap(api.search_people, "search_people", "api", login=email, item=keyword)
+                for page_offset, page in search_pages(search, keyword, offset, limit, self._SEARCH_PAGE_SIZE_):
+                    self.add_profile_page(page, email)
+                    self.updateConfig({"profile_keyword": {keyword: (page_offset+len(page))}})
+                    self.commit_files()
+                    found += len(page)
+                self.use_searches(email)
+                close_proxies([instance_id[index]], self.use_proxies, self.logger)
+                if found < 3:
+                    self.logger.info(f"{keyword}, all results scraped")
+                    break
+                continue
+
+            with self.tracer.span("search_people", "api", login=email, item=keyword):
+                search_data = api.search_people(keyword, offset=offset, limit=limit)
+
+            self.updateConfig({"profile_keyword": {keyword: (offset+len(search_data))}})
+            self.use_searches(email)
 
             # when offset var offset gets too big, skips too many results
             if len(search_data) < 3:
                 self.logger.info(f"{keyword}, all results scraped")
                 break
 
-            #pulls methods from data.py and uses self.profile_Data, also updates file and self.profile_Data
-            self.profile_data = add_search_to_main(self.profile_data, search_data, email)
+            self.add_profile_page(search_data, email)
 
-            close_proxies([instance_id[index]], self.logger)
+            close_proxies([instance_id[index]], self.use_proxies, self.logger)
         self.write_files()
+        self.end_phase(["profiles"])
+
+
+    def add_profile_page(self, search_data, email):
+        """
+        Dedupes search results against stored profiles and merges the new ones
+
+        :param 'search_data' list[dict] - search_people results
+        :param 'email' str - login that searched
+        :rtype list[str]
+        :return public_ids that weren't stored yet
+        """
+
+        new_ids = [item["public_id"] for item in search_data if not self.profile_data or item["public_id"] not in self.profile_data]
+
+        #pulls methods from data.py and uses self.profile_Data, also updates file and self.profile_Data
+        with self.profiler.stage("add_search_to_main"):
+            self.profile_data = add_search_to_main(self.profile_data, search_data, email, pending=self.store.pending)
+        self.store.mark("profile_data", new_ids)
+        self._records_ingested.inc(len(new_ids), kind="profiles")
+        return new_ids
+
+
+    def next_items(self, login, work_queue):
+        """
+        Hands a scraping thread items off the shared queue for as long as its login
+        has profile visits left. Stops when the queue is empty or the quota is used up
+
+        :param 'login' str
+        :param 'work_queue' WorkQueue
+        :rtype generator
+        """
+
+        while self.reserve_visit(login):
+            if self._stop_event.is_set():
+                self.refund_visit(login)
+                return
+            try:
+                item = work_queue.get_nowait()
+            except queue.Empty:
+                self.refund_visit(login)
+                return
+            yield item
+        self.logger.info(f"{login} is out of profile visits")
+
+
+    def reserve_visit(self, login):
+        """
+        Takes one of the login's profile visits before a request, with a quota ledger the
+        visit is reserved until commit_*() or refund_visit()
+
+        :rtype bool
+        :return False if the login is out of profile visits
+        """
+
+        if self.quota is None:
+            return self.email_checker(login, 1)
+        reservation = self.quota.reserve(login, "profile_visits")
+        if reservation is None:
+            return False
+        self._reservations[login] = reservation
+        return True
+
+
+    def refund_visit(self, login):
+        """
+        Gives back the visit reserve_visit() took, the request failed or wasn't made
+        """
+
+        reservation = self._reservations.pop(login, None)
+        if reservation is not None:
+            self.quota.refund(reservation)
+
+
+    def spend_visit(self, login, visits):
+        """
+        Counts the visit of a request that reached linkedin but whose response couldn't be
+        parsed or committed, the login spent it all the same. Nothing happens if commit_*()
+        already counted it before failing
+
+        :param 'visits' int - the login's profile_visits before the commit, only the login's
+            own thread/task moves it
+        """
+
+        with self._commit_lock:
+            if self.config["logins"][login]["profile_visits"] == visits:
+                self._count_visit(login)
+
+
+    def _count_visit(self, login):
+        # commit lock held by the caller
+        self.config["logins"][login]["profile_visits"] += 1
+        reservation = self._reservations.pop(login, None)
+        if reservation is not None:
+            self.quota.commit(reservation)
+
+
+    def use_searches(self, email):
+        """
+        A search uses up the login's searches for the day
+        """
+
+        self.updateConfig(email=email, searches=self._SEARCH_LIMIT_TOTAL_)
+        if self.quota is not None:
+            self.quota.spend(email, "searches", None)
+
+
+    def commit_profile(self, login, scraped):
+        """
+        Merges one scraped profile into the store and persists it together with the
+        login's profile_visits, so an interrupted run loses at most the request in flight
+        and the next run picks up at the next unchecked profile. Called from the
+        scraping threads, only the changed records are written (see commit_files)
+
+        :param 'login' str
+        :param 'scraped' dict - profile_data_try output
+        """
+
+        with self._commit_lock:
+            self._merge_profile(scraped)
+            self._records_ingested.inc(kind="profiles")
+            self._count_visit(login)
+            self.commit_files()
+            self.commit_leases("profiles", scraped)
+
+
+    def _merge_profile(self, scraped):
+        with self.profiler.stage("jsonSetCombiner"):
+            self.profile_data = jsonSetCombiner(self.profile_data, [scraped], pending=self.store.pending)
+        self.store.mark("profile_data", scraped)
+
+
+    def commit_job(self, login, scraped):
+        """
+        Same as commit_profile for a scraped job listing
+
+        :param 'scraped' dict - job_data_try output
+        """
+
+        with self._commit_lock:
+            self._merge_job(scraped)
+            self._records_ingested.inc(kind="jobs")
+            self._count_visit(login)
+            self.commit_files()
+            self.commit_leases("jobs", scraped)
+
+
+    def _merge_job(self, scraped):
+        companies = [self.store.pending.job_company(job) for job in scraped]
+        self.store.mark("job_data", [company for company in companies if company is not None])
+        with self.profiler.stage("job_jsonSetCombiner"):
+            self.job_data = job_jsonSetCombiner(self.job_data, [scraped], pending=self.store.pending)
+
+
+    def commit_company(self, login, scraped):
+        """
+        Same as commit_profile for a scraped company
+
+        :param 'scraped' dict - company_data_agg output
+        """
+
+        with self._commit_lock:
+            self._merge_company(scraped)
+            self._records_ingested.inc(kind="companies")
+            self._count_visit(login)
+            self.commit_files()
+            self.commit_leases("companies", scraped)
+
 
+    def _merge_company(self, scraped):
+        with self.profiler.stage("company_jsonSetCombiner"):
+            self.job_data = company_jsonSetCombiner(self.job_data, [scraped], pending=self.store.pending)
+        self.store.mark("job_data", scraped)
 
-    def scrape_profiles_base(self, login, proxy, unchecked, result_queue):
+
+    def parse_and_commit(self, login, item, raw, parse, commit):
+        """
+        Parses a fetched response and commits it. If either raises, the request still
+        counts against the login (see spend_visit) and the item stays pending for the
+        next run, a response that doesn't parse would only fail again
+
+        :param 'raw' dict - api response
+        :param 'parse' callable - profile_data_try/job_data_try/company_data_agg, (raw, item)
+        :param 'commit' callable - commit_profile/commit_job/commit_company
+        :rtype bool
+        :return False if it failed, the login's thread stops like on a request error
+        """
+
+        visits = self.config["logins"][login]["profile_visits"]
+        try:
+            with self.tracer.span("parse", "parse", login=login, item=item):
+                scraped = parse(raw, item)
+            with self.tracer.span("commit", "persist", login=login, item=item):
+                commit(login, scraped)
+        except Exception as e:
+            self.logger.warning(f"{login} couldn't parse/commit {item}: {e!r}, stopping")
+            self.spend_visit(login, visits)
+            return False
+        return True
+
+
+    def commit_leases(self, kind, items):
+        """
+        Drops the leases of committed items, if the work is leased
+        """
+
+        if self.leases is not None:
+            self.leases.commit(kind, items)
+
+
+    def cache_response(self, endpoint, id, response):
+        """
+        Keeps a freshly fetched response in the response cache, if there is one
+        """
+
+        if self.cache is not None:
+            self.cache.put(endpoint, id, response)
+
+
+    def serve_cached(self, kind, unchecked):
+        """
+        Commits every unchecked item that has a fresh cached response without
+        spending any login's quota on it
+
+        :param 'kind' str - "profiles"/"jobs"/"companies"
+        :param 'unchecked' list
+        :rtype list
+        :return the items that still need fetching
+        """
+
+        if self.cache is None:
+            return unchecked
+
+        endpoint, parse, merge = {
+            "profiles": ("get_profile", profile_data_try, self._merge_profile),
+            "jobs": ("get_job", job_data_try, self._merge_job),
+            "companies": ("get_company", lambda raw, urn: company_data_agg(raw, urn, {}), self._merge_company),
+            }[kind]
+
+        remaining = []
+        served = 0
+        with self._commit_lock:
+            for item in unchecked:
+                raw = self.cache.get(endpoint, item)
+                if raw is None:
+                    remaining.append(item)
+                    continue
+                merge(parse(raw, item))
+                served += 1
+            if served:
+                self.commit_files()
+        self._records_ingested.inc(served, kind=kind)
+        self._cache_lookups.inc(served, endpoint=endpoint, result="hit")
+        self._cache_lookups.inc(len(remaining), endpoint=endpoint, result="miss")
+        self.logger.info(f"Served {served} {kind} from the response cache, {len(remaining)} left to fetch")
+        self.logger.debug(f"Response cache: {self.cache.stats()}")
+        return remaining
+
+
+    @profiled("scrape_profiles_base")
+    def scrape_profiles_base(self, login, proxy, work_queue):
         """
         This is called from thread_scraping() only, while this scraper is technically setup
         to run without using scrapers, doing so using this method with the current implemention
         would be incredibily stupid, Linkedin would essentially see tons of requests coming from
         the same IP address, and from a bunch of different accounts.
 
-        is served unchecked profiles from thread_scraping method()
-        iterates through profile/public_ids - requesting their profile data
-        extracts key details from raw search data, stores it locally
-        returns its portion of task to result_queue
+        pulls unchecked profiles off the shared work_queue from thread_scraping method()
+        while it has quota, requesting their profile data
+        extracts key details from raw search data, commits each one as it comes in
 
         profile data needs to be converted to dict,
         ^hardest part probs^
         """
 
-        if not unchecked:
-            return
-
-        profile_visits = self.config["logins"][login]["profile_visits"]
-
-        api = Linkedin(login, '',
+        api = self.client_factory(login, '',
             proxies=proxy,
             debug=self.debug
             )
 
-        ret = {}
-        for profile in unchecked:
-
-            scrape_data = api.get_profile(profile)
-            ret.update(profile_data_try(scrape_data, profile))
-            profile_visits+=1
+        for profile in self.next_items(login, work_queue):
 
-            default_evade()
+            try:
+                with self.tracer.span("get_profile", "api", login=login, item=profile):
+                    scrape_data = api.get_profile(profile)
+            except Exception as e:
+                self.logger.info(f"{login} had error {e} on {profile}, stopping")
+                self.refund_visit(login)
+                work_queue.retry(profile)
+                break
+            self.cache_response("get_profile", profile, scrape_data)
+            if not self.parse_and_commit(login, profile, scrape_data, profile_data_try, self.commit_profile):
+                break
 
-        self.config["logins"][login]["profile_visits"] = profile_visits
-        result_queue.put(ret)
+            with self.tracer.span("evade", "sleep", login=login):
+                self.evade()
 
 
     def scrape_profiles(self):
-        unchecked = get_unchecked_profiles(self.profile_data)
-        logins = self.get_available_logins(2)
+        unchecked = self.serve_cached("profiles", self.store.pending_profiles())
+        logins = self.get_available_logins(1)
         if unchecked and logins:
-            self.profile_data = jsonSetCombiner(self.profile_data, self.thread_scraping(self.scrape_profiles_base, unchecked, logins))
+            self.run_scraping("profiles", self.scrape_profiles_base, unchecked, logins)
             self.write_files()
         else:
             self.logger.debug(f"Logins: {logins}, Unchecked Profiles: {unchecked}")
+        self.end_phase(["profiles"])
         
 
-    def search_jobs(self, keyword, limit=-1):
+    @profiled("search_jobs")
+    def search_jobs(self, keyword, limit=-1, stream=False):
         """
         Nearly Identical to search_profiles method. Searches for any and all job listings
         related to the keyword. spins up proxies 
@@ -203,6 +682,7 @@ class Linkedin_scraper(object):
         see https://linkedin-api.readthedocs.io/en/latest/api.html#linkedin_api.Linkedin.search_jobs
 
         :param 'keyword' str
+        :param 'stream' bool - page at a time, starting from the stored offset, see search_profiles
         """
 
         self.logger.info("Commencing Job Search")
@@ -212,23 +692,55 @@ class Linkedin_scraper(object):
         proxies, instance_ids = start_proxies(len(logins), self.use_proxies, self.logger)
 
         for index, email in enumerate(logins):
-            api = Linkedin(email, '',
+            api = self.client_factory(email, '',
                 debug=self.debug,
                 proxies=proxies[index]
             )
 
             self.logger.info(f"{email} searching for {keyword} related jobs")
+
+            if stream:
+                offset = get_offset(self.config, keyword, "job_keyword")
+                search = self.tracer.wrap(api.search_jobs, "search_jobs", "api", login=email, item=keyword)
+                for page_offset, page in search_pages(search, keyword, offset, limit, self._SEARCH_PAGE_SIZE_):
+                    self.add_job_page(page)
+                    self.updateConfig({"job_keyword": {keyword: (page_offset+len(page))}})
+                    self.commit_files()
+                self.use_searches(email)
+                close_proxies([instance_ids[index]], self.use_proxies, self.logger)
+                continue
             
-            search_data = api.search_jobs(keyword, limit=limit )#, offset=offset)
+            with self.tracer.span("search_jobs", "api", login=email, item=keyword):
+                search_data = api.search_jobs(keyword, limit=limit )#, offset=offset)
 
-            self.updateConfig({"job_keyword": {keyword: (offset+len(search_data))}}, email=email, searches=self._SEARCH_LIMIT_TOTAL_)
-            self.job_data = job_data_search(self.job_data, search_data)
-            close_proxies([instance_ids[index]], self.logger)
+            self.updateConfig({"job_keyword": {keyword: (offset+len(search_data))}})
+            self.use_searches(email)
+            self.add_job_page(search_data)
+            close_proxies([instance_ids[index]], self.use_proxies, self.logger)
 
         self.write_files()
+        self.end_phase(["jobs", "companies"])
+
+
+    def add_job_page(self, search_data):
+        """
+        Formats job search results and merges them into the stored job data
+
+        :param 'search_data' list[dict] - search_jobs results
+        :rtype list[str]
+        :return job urns that weren't stored yet
+        """
+
+        new_jobs = list(dict.fromkeys(get_job_urn(slice) for slice in search_data if get_job_urn(slice) not in self.store.job_urns))
+        with self.profiler.stage("job_data_search"):
+            self.job_data = job_data_search(self.job_data, search_data, pending=self.store.pending, job_urns=self.store.job_urns)
+        self.store.mark("job_data", [get_company_urn(slice) for slice in search_data])
+        self._records_ingested.inc(len(new_jobs), kind="jobs")
+        return new_jobs
 
             
-    def scrape_jobs_base(self, login, proxy, unchecked, result_queue):
+    @profiled("scrape_jobs_base")
+    def scrape_jobs_base(self, login, proxy, work_queue):
         """
         Again very similar to the scrape_profiles_base function. wont go into it here.
         
@@ -241,145 +753,252 @@ class Linkedin_scraper(object):
         see https://linkedin-api.readthedocs.io/en/latest/api.html#linkedin_api.Linkedin.get_job
         """
 
-        if not unchecked:
-            return
-
-        profile_visits = self.config["logins"][login]["profile_visits"]
-
-        api = Linkedin(login, '', 
+        api = self.client_factory(login, '', 
             debug=True,
             proxies=proxy
         )
 
-        ret = {}
-        for job in unchecked:
-
-            search_data = api.get_job(job)
-            ret.update(search_data)
-            profile_visits+=1
+        for job in self.next_items(login, work_queue):
 
-            default_evade()
+            try:
+                with self.tracer.span("get_job", "api", login=login, item=job):
+                    search_data = api.get_job(job)
+            except Exception as e:
+                self.logger.info(f"{login} had error {e} on {job}, stopping")
+                self.refund_visit(login)
+                work_queue.retry(job)
+                break
+            self.cache_response("get_job", job, search_data)
+            if not self.parse_and_commit(login, job, search_data, job_data_try, self.commit_job):
+                break
 
-        self.config["logins"][login]["profile_visits"] = profile_visits
-        result_queue.put(ret)
+            with self.tracer.span("evade", "sleep", login=login):
+                self.evade()
 
 
     def scrape_jobs(self):
-        unchecked = get_unscraped_jobs(self.job_data)
+        unchecked = self.serve_cached("jobs", self.store.pending_jobs())
         logins = self.get_available_logins(1)
         if unchecked and logins:
-            self.job_data = jsonSetCombiner(self.job_data, self.thread_scraping(self.scrape_jobs_base, unchecked, logins))
+            self.run_scraping("jobs", self.scrape_jobs_base, unchecked, logins)
             self.write_files()
         else:
             self.logger.debug(f"Logins: {logins}, Unchecked Jobs: {unchecked}")
+        self.end_phase(["jobs"])
 
 
-    def scrape_companies_base(self, login, proxy, unchecked, result_queue):
-        if not unchecked:
-            return 
-    
-        profile_visits = self.config["logins"][login]["profile_visits"]
-
-        api = Linkedin(login, '', 
+    @profiled("scrape_companies_base")
+    def scrape_companies_base(self, login, proxy, work_queue):
+        api = self.client_factory(login, '', 
             debug=True,
             proxies=proxy
         )
 
-        ret = {}
-        for company in unchecked:
-            scrape_data = api.get_company(company)
-            ret.update(company_data_agg(scrape_data, company, ret))
-            profile_visits+=1
-
-        self.config["logins"][login]["profile_visits"] = profile_visits
-        result_queue.put(ret)
+        for company in self.next_items(login, work_queue):
+            try:
+                with self.tracer.span("get_company", "api", login=login, item=company):
+                    scrape_data = api.get_company(company)
+            except Exception as e:
+                self.logger.info(f"{login} had error {e} on {company}, stopping")
+                self.refund_visit(login)
+                work_queue.retry(company)
+                break
+            self.cache_response("get_company", company, scrape_data)
+            if not self.parse_and_commit(login, company, scrape_data, lambda raw, urn: company_data_agg(raw, urn, {}), self.commit_company):
+                break
 
 
     def scrape_companies(self):
-        unchecked = get_unchecked_companies(self.job_data)
+        unchecked = self.serve_cached("companies", self.store.pending_companies())
         logins = self.get_available_logins(1)
         if unchecked and logins:
-            self.job_data = company_jsonSetCombiner(self.job_data, self.thread_scraping(self.scrape_companies_base, unchecked, logins))
+            self.run_scraping("companies", self.scrape_companies_base, unchecked, logins)
             self.write_files()
         else:
             self.logger.debug(f"Logins: {logins}, Unchecked Companies: {unchecked}")
+        self.end_phase(["companies"])
         
 
+    def run_scraping(self, kind, function, unchecked, logins):
+        """
+        Runs a scrape phase on the configured engine
+
+        :param 'kind' str - "profiles"/"jobs"/"companies"
+        :param 'function' - scrape_*_base for the threaded engine
+        """
+
+        if self.leases is not None:
+            # other processes work off the same pending items, they're claimed as the logins get to them
+            work_queue = self.leases.queue(kind)
+            try:
+                self._run_engine(kind, function, work_queue, logins)
+            finally:
+                work_queue.close()
+            return
+        self._run_engine(kind, function, unchecked, logins)
+
+
+    def _run_engine(self, kind, function, unchecked, logins):
+        if self.engine == "threads":
+            self.thread_scraping(function, unchecked, logins)
+            return
+
+        # asyncio is ~40ms of import, only paid for by the asyncio engine
+        from async_engine import AsyncEngine
+
+        proxies, instance_ids = start_proxies(len(logins), self.use_proxies, self.logger)
+        try:
+            with self.profiler.stage(f"scrape_{kind}_asyncio"):
+                AsyncEngine(self, self.engine_threads).run(kind, unchecked, logins, proxies)
+        finally:
+            close_proxies(instance_ids, self.use_proxies, self.logger)
+
+
+    def run_pipeline(self, profile_keywords=(), job_keywords=(), limit=-1, queue_size=100):
+        """
+        Searches and scrapes at once instead of phase by phase, new profiles, job
+        listings and companies from the searches go straight to the logins' scraping
+        threads through bounded queues, see pipeline.py
+
+        :param 'profile_keywords' list[str]
+        :param 'job_keywords' list[str]
+        :param 'limit' int - max results per keyword and login, -1 for everything
+        :param 'queue_size' int - items queued per kind before the searches wait
+        """
+
+        from pipeline import Pipeline
+        Pipeline(self, queue_size).run(profile_keywords, job_keywords, limit)
+
+
     def thread_scraping(self, function, unchecked, logins):
         """
         This function uses multi-threading to 'concurrently' run
         different scraper instances. Distributes egress traffic through
         ec2 proxies, threading saves on time and costs for ec2 instances
 
+        The unchecked items go on one shared WorkQueue, every login's thread keeps
+        pulling from it until it runs out of quota or the queue is empty, so the
+        work spreads over whatever capacity the logins have
+
         Since many instances writing to the same file can be a problem, I 
-        had setup a temp file system (legacy). But I haven't tested multiple
-        instances writing to the same variable (self.profile_data/self.job_data)
-        so the data is stored using queue, and aggregated one level above this at
-        the 
+        had setup a temp file system (legacy). The threads don't write files
+        themselves, every scraped item goes through commit_*() which merges and
+        persists it under a lock
+
+        Ctrl-C stops the threads after the item they're working on, everything
+        committed so far is on disk and the next run carries on from there
         """
 
         len_logins = len(logins)
 
         proxies, instance_ids = start_proxies(len_logins, self.use_proxies, self.logger)
-        divided_list = divide_list(unchecked, len_logins)
+        # a LeaseQueue when the work is leased, see run_scraping
+        work_queue = unchecked if hasattr(unchecked, "get_nowait") else WorkQueue(unchecked)
 
         threads = []
-        result_queue = queue.Queue()
         for index, login in enumerate(logins):
-            threads.append(threading.Thread(target=function, args=(login, proxies[index], divided_list[index], result_queue)))
+            threads.append(threading.Thread(target=function, args=(login, proxies[index], work_queue), name=login))
         for thread in threads:
             thread.start()
-        for thread in threads:
-            thread.join()
-
-        close_proxies(instance_ids, self.logger)
-
-        results = []
-        while not result_queue.empty():
-            result = result_queue.get()
-            results.append(result)
-
-        return results
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            self.logger.info("Stopping, waiting for threads to finish their current item")
+            self._stop_event.set()
+            for thread in threads:
+                thread.join()
+            raise
+        finally:
+            self._stop_event.clear()
+            close_proxies(instance_ids, self.use_proxies, self.logger)
     
 
     def open_file(self, _path_):
         """
-        Catches errors upon first start
+        Catches errors upon first start, see store.open_file
         
         :param '__path__' str - path to local file
         :rtype: bool/Json
         :return if error False - else JSON
         """
 
-        try:
-            with open(_path_, 'r') as f:
-                return json.loads(f.read())
-        except FileNotFoundError:
-            #initiate file
-            with open(_path_, 'w') as f:
-                self.logger.info(f"Making {_path_} file")
-                pass
-            return False
-        except json.JSONDecodeError:
-            return False
+        with self._open_seconds.time(file=_path_):
+            return open_file(_path_, self.logger)
 
 
     def write_files(self):
         """
         This method simply updates the relevent config and 
         state-store files with the current state of the scraper
+
+        In journal mode only the records marked dirty are appended to the
+        journals, which get compacted once they outgrow the snapshot
         """
 
-        if self.profile_data:
-            with open(self._PATH_TO_PROFILE_DATA_, 'w') as f:
-                f.write(json.dumps(self.profile_data, indent=4))
-        if self.job_data:
-            with open(self._PATH_TO_JOB_DATA_, 'w') as f:
-                f.write(json.dumps(self.job_data, indent=4))
-        if self.config:
-            with open(self._PATH_TO_CONFIG_, 'w') as f:
-                f.write(json.dumps(self.config, indent=4))
-    
+        with self._write_seconds.time(), self.profiler.stage("write_files"), self.tracer.span("write_files", "persist"):
+            self.store.flush(self.config)
+
+
+    def commit_files(self):
+        """
+        Persists the records marked since the last write and the config, after every
+        scraped item or search page. The records are appended to the journal and the
+        config is swapped in whole, the data files are only rewritten by write_files()
+        at the end of the phase (see JsonStore.commit). An interrupted phase's journal
+        is replayed on the next start
+        """
+
+        with self._commit_seconds.time(), self.tracer.span("commit_files", "persist"):
+            self.store.commit(self.config)
+
+
+    def end_phase(self, kinds=()):
+        """
+        Writes out the metrics, profiling reports and trace at the end of a phase
+
+        :param 'kinds' list[str] - pending queues the phase touched, see export_metrics
+        """
+
+        self.export_metrics(kinds)
+        self.profiler.report()
+        self.tracer.write()
+
+
+    def export_metrics(self, kinds=()):
+        """
+        Updates the pending/quota gauges and writes the metrics out, called at the
+        end of every phase
+
+        :param 'kinds' list[str] - pending queues to measure, "profiles"/"jobs"/"companies".
+            Only the ones the phase touched, asking for jobs opens lazy job data
+        """
+
+        pending = self.metrics.gauge("pending_items", "work left per kind")
+        for kind in kinds:
+            pending.set(len(getattr(self.store, f"pending_{kind}")()), kind=kind)
+
+        remaining = self.metrics.gauge("login_quota_remaining", "requests left today per login")
+        for login, values in self.config["logins"].items():
+            if self.quota is not None:
+                for quota in ("profile_visits", "searches"):
+                    remaining.set(self.quota.remaining(login, quota), login=login, quota=quota)
+                continue
+            remaining.set(max(0, self._PROFILE_LIMIT_TOTAL__ - values["profile_visits"]), login=login, quota="profile_visits")
+            remaining.set(max(0, self._SEARCH_LIMIT_TOTAL_ - values["searches"]), login=login, quota="searches")
+
+        self.metrics.export()
+
+
+    def compact_files(self):
+        """
+        On-demand compaction, folds the journals into their snapshots. write_files()
+        does this on its own once a journal gets as big as its snapshot
+        """
+
+        self.store.flush(self.config)
+        self.store.compact()
+
 
     def new_day(self):
         """
@@ -443,6 +1062,10 @@ class Linkedin_scraper(object):
         :rtype bool
         :return if the email is under the unoffical api limits
         """
+
+        if self.quota is not None:
+            # the ledger's rolling window, counting what other threads/processes have reserved
+            return self.quota.remaining(email, "profile_visits" if int == 1 else "searches") > 0
         if int == 1:
             if self.config["logins"][email]["profile_visits"] < self._PROFILE_LIMIT_TOTAL__:
                 return True
@@ -485,11 +1108,11 @@ class Linkedin_scraper(object):
         for index, login in enumerate(logins):
 
             try:
-                Linkedin(login, self.config["logins"][login]["password"], proxies=proxies[index], debug=self.debug)
+                self.client_factory(login, self.config["logins"][login]["password"], proxies=proxies[index], debug=self.debug)
             except Exception as e:
                 self.logger.info(f"{login} had error {e}")
 
-        close_proxies(instance_ids, self.logger)
+        close_proxies(instance_ids, self.use_proxies, self.logger)
 
 
     def get_network(self, public_id):
@@ -519,6 +1142,9 @@ class Linkedin_scraper(object):
         Try this method use_proxies=False
         """
 
+        from linkedin_api.client import ChallengeException
+        from challenge import login as challenge_login
+
         with open(self._PATH_TO_LOGINS_, 'r') as f:
             logins = {}
             for line in f.readlines():
@@ -543,7 +1169,7 @@ class Linkedin_scraper(object):
             config['logins'][username]['searches'] = 0
 
             try:
-                Linkedin(username, logins[username],
+                self.client_factory(username, logins[username],
                         debug=self.debug,
                         proxies=proxies[index]
                     )
@@ -551,12 +1177,11 @@ class Linkedin_scraper(object):
             except ChallengeException:
                 challenge_login(username, logins[username])
 
-            close_proxies(instance_ids[index], self.logger)
+            close_proxies([instance_ids[index]], self.use_proxies, self.logger)
 
             self.logger.info(f"{instance_ids[index]} server closed")
 
-        with open(self._PATH_TO_CONFIG_, 'w') as f:
-            f.write(json.dumps(config, indent=4))
+        self.store.save_config(config)
         
         self.config = config
 
@@ -566,4 +1191,4 @@ class Linkedin_scraper(object):
         
         proxies, instance_id = start_proxies(1, self.use_proxies, self.logger)
 
-        close_proxies(instance_id, self.logger)
+        close_proxies(instance_id, self.use_proxies, self.logger)
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import queue
+import signal
+from concurrent.futures import ThreadPoolExecutor
+"""
+asyncio engine for scrape_profiles/scrape_jobs/scrape_companies
+
+thread_scraping() gives every login an OS thread that spends nearly all its time
+asleep in default_evade() or blocked on the network. Here every login is a
+coroutine on one event loop, pacing is asyncio.sleep() and the blocking api/store
+calls run on a small fixed thread pool, so one process can drive a lot of logins.
+
+    scraper = Linkedin_scraper(engine="asyncio")
+
+Work is shared the same way as the threaded engine, each login pulls the next
+item while it has quota and every item is committed as it arrives. Ctrl-C/SIGTERM
+stops the logins after the request they have in flight
+"""
+
+from data import (
+    profile_data_try,
+    job_data_try,
+    company_data_agg
+    )
+
+logger = logging.getLogger(__name__)
+
+
+def _company_data_agg(company_data, urn):
+    return company_data_agg(company_data, urn, {})
+
+
+# kind -> (api method, parser, Linkedin_scraper commit method, pace after each request)
+_KINDS_ = {
+    "profiles": ("get_profile", profile_data_try, "commit_profile", True),
+    "jobs": ("get_job", job_data_try, "commit_job", True),
+    "companies": ("get_company", _company_data_agg, "commit_company", False),
+    }
+
+
+class AsyncEngine(object):
+    """
+    :param 'scraper' Linkedin_scraper
+    :param 'max_threads' int - threads for the blocking api/store calls, shared by all logins
+    """
+
+    _MAX_ATTEMPTS_ = 2
+
+    def __init__(self, scraper, max_threads=4):
+        self.scraper = scraper
+        self.max_threads = max_threads
+        self.logger = scraper.logger
+
+
+    def run(self, kind, unchecked, logins, proxies):
+        """
+        Scrapes the unchecked items with the given logins, blocks until the work
+        is done, the logins are out of quota or the run is interrupted
+
+        :param 'kind' str - "profiles"/"jobs"/"companies"
+        :param 'unchecked' list/LeaseQueue
+        :param 'logins' list[str]
+        :param 'proxies' list[dict] - one per login
+        """
+
+        interrupted = asyncio.run(self._run(kind, unchecked, logins, proxies))
+        if interrupted:
+            raise KeyboardInterrupt
+
+
+    async def _run(self, kind, unchecked, logins, proxies):
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        self._stop = asyncio.Event()
+        self._attempts = {}
+
+        if hasattr(unchecked, "get_nowait"):
+            # a LeaseQueue, claims are short sqlite transactions so they run on the loop
+            work_queue = unchecked
+        else:
+            work_queue = asyncio.Queue()
+            for item in unchecked:
+                work_queue.put_nowait(item)
+
+        installed = []
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.stop)
+                installed.append(signum)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # not the main thread/not supported, Ctrl-C then cancels the run instead
+                pass
+
+        executor = ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix="scraper")
+        try:
+            workers = [asyncio.create_task(self._worker(kind, login, proxies[index], work_queue, executor))
+                for index, login in enumerate(logins)]
+            await asyncio.gather(*workers)
+        finally:
+            for signum in installed:
+                loop.remove_signal_handler(signum)
+            executor.shutdown(wait=True)
+        return self._stop.is_set()
+
+
+    def stop(self):
+        """
+        Graceful shutdown, logins finish their current request and commit it
+        """
+
+        if not self._stop.is_set():
+            self.logger.info("Stopping, letting logins finish their current request")
+            self._stop.set()
+
+
+    def cancel(self):
+        """
+        stop() from another thread
+        """
+
+        self._loop.call_soon_threadsafe(self.stop)
+
+
+    async def _sleep(self, seconds):
+        # returns early on stop()
+        try:
+            await asyncio.wait_for(self._stop.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+    async def _pace(self, loop, executor):
+        # imported here, Scraper imports this module
+        from Scraper import default_evade, evade_delay
+
+        if self.scraper.evade is default_evade:
+            await self._sleep(evade_delay())
+        else:
+            await loop.run_in_executor(executor, self.scraper.evade)
+
+
+    async def _worker(self, kind, login, proxy, work_queue, executor):
+        method, parse, commit, pace = _KINDS_[kind]
+        scraper = self.scraper
+        tracer = scraper.tracer
+        loop = asyncio.get_running_loop()
+
+        api = await loop.run_in_executor(executor, lambda: scraper.client_factory(login, '', proxies=proxy, debug=scraper.debug))
+        fetch = getattr(api, method)
+        commit = getattr(scraper, commit)
+
+        while not self._stop.is_set():
+            if not await loop.run_in_executor(executor, scraper.reserve_visit, login):
+                self.logger.info(f"{login} is out of profile visits")
+                return
+            try:
+                item = work_queue.get_nowait()
+            except (asyncio.QueueEmpty, queue.Empty):
+                await loop.run_in_executor(executor, scraper.refund_visit, login)
+                return
+
+            try:
+                with tracer.span(method, "api", track=login, login=login, item=item):
+                    raw = await loop.run_in_executor(executor, fetch, item)
+            except Exception as e:
+                self.logger.info(f"{login} had error {e} on {item}, stopping")
+                await loop.run_in_executor(executor, scraper.refund_visit, login)
+                self._attempts[item] = self._attempts.get(item, 1) + 1
+                if self._attempts[item] <= self._MAX_ATTEMPTS_:
+                    work_queue.put_nowait(item)
+                return
+
+            await loop.run_in_executor(executor, scraper.cache_response, method, item, raw)
+            visits = scraper.config["logins"][login]["profile_visits"]
+            try:
+                with tracer.span("parse", "parse", track=login, login=login, item=item):
+                    scraped = parse(raw, item)
+                with tracer.span("commit", "persist", track=login, login=login, item=item):
+                    await loop.run_in_executor(executor, commit, login, scraped)
+            except Exception as e:
+                # as in Linkedin_scraper.parse_and_commit
+                self.logger.warning(f"{login} couldn't parse/commit {item}: {e!r}, stopping")
+                await loop.run_in_executor(executor, scraper.spend_visit, login, visits)
+                return
+
+            if pace:
+                with tracer.span("evade", "sleep", track=login, login=login):
+                    await self._pace(loop, executor)
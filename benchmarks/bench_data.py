@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+"""
+Benchmarks for the data.py transforms and the json store
+
+Every benchmark is timed and then run again under tracemalloc for its peak memory,
+inputs are generated fresh for every run (synthetic.py) and aren't measured.
+Results are compared against benchmarks/baseline.json, anything slower or bigger
+than the baseline by more than --tolerance is reported and the exit code is 1
+
+    python benchmarks/bench_data.py                          # 1k/10k/100k
+    python benchmarks/bench_data.py --sizes 1000000 --only format_job_data
+    python benchmarks/bench_data.py --save                   # new baseline
+"""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data import (
+    add_search_to_main,
+    reformat_json,
+    add_key_value,
+    format_job_data,
+    aggregate_job_data,
+    get_job_urns,
+    get_unscraped_jobs,
+    profile_data_try,
+    company_data_agg
+    )
+from store import JsonStore
+from codec import CodecError
+from records import ProfileRecords
+
+import synthetic
+
+_BASELINE_ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# differences under these are noise
+_MIN_SECONDS_ = 0.005
+_MIN_BYTES_ = 256 * 1024
+
+
+def _profile_data_try(responses):
+    for public_id, response in responses:
+        profile_data_try(response, public_id)
+
+
+def _company_data_agg(responses):
+    ret = {}
+    for urn, response in responses:
+        company_data_agg(response, urn, ret)
+
+
+class _Files(object):
+    """
+    Temp directory with a JsonStore's files, for write_files/open_file
+    """
+
+    def __init__(self, n, write, codec="json-indent"):
+        self.codec = codec
+        self.directory = tempfile.mkdtemp(prefix="bench_")
+        self.paths = [os.path.join(self.directory, name) for name in ("profile_data.json", "job_data.json", "config.json")]
+        self.profile_data = synthetic.stored_profile_data(n)
+        self.job_data = synthetic.stored_job_data(n)
+        if write:
+            self.write()
+
+    def store(self):
+        return JsonStore(*self.paths, codec=self.codec)
+
+    def write(self):
+        store = self.store()
+        store.profile_data = self.profile_data
+        store.job_data = self.job_data
+        store.flush()
+
+    def __del__(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _job_merge_inputs(n):
+    job_data = synthetic.stored_job_data(n)
+    # half the listings are already stored
+    new_data = format_job_data(synthetic.search_jobs_results(n, seed=1, start=n//2, companies=max(1, n//5)))
+    return job_data, new_data, set(get_job_urns(job_data))
+
+
+# name -> (setup(n) returning args, function called with *args)
+BENCHMARKS = {
+    "add_search_to_main": (
+        lambda n: (synthetic.stored_profile_data(n, checked=0), synthetic.search_people_results(n, seed=1, start=n//2), "bench@example.com"),
+        add_search_to_main
+        ),
+    "reformat_json": (
+        lambda n: (synthetic.search_people_results(n),),
+        reformat_json
+        ),
+    "add_key_value": (
+        lambda n: (reformat_json(synthetic.search_people_results(n)), "checked", False),
+        add_key_value
+        ),
+    "format_job_data": (
+        lambda n: (synthetic.search_jobs_results(n),),
+        format_job_data
+        ),
+    "aggregate_job_data": (
+        lambda n: _job_merge_inputs(n)[:2],
+        aggregate_job_data
+        ),
+    "aggregate_job_data_indexed": (
+        lambda n: _job_merge_inputs(n),
+        lambda job_data, new_data, job_urns: aggregate_job_data(job_data, new_data, job_urns=job_urns)
+        ),
+    "get_job_urns": (
+        lambda n: (synthetic.stored_job_data(n),),
+        get_job_urns
+        ),
+    "get_unscraped_jobs": (
+        lambda n: (synthetic.stored_job_data(n),),
+        get_unscraped_jobs
+        ),
+    "profile_data_try": (
+        lambda n: (synthetic.profile_responses(n),),
+        _profile_data_try
+        ),
+    "company_data_agg": (
+        lambda n: (synthetic.company_responses(n),),
+        _company_data_agg
+        ),
+    "ProfileRecords": (
+        lambda n: (synthetic.stored_profile_data(n),),
+        ProfileRecords
+        ),
+    "write_files": (
+        lambda n: (_Files(n, write=False),),
+        lambda files: files.write()
+        ),
+    "open_file": (
+        lambda n: (_Files(n, write=True),),
+        lambda files: files.store()
+        ),
+    }
+
+# write_files/open_file for the other codecs, see codec.py
+for _codec in ("json", "orjson", "msgpack"):
+    BENCHMARKS[f"write_files[{_codec}]"] = (
+        lambda n, codec=_codec: (_Files(n, write=False, codec=codec),),
+        lambda files: files.write()
+        )
+    BENCHMARKS[f"open_file[{_codec}]"] = (
+        lambda n, codec=_codec: (_Files(n, write=True, codec=codec),),
+        lambda files: files.store()
+        )
+
+
+def measure(name, n, repeat):
+    """
+    :rtype dict
+    :return {"seconds": best of repeat, "peak_bytes": peak traced allocation}
+    """
+
+    setup, function = BENCHMARKS[name]
+
+    seconds = None
+    for _ in range(repeat):
+        args = setup(n)
+        start = perf_counter()
+        function(*args)
+        elapsed = perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+        del args
+
+    args = setup(n)
+    tracemalloc.start()
+    function(*args)
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del args
+
+    return {"seconds": seconds, "peak_bytes": peak_bytes}
+
+
+def compare(results, baseline, tolerance):
+    """
+    :rtype list[str]
+    :return a line for every result that regressed against the baseline
+    """
+
+    regressions = []
+    for name, sizes in results.items():
+        for size, result in sizes.items():
+            base = baseline.get(name, {}).get(size)
+            if not base:
+                continue
+            if result["seconds"] > base["seconds"] * (1 + tolerance) + _MIN_SECONDS_:
+                regressions.append(f"{name}@{size}: {result['seconds']:.4f}s vs {base['seconds']:.4f}s")
+            if result["peak_bytes"] > base["peak_bytes"] * (1 + tolerance) + _MIN_BYTES_:
+                regressions.append(f"{name}@{size}: {result['peak_bytes']/2**20:.1f}MiB vs {base['peak_bytes']/2**20:.1f}MiB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data.py transforms")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated record counts, e.g. 1000,10000,100000,1000000")
+    parser.add_argument("--only", action="append", choices=list(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per size under 100k, best is kept")
+    parser.add_argument("--baseline", default=_BASELINE_)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--output", help="also write the results to this file")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = {}
+    for name in args.only or BENCHMARKS:
+        results[name] = {}
+        for n in sizes:
+            try:
+                result = measure(name, n, args.repeat if n < 100000 else 1)
+            except CodecError as e:
+                print(f"{name:<28} skipped, {e}")
+                break
+            results[name][str(n)] = result
+            print(f"{name:<28} {n:>9} {result['seconds']:10.4f}s {result['peak_bytes']/2**20:10.1f}MiB", flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(results, indent=4))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.loads(f.read())
+
+    if args.save:
+        for name, sizes in results.items():
+            baseline.setdefault(name, {}).update(sizes)
+        with open(args.baseline, 'w') as f:
+            f.write(json.dumps(baseline, indent=4))
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
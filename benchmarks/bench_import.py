@@ -0,0 +1,112 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+"""
+Cold-start benchmark for `from Scraper import Linkedin_scraper`
+
+Every run is a fresh interpreter, the import is timed with -X importtime (so the
+interpreter's own startup isn't counted) and then again under tracemalloc for its
+peak memory. linkedin_api, boto3, requests and bs4 are only imported by the code
+paths that use them (a real client, proxies, a challenge login), importing any of
+them at import time fails the benchmark on its own.
+
+Results go in benchmarks/baseline.json next to bench_data's
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --save
+"""
+
+_ROOT_ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _ROOT_)
+
+from bench_data import (
+    _BASELINE_,
+    compare
+    )
+
+_NAME_ = "import Scraper"
+_STATEMENT_ = "from Scraper import Linkedin_scraper"
+
+# deferred to where they're used, see Scraper.linkedin_client, proxies.py, construct_config_file,
+# ShardSet._pool
+_DEFERRED_ = ("linkedin_api", "boto3", "botocore", "requests", "bs4", "asyncio", "pstats",
+    "multiprocessing", "concurrent.futures.process")
+
+_MEMORY_ = f"""
+import sys, json, tracemalloc
+tracemalloc.start()
+{_STATEMENT_}
+peak = tracemalloc.get_traced_memory()[1]
+print(json.dumps({{"peak_bytes": peak, "modules": [name for name in {_DEFERRED_!r} if name in sys.modules]}}))
+"""
+
+
+def _run(args):
+    return subprocess.run([sys.executable] + args, cwd=_ROOT_, capture_output=True, text=True, check=True)
+
+
+def import_seconds():
+    """
+    :rtype float
+    :return cumulative import time of Scraper in a fresh interpreter
+    """
+
+    stderr = _run(["-X", "importtime", "-c", _STATEMENT_]).stderr
+    for line in stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[2] == "Scraper":
+            return int(parts[1]) / 1e6
+    raise RuntimeError(f"Scraper not in -X importtime output:\n{stderr}")
+
+
+def measure(repeat):
+    """
+    :rtype dict
+    :return {"seconds": best of repeat, "peak_bytes":, "modules": deferred modules that got imported}
+    """
+
+    seconds = min(import_seconds() for _ in range(repeat))
+    result = json.loads(_run(["-c", _MEMORY_]).stdout)
+    result["seconds"] = seconds
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cold import of Scraper")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters, best is kept")
+    parser.add_argument("--baseline", default=_BASELINE_)
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--save", action="store_true", help="write the result as the new baseline")
+    args = parser.parse_args()
+
+    result = measure(args.repeat)
+    modules = result.pop("modules")
+    print(f"{_NAME_:<28} {result['seconds']:10.4f}s {result['peak_bytes']/2**20:10.1f}MiB", flush=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.loads(f.read())
+
+    if modules:
+        print(f"REGRESSION {_NAME_}: imports {', '.join(modules)}")
+        return 1
+
+    if args.save:
+        baseline[_NAME_] = {"cold": result}
+        with open(args.baseline, 'w') as f:
+            f.write(json.dumps(baseline, indent=4))
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    regressions = compare({_NAME_: {"cold": result}}, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
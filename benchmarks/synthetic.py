@@ -0,0 +1,220 @@
+import random
+"""
+Synthetic Voyager-shaped payloads for the benchmarks
+
+Shapes follow what linkedin_api returns for search_people/get_profile/search_jobs/
+get_company (trimmed to the fields that matter plus some bulk), and what the
+scraper stores after data.py has had its way with them. Everything is seeded so
+runs are comparable
+"""
+
+_FIRST_NAMES_ = ["James", "Mary", "Wei", "Priya", "Carlos", "Fatima", "Olga", "Kenji", "Amara", "Liam"]
+_LAST_NAMES_ = ["Smith", "Garcia", "Chen", "Patel", "Kowalski", "Okafor", "Silva", "Nguyen", "Muller", "Kim"]
+_LOCATIONS_ = [("United States", "San Francisco Bay Area"), ("United States", "New York, New York"),
+    ("India", "Bengaluru, Karnataka"), ("Germany", "Berlin"), ("United Kingdom", "London"),
+    ("Brazil", "Sao Paulo"), ("Canada", "Toronto, Ontario")]
+_TITLES_ = ["Software Engineer", "Senior Software Engineer", "Data Scientist", "Engineering Manager",
+    "Product Manager", "Staff Engineer", "Intern", "DevOps Engineer", "Principal Architect"]
+_INDUSTRIES_ = ["Computer Software", "Internet", "Financial Services", "Hospital & Health Care",
+    "Information Technology & Services", "Retail"]
+
+
+def _public_id(index):
+    # only depends on the index so different searches can overlap
+    return f"{_FIRST_NAMES_[index % 10].lower()}-{_LAST_NAMES_[(index//10) % 10].lower()}-{index:x}"
+
+
+def search_people_results(n, seed=0, start=0):
+    """
+    :rtype list[dict]
+    :return n search_people results
+    """
+
+    rng = random.Random(seed)
+    results = []
+    for index in range(start, start+n):
+        country, location = rng.choice(_LOCATIONS_)
+        results.append({
+            "urn_id": f"ACoAA{index:012d}",
+            "distance": rng.choice(["DISTANCE_2", "DISTANCE_3", "OUT_OF_NETWORK"]),
+            "jobtitle": f"{rng.choice(_TITLES_)} at Company {rng.randrange(5000)}",
+            "location": location,
+            "name": f"{rng.choice(_FIRST_NAMES_)} {rng.choice(_LAST_NAMES_)}",
+            "public_id": _public_id(index),
+            })
+    return results
+
+
+def _experience(rng):
+    positions = []
+    year = 2023
+    for _ in range(rng.randint(1, 8)):
+        start = year - rng.randint(1, 5)
+        period = {"startDate": {"month": rng.randint(1, 12), "year": start}}
+        if positions:
+            period["endDate"] = {"month": rng.randint(1, 12), "year": year}
+        company = rng.randrange(50000)
+        positions.append({
+            "locationName": rng.choice(_LOCATIONS_)[1],
+            "entityUrn": f"urn:li:fs_position:(ACoAA{rng.randrange(10**12):012d},{rng.randrange(10**10)})",
+            "geoLocationName": rng.choice(_LOCATIONS_)[1],
+            "companyName": f"Company {company}",
+            "timePeriod": period,
+            "description": "Built and ran things. " * rng.randint(1, 20),
+            "company": {
+                "employeeCountRange": {"start": 51, "end": 200},
+                "industries": [rng.choice(_INDUSTRIES_)]
+                },
+            "title": rng.choice(_TITLES_),
+            "companyUrn": f"urn:li:fs_miniCompany:{company}",
+            })
+        year = start
+    return positions
+
+
+def profile_response(rng, index):
+    """
+    :return one raw get_profile response
+    """
+
+    country, location = rng.choice(_LOCATIONS_)
+    return {
+        "summary": "Engineer who likes engineering. " * rng.randint(0, 10),
+        "industryName": rng.choice(_INDUSTRIES_),
+        "lastName": rng.choice(_LAST_NAMES_),
+        "locationName": location,
+        "student": False,
+        "geoCountryName": country,
+        "geoCountryUrn": f"urn:li:fs_geo:{rng.randrange(10**8)}",
+        "geoLocationName": location,
+        "firstName": rng.choice(_FIRST_NAMES_),
+        "headline": f"{rng.choice(_TITLES_)} | Python | Cloud",
+        "member_urn": f"urn:li:member:{100000+index}",
+        "public_id": _public_id(index),
+        "profile_id": f"ACoAA{index:012d}",
+        "experience": _experience(rng),
+        "education": [{"schoolName": "State University", "timePeriod": {"startDate": {"year": 2005}, "endDate": {"year": 2009}}}],
+        "languages": [{"name": "English"}],
+        "skills": [{"name": skill} for skill in ("Python", "SQL", "AWS", "Docker")[:rng.randint(1, 4)]],
+        }
+
+
+def profile_responses(n, seed=0):
+    """
+    :rtype list[(public_id, dict)]
+    :return n raw get_profile responses with the public_id they were requested for
+    """
+
+    rng = random.Random(seed)
+    responses = []
+    for index in range(n):
+        response = profile_response(rng, index)
+        responses.append((response["public_id"], response))
+    return responses
+
+
+def search_jobs_results(n, seed=0, start=0, companies=None):
+    """
+    :param 'companies' int - number of distinct companies, defaults to n/5
+    :rtype list[dict]
+    :return n search_jobs results
+    """
+
+    rng = random.Random(seed)
+    companies = companies or max(1, n//5)
+    results = []
+    for index in range(start, start+n):
+        job = 3000000000 + index
+        result = {
+            "trackingUrn": f"urn:li:jobPosting:{job}",
+            "repostedJob": False,
+            "title": rng.choice(_TITLES_),
+            "$recipeTypes": ["com.linkedin.deco.recipe.anonymous.Anon1578943416"],
+            "posterId": str(rng.randrange(10**8)),
+            "$type": "com.linkedin.voyager.dash.jobs.JobPosting",
+            "contentSource": "JOBS_PREMIUM_OFFLINE",
+            "entityUrn": f"urn:li:fs_normalized_jobPosting:{job}",
+            "dashEntityUrn": f"urn:li:fsd_jobPosting:{job}",
+            "formattedLocation": rng.choice(_LOCATIONS_)[1],
+            "listedAt": 1680000000000 + rng.randrange(10**9),
+            "workRemoteAllowed": rng.random() < 0.3,
+            }
+        if rng.random() < 0.9:
+            result["companyDetails"] = {
+                "$type": "com.linkedin.voyager.deco.jobs.web.shared.WebJobPostingCompany",
+                "company": f"urn:li:fs_normalized_company:{rng.randrange(companies)}",
+                }
+        else:
+            result["companyDetails"] = {"companyName": f" Company {rng.randrange(companies)} "}
+        if rng.random() < 0.3:
+            result["salaryInsights"] = {"compensationBreakdown": [{"minSalary": "100000", "maxSalary": "150000", "payPeriod": "YEARLY"}]}
+        if rng.random() < 0.5:
+            result["applyMethod"] = {"companyApplyUrl": f"https://careers.example.com/{job}"}
+        if rng.random() < 0.2:
+            result["briefBenefitsDescription"] = "Medical, Vision, Dental"
+        results.append(result)
+    return results
+
+
+def company_responses(n, seed=0):
+    """
+    :rtype list[(urn, dict)]
+    :return n raw get_company responses with the urn they were requested for
+    """
+
+    rng = random.Random(seed)
+    responses = []
+    for index in range(n):
+        response = {
+            "name": f"Company {index}",
+            "description": "We make things. " * rng.randint(1, 30),
+            "companyPageUrl": f"https://company{index}.example.com",
+            "companyIndustries": [{"localizedName": rng.choice(_INDUSTRIES_)} for _ in range(rng.randint(1, 3))],
+            "followingInfo": {"followerCount": rng.randrange(10**6), "following": False},
+            "specialities": ["Software", "Cloud"],
+            "headquarter": {"country": "US", "city": "Springfield"},
+            }
+        if rng.random() < 0.8:
+            response["staffCount"] = rng.randrange(10**5)
+        else:
+            response["staffCountRange"] = {"start": 51, "end": 200}
+        responses.append((str(index), response))
+    return responses
+
+
+def stored_profile_data(n, seed=0, checked=0.5):
+    """
+    profile_data the way the scraper stores it, a `checked` share of it scraped
+
+    :rtype dict
+    """
+
+    from data import add_search_to_main, profile_data_try
+
+    rng = random.Random(seed)
+    profile_data = add_search_to_main({}, search_people_results(n, seed), "bench@example.com")
+    for public_id in profile_data:
+        if rng.random() < checked:
+            profile_data.update(profile_data_try(profile_response(rng, 0), public_id))
+    return profile_data
+
+
+def stored_job_data(n, seed=0, scraped=0.5):
+    """
+    job_data the way the scraper stores it, a `scraped` share of jobs scraped and
+    the same share of companies with companyData
+
+    :rtype dict
+    """
+
+    from data import format_job_data, company_data_agg
+
+    rng = random.Random(seed)
+    job_data = format_job_data(search_jobs_results(n, seed))
+    companies = dict(company_responses(len(job_data), seed))
+    for index, company in enumerate(job_data):
+        for job in job_data[company]:
+            job_data[company][job]["scraped"] = rng.random() < scraped
+        if rng.random() < scraped:
+            job_data[company]["companyData"] = company_data_agg(companies[str(index)], company, {})[company]["companyData"]
+    return job_data
@@ -0,0 +1,325 @@
+import json
+import logging
+import os
+import tarfile
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from urllib.parse import unquote
+"""
+Bulk import of archived raw api responses into the store
+
+Backfilling from raw responses one at a time through the scraper keeps every parse
+on one core. This reads a directory (or a .tar/.tar.gz of one) in the recording
+layout replay.py writes
+
+    search_people/<keyword>/<offset>.json
+    search_jobs/<keyword>/<offset>.json
+    get_profile/<public_id>.json
+    get_job/<job urn>.json
+    get_company/<company urn>.json
+
+decodes and parses the responses on a process pool (profile_data_try,
+format_job_data, job_data_try, company_data_agg) and merges the results in this
+process, in the scraper's phase order, with the same functions the scraper uses
+
+    search_people -> add_search_to_main       new profiles only
+    search_jobs   -> aggregate_job_data       new listings only
+    get_profile   -> jsonSetCombiner
+    get_job       -> job_jsonSetCombiner      listings that aren't stored are skipped
+    get_company   -> company_jsonSetCombiner  companies that aren't stored are skipped
+
+Parsing is what scales with the cores, merging is dict updates on one core.
+Searches are merged in keyword/offset order, a tarball is read once per method so
+the phases keep their order without holding it in memory
+
+    python bulk_import.py recordings/
+    python bulk_import.py dumps.tar.gz --sqlite scraper.db --processes 8
+"""
+
+from data import (
+    profile_data_try,
+    job_data_try,
+    format_job_data,
+    company_data_agg,
+    add_search_to_main,
+    aggregate_job_data,
+    jsonSetCombiner,
+    job_jsonSetCombiner,
+    company_jsonSetCombiner
+    )
+
+logger = logging.getLogger(__name__)
+
+_METHODS_ = ("search_people", "search_jobs", "get_profile", "get_job", "get_company")
+
+
+def _parse(method, key, raw):
+    if method == "search_people":
+        return raw
+    if method == "search_jobs":
+        return format_job_data(raw)
+    if method == "get_profile":
+        return profile_data_try(raw, key)
+    if method == "get_job":
+        return job_data_try(raw, key)
+    return company_data_agg(raw, key, {})
+
+
+def _parse_batch(batch):
+    """
+    Runs on the pool
+
+    :param 'batch' list - (method, key, offset, path or file contents)
+    :rtype list
+    :return (method, key, offset, parsed), parsed is None for an unreadable response
+    """
+
+    parsed = []
+    for method, key, offset, source in batch:
+        try:
+            if isinstance(source, str):
+                with open(source, 'rb') as f:
+                    source = f.read()
+            parsed.append((method, key, offset, _parse(method, key, json.loads(source))))
+        except (ValueError, KeyError, TypeError, AttributeError, IndexError):
+            parsed.append((method, key, offset, None))
+    return parsed
+
+
+def _entry(method, parts):
+    """
+    :param 'parts' list[str] - path below the method directory
+    :rtype (str, int)/None
+    :return key (keyword/id) and offset (searches), None for anything else
+    """
+
+    if method in ("search_people", "search_jobs"):
+        if len(parts) != 2 or not parts[1].endswith(".json"):
+            return None
+        try:
+            return unquote(parts[0]), int(parts[1][:-5])
+        except ValueError:
+            return None
+    if len(parts) != 1 or not parts[0].endswith(".json"):
+        return None
+    return unquote(parts[0][:-5]), 0
+
+
+def _directory_entries(directory, method):
+    entries = []
+    folder = os.path.join(directory, method)
+    for root, _, names in os.walk(folder):
+        for name in names:
+            _path_ = os.path.join(root, name)
+            entry = _entry(method, os.path.relpath(_path_, folder).split(os.sep))
+            if entry is not None:
+                entries.append((method, entry[0], entry[1], _path_))
+    # searches in keyword/offset order, add_search_to_main keeps the first it sees
+    entries.sort(key=lambda entry: (entry[1], entry[2]))
+    return entries
+
+
+def _tar_entries(_path_, method):
+    with tarfile.open(_path_, 'r:*') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            parts = member.name.split("/")
+            # the dump may be under a top directory
+            if method not in parts:
+                continue
+            entry = _entry(method, parts[parts.index(method)+1:])
+            if entry is not None:
+                yield (method, entry[0], entry[1], tar.extractfile(member).read())
+
+
+def _entries(source, method):
+    if os.path.isdir(source):
+        return _directory_entries(source, method)
+    # tar members can't be sorted without reading them all, searches go in archive order
+    return _tar_entries(source, method)
+
+
+def _batches(entries, batch_size):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _imap(pool, function, iterable, window):
+    """
+    pool.map that keeps at most `window` batches in flight, results in order
+    """
+
+    futures = []
+    for item in iterable:
+        futures.append(pool.submit(function, item))
+        if len(futures) >= window:
+            yield futures.pop(0).result()
+    for future in futures:
+        yield future.result()
+
+
+def _job_companies(job_data, jobs, pending):
+    # company of every job, off the pending index and else a scan of job data
+    companies = {}
+    missing = []
+    for job in jobs:
+        company = pending.job_company(job)
+        if company is None:
+            missing.append(job)
+        else:
+            companies[job] = company
+    if missing:
+        missing = set(missing)
+        for company in job_data or {}:
+            for job in job_data[company]:
+                if job in missing:
+                    companies[job] = company
+    return companies
+
+
+def _merge(store, method, parsed, email):
+    """
+    Merges a batch of one method's parsed responses into the store
+
+    :rtype (int, int)
+    :return records merged, records skipped
+    """
+
+    if method == "search_people":
+        merged = 0
+        for results in parsed:
+            new_ids = [item["public_id"] for item in results if not store.profile_data or item["public_id"] not in store.profile_data]
+            store.profile_data = add_search_to_main(store.profile_data, results, email, pending=store.pending)
+            store.mark("profile_data", new_ids)
+            merged += len(new_ids)
+        return merged, sum(len(results) for results in parsed) - merged
+
+    if method == "search_jobs":
+        merged = 0
+        total = 0
+        for formatted in parsed:
+            job_data = store.job_data if store.job_data else {}
+            jobs = [job for company in formatted for job in formatted[company] if job != "companyData"]
+            new_jobs = [job for job in jobs if job not in store.job_urns]
+            store.job_data = aggregate_job_data(job_data, formatted, pending=store.pending, job_urns=store.job_urns)
+            store.mark("job_data", list(formatted))
+            merged += len(new_jobs)
+            total += len(jobs)
+        return merged, total - merged
+
+    if method == "get_profile":
+        store.profile_data = jsonSetCombiner(store.profile_data or {}, parsed, pending=store.pending)
+        for scraped in parsed:
+            store.mark("profile_data", scraped)
+        return len(parsed), 0
+
+    job_data = store.job_data
+    if not job_data:
+        return 0, len(parsed)
+
+    if method == "get_job":
+        companies = _job_companies(job_data, [job for scraped in parsed for job in scraped], store.pending)
+        found = [scraped for scraped in parsed if all(job in companies for job in scraped)]
+        store.mark("job_data", set(companies.values()))
+        store.job_data = job_jsonSetCombiner(job_data, found, pending=store.pending)
+        return len(found), len(parsed) - len(found)
+
+    found = [scraped for scraped in parsed if all(company in job_data for company in scraped)]
+    store.job_data = company_jsonSetCombiner(job_data, found, pending=store.pending)
+    for scraped in found:
+        store.mark("job_data", scraped)
+    return len(found), len(parsed) - len(found)
+
+
+def bulk_import(source, store, *, processes=None, batch_size=200, email="bulk_import", logger=logger):
+    """
+    Imports a dump of raw responses into a store
+
+    :param 'source' str - recording directory or a tarball of one
+    :param 'store' JsonStore/SqliteStore
+    :param 'processes' int - parsing processes, defaults to the cpu count, 1 parses in this process
+    :param 'batch_size' int - responses per pool task
+    :param 'email' str - email_used of profiles that come in from searches
+    :rtype dict
+    :return {method: {"files", "merged", "skipped", "errors", "seconds"}, "total": {..., "records_per_second"}}
+    """
+
+    processes = processes or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=processes) if processes > 1 else None
+    report = {}
+    start = perf_counter()
+    try:
+        for method in _METHODS_:
+            method_start = perf_counter()
+            counts = {"files": 0, "merged": 0, "skipped": 0, "errors": 0}
+            batches = _batches(_entries(source, method), batch_size)
+            results = _imap(pool, _parse_batch, batches, processes * 4) if pool else map(_parse_batch, batches)
+
+            for results_batch in results:
+                counts["files"] += len(results_batch)
+                parsed = [result for _, _, _, result in results_batch if result is not None]
+                counts["errors"] += len(results_batch) - len(parsed)
+                merged, skipped = _merge(store, method, parsed, email)
+                counts["merged"] += merged
+                counts["skipped"] += skipped
+
+            if counts["files"]:
+                store.flush()
+            counts["seconds"] = perf_counter() - method_start
+            report[method] = counts
+            logger.info(f"{method}: {counts['files']} responses, {counts['merged']} merged, {counts['skipped']} skipped, "
+                f"{counts['errors']} unreadable in {counts['seconds']:.2f}s")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    seconds = perf_counter() - start
+    files = sum(counts["files"] for counts in report.values())
+    report["total"] = {
+        "files": files,
+        "merged": sum(counts["merged"] for counts in report.values()),
+        "seconds": seconds,
+        "records_per_second": files / seconds if seconds else 0.0,
+        "processes": processes,
+        }
+    logger.info(f"Imported {files} responses in {seconds:.2f}s, {report['total']['records_per_second']:.0f} records/s on {processes} processes")
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import a dump of raw api responses into the scraper's store")
+    parser.add_argument("source", help="recording directory (see replay.py) or a .tar/.tar.gz of one")
+    parser.add_argument("--profile-data", default="profile_data.json")
+    parser.add_argument("--job-data", default="job_data.json")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--sqlite", help="import into a SqliteStore database instead of the json files")
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--email", default="bulk_import", help="email_used of profiles from searches")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.sqlite:
+        from store import SqliteStore
+        store = SqliteStore(args.sqlite)
+    else:
+        from store import JsonStore
+        store = JsonStore(args.profile_data, args.job_data, args.config)
+
+    report = bulk_import(args.source, store, processes=args.processes, batch_size=args.batch_size, email=args.email)
+    for method in _METHODS_:
+        counts = report[method]
+        print(f"{method:<14} {counts['files']:>9} files {counts['merged']:>9} merged {counts['skipped']:>9} skipped "
+            f"{counts['errors']:>6} errors {counts['seconds']:8.2f}s")
+    print(f"{'total':<14} {report['total']['files']:>9} files {report['total']['records_per_second']:>9.0f} records/s")
+    if args.sqlite:
+        store.close()
@@ -0,0 +1,162 @@
+import json
+import logging
+import sqlite3
+import threading
+from time import time
+"""
+On-disk response cache for get_profile/get_job/get_company
+
+Every raw response the scraper fetches is kept in a sqlite file keyed by endpoint
+and id. Before a scrape phase hands its items out to the logins, anything with a
+fresh cached response is served from here, so a reset `checked` flag, a company
+showing up under two keys or a re-run after a partial failure doesn't spend
+another profile visit and 30s of evading
+
+    scraper = Linkedin_scraper(cache=ResponseCache("responses.db", ttl=7*24*3600))
+
+Entries older than `ttl` are misses, and once the cache grows past `max_bytes` the
+least recently used entries are dropped
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache(object):
+    """
+    :param '_path_' str - sqlite file
+    :param 'ttl' int - seconds a response stays fresh, None keeps them forever
+    :param 'max_bytes' int - size of the stored responses to stay under, None for unbounded
+    """
+
+    _SCHEMA_ = """
+        CREATE TABLE IF NOT EXISTS responses (
+            endpoint TEXT NOT NULL,
+            id TEXT NOT NULL,
+            response TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            fetched_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            PRIMARY KEY (endpoint, id)
+        );
+        CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+    """
+
+    # evicting frees down to this share of max_bytes so it doesn't run on every put
+    _EVICT_TO_ = 0.9
+
+    def __init__(self, _path_="response_cache.db", *, ttl=7*24*3600, max_bytes=512*2**20, logger=logger):
+        self.path = _path_
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.logger = logger
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(_path_, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(self._SCHEMA_)
+
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+
+    def get(self, endpoint, id):
+        """
+        :param 'endpoint' str - api method, "get_profile"/"get_job"/"get_company"
+        :param 'id' str - public_id/job urn/company urn
+        :rtype dict/None
+        :return the cached response, None if there's no fresh one
+        """
+
+        now = time()
+        with self.lock:
+            row = self.conn.execute("SELECT response, size, fetched_at FROM responses WHERE endpoint = ? AND id = ?",
+                (endpoint, id)).fetchone()
+            if row is not None and self.ttl is not None and now - row[2] > self.ttl:
+                self.conn.execute("DELETE FROM responses WHERE endpoint = ? AND id = ?", (endpoint, id))
+                self.conn.commit()
+                self.size -= row[1]
+                self.expired += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.conn.execute("UPDATE responses SET accessed_at = ? WHERE endpoint = ? AND id = ?", (now, endpoint, id))
+            self.conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+
+    def put(self, endpoint, id, response):
+        """
+        Stores a response, empty ones (what the api hands back for a failed
+        request) aren't cached
+
+        :param 'endpoint' str
+        :param 'id' str
+        :param 'response' dict
+        """
+
+        if not response:
+            return
+
+        text = json.dumps(response)
+        now = time()
+        with self.lock:
+            row = self.conn.execute("SELECT size FROM responses WHERE endpoint = ? AND id = ?", (endpoint, id)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (endpoint, id, text, len(text), now, now))
+            self.size += len(text) - (row[0] if row else 0)
+            if self.max_bytes is not None and self.size > self.max_bytes:
+                self._evict(self.max_bytes * self._EVICT_TO_)
+            self.conn.commit()
+
+
+    def _evict(self, target):
+        # least recently used first, lock held by the caller
+        rows = self.conn.execute("SELECT endpoint, id, size FROM responses ORDER BY accessed_at")
+        evict = []
+        size = self.size
+        for endpoint, id, row_size in rows:
+            if size <= target:
+                break
+            evict.append((endpoint, id))
+            size -= row_size
+        self.conn.executemany("DELETE FROM responses WHERE endpoint = ? AND id = ?", evict)
+        self.size = size
+        self.evictions += len(evict)
+        self.logger.debug(f"Evicted {len(evict)} cached responses")
+
+
+    def stats(self):
+        """
+        :rtype dict
+        :return hit/miss counters since this cache was opened, and what's stored
+        """
+
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": self.size
+            }
+
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+            self.size = 0
+
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,252 @@
+import gc
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+"""
+Serialization codecs for the scraper's state files
+
+    json-indent - json.dumps(indent=4), what the files have always been, no header
+    json        - compact json
+    orjson      - compact json through orjson, needs `pip install orjson`
+    msgpack     - binary, needs `pip install msgpack`
+
+Every file but a json-indent one starts with a header line naming the codec that
+wrote it, so reading never has to be told the format
+
+    LKSCRAPE msgpack\\n<payload>
+
+    python codec.py info profile_data.json
+    python codec.py convert profile_data.json --to msgpack
+    python codec.py convert profile_data.json --to json-indent --output profile_data.export.json
+"""
+
+from records import to_json
+
+logger = logging.getLogger(__name__)
+
+
+class CodecError(Exception):
+    """
+    Unknown codec or one whose library isn't installed. Not a ValueError on purpose,
+    open_file treats those as an unreadable file and starts over
+    """
+    pass
+
+
+_HEADER_ = b"LKSCRAPE "
+_LEGACY_ = "json-indent"
+
+
+def _json_indent():
+    return (
+        lambda data: json.dumps(data, indent=4, default=to_json).encode(),
+        json.loads
+        )
+
+
+def _json():
+    return (
+        lambda data: json.dumps(data, separators=(",", ":"), default=to_json).encode(),
+        json.loads
+        )
+
+
+def _orjson():
+    import orjson
+    return (
+        lambda data: orjson.dumps(data, default=to_json),
+        orjson.loads
+        )
+
+
+def _msgpack():
+    import msgpack
+    return (
+        lambda data: msgpack.packb(data, default=to_json, use_bin_type=True),
+        lambda raw: msgpack.unpackb(raw, raw=False, strict_map_key=False)
+        )
+
+
+# name -> () returning (dumps(data) -> bytes, loads(bytes) -> data), imported on first use
+_CODECS_ = {
+    "json-indent": _json_indent,
+    "json": _json,
+    "orjson": _orjson,
+    "msgpack": _msgpack,
+    }
+CODECS = tuple(_CODECS_)
+
+_loaded = {}
+
+
+def get_codec(name):
+    """
+    :param 'name' str - one of CODECS
+    :rtype (callable, callable)
+    :return dumps, loads
+    """
+
+    if name not in _CODECS_:
+        raise CodecError(f"Unknown codec {name}, expected one of {', '.join(CODECS)}")
+    if name not in _loaded:
+        try:
+            _loaded[name] = _CODECS_[name]()
+        except ImportError as e:
+            raise CodecError(f"Codec {name} isn't available: {e}") from None
+    return _loaded[name]
+
+
+def encode(data, name=_LEGACY_):
+    """
+    :rtype bytes
+    :return file contents, header and payload
+    """
+
+    payload = get_codec(name)[0](data)
+    if name == _LEGACY_:
+        return payload
+    return _HEADER_ + name.encode() + b"\n" + payload
+
+
+def detect(raw):
+    """
+    :param 'raw' bytes - file contents
+    :rtype (str, int)
+    :return codec name, where the payload starts
+    """
+
+    if raw.startswith(_HEADER_):
+        end = raw.index(b"\n")
+        return raw[len(_HEADER_):end].decode(), end + 1
+    return _LEGACY_, 0
+
+
+def decode(raw):
+    """
+    :param 'raw' bytes - file contents
+    :return the data, in whatever codec wrote it
+    """
+
+    name, start = detect(raw)
+    return _loads(name, raw[start:] if start else raw)
+
+
+def _loads(name, payload):
+    loads = get_codec(name)[1]
+
+    # a big file is millions of new containers, the collector would keep walking
+    # them while they're built and decoded data can't have cycles anyway
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return loads(payload)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def load_file(_path_):
+    """
+    Reads and decodes a state file
+
+    :rtype (data, str)
+    :return contents and the codec they were written with
+    """
+
+    with open(_path_, 'rb') as f:
+        name, start = detect(f.read(64))
+        f.seek(start)
+        payload = f.read()
+    if name in ("json-indent", "json"):
+        # json.loads would decode the bytes with them still around
+        payload = payload.decode()
+    return _loads(name, payload), name
+
+
+@contextmanager
+def atomic_file(_path_):
+    """
+    A binary file to write `_path_`'s new contents into. It's a temp file next to it
+    that's fsynced and swapped in on the way out, so a crash or Ctrl-C midway leaves
+    the old file as it was. If the block raises, the temp file is removed
+
+        with atomic_file(_path_) as f:
+            f.write(...)
+    """
+
+    # per process and thread, writers of the same file don't share a temp file
+    temp_path = f"{_path_}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, _path_)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_file(_path_, data, name=_LEGACY_):
+    """
+    Encodes and atomically replaces a state file, see atomic_file()
+
+    :param 'name' str - codec to write with
+    """
+
+    payload = encode(data, name)
+    with atomic_file(_path_) as f:
+        f.write(payload)
+
+
+def file_codec(_path_):
+    """
+    :rtype str
+    :return codec a file was written with, from its header
+    """
+
+    with open(_path_, 'rb') as f:
+        return detect(f.read(64))[0]
+
+
+def convert(_path_, name, output=None):
+    """
+    Rewrites a state file with another codec
+
+    :param '_path_' str
+    :param 'name' str - codec to convert to
+    :param 'output' str - defaults to rewriting _path_, atomically like every write
+    """
+
+    data, current = load_file(_path_)
+    output = output or _path_
+    write_file(output, data, name)
+    logger.info(f"Converted {_path_} from {current} to {name} -> {output}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert the scraper's state files between codecs")
+    parser.add_argument("command", choices=["convert", "info"])
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--to", choices=CODECS, help="codec to convert to")
+    parser.add_argument("--output", help="write here instead of in place, one path only")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "info":
+        for _path_ in args.paths:
+            print(f"{_path_}: {file_codec(_path_)}")
+    else:
+        if not args.to:
+            parser.error("convert needs --to")
+        if args.output and len(args.paths) > 1:
+            parser.error("--output only works with one path")
+        for _path_ in args.paths:
+            convert(_path_, args.to, args.output)
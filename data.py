@@ -53,7 +53,7 @@ def profile_data_try(profile_data, public_id):
 
     try:
         ret_data[public_id]["experience"] = get_experience_local(profile_data)
-    except IndexError:
+    except (IndexError, KeyError):
         ret_data[public_id]["experience"] = False
 
     try:
@@ -82,24 +82,97 @@ def profile_data_try(profile_data, public_id):
     ret_data[public_id]["checked"] = True
     return ret_data
 
-def jsonSetCombiner(main_data, jsonObjs):
+def job_data_try(job_data, job_urn):
+    """
+    Same idea as profile_data_try, pulls the useful fields out of a raw get_job response
+
+    :param 'job_data' JSON - Raw API response
+    :param 'job_urn' str
+    :rtype JSON
+    :return {job_urn: populated job fields}
+    """
+
+    ret_data = {}
+    ret_data[job_urn] = {}
+
+    try:
+        ret_data[job_urn]["description"] = job_data["description"]["text"]
+    except (KeyError, TypeError):
+        ret_data[job_urn]["description"] = False
+
+    try:
+        ret_data[job_urn]["jobState"] = job_data["jobState"]
+    except KeyError:
+        ret_data[job_urn]["jobState"] = False
+
+    try:
+        ret_data[job_urn]["listedAt"] = job_data["listedAt"]
+    except KeyError:
+        ret_data[job_urn]["listedAt"] = False
+
+    try:
+        ret_data[job_urn]["applies"] = job_data["applies"]
+    except KeyError:
+        ret_data[job_urn]["applies"] = False
+
+    try:
+        ret_data[job_urn]["remote"] = job_data["workRemoteAllowed"]
+    except KeyError:
+        ret_data[job_urn]["remote"] = False
+
+    ret_data[job_urn]["scraped"] = True
+    return ret_data
+
+def jsonSetCombiner(main_data, jsonObjs, pending=None):
     """
     Combines set of json objs
 
     :param main_data JSON - structured class data
     :param 'jsonObjs' list[JSON]
+    :param 'pending' PendingIndex - profiles that come back checked are taken off it
     :rtype JSON
     :return combined JSON obj
     """
 
     for jsonObj in jsonObjs:
         main_data.update(jsonObj)
+        if pending is not None:
+            pending.remove_profiles([key for key in jsonObj if jsonObj[key]["checked"]])
     return main_data
 
-def company_jsonSetCombiner(job_data, jsonObjs):
+def job_jsonSetCombiner(job_data, jsonObjs, pending=None):
+    """
+    Merges scraped job fields (see job_data_try) into the stored listings, scraped
+    jobs are keyed by job urn only so the company is looked up on the pending index
+
+    :param 'job_data' JSON
+    :param 'jsonObjs' list[JSON]
+    :param 'pending' PendingIndex
+    :rtype JSON
+    """
+
+    companies = {}
+    for jsonObj in jsonObjs:
+        for job in jsonObj:
+            company = pending.job_company(job) if pending is not None else None
+            if company is None:
+                # no index, find the listing the slow way
+                if not companies:
+                    companies = {listing: company for company in job_data for listing in job_data[company]}
+                company = companies.get(job)
+            if company is None:
+                continue
+            job_data[company][job].update(jsonObj[job])
+        if pending is not None:
+            pending.remove_jobs(jsonObj)
+    return job_data
+
+def company_jsonSetCombiner(job_data, jsonObjs, pending=None):
     for jsonObj in jsonObjs:
         for company in jsonObj:
             job_data[company]["companyData"]=jsonObj[company]["companyData"]
+        if pending is not None:
+            pending.remove_companies(jsonObj)
     return job_data
 
 def update_json(data, update_data):
@@ -140,7 +213,7 @@ def get_unchecked_profiles(central_data):
         return False
     return unchecked_profiles
 
-def add_search_to_main(main_data, search_data, email):
+def add_search_to_main(main_data, search_data, email, pending=None):
     """
     Makes sure to not add duplicate profiles, adds a key for later scraping "checked"
     Has functionality to account for no 'main_data', (E.g first time running scraper)
@@ -148,6 +221,7 @@ def add_search_to_main(main_data, search_data, email):
     :param 'main_data' dict (JSON)
     :param 'search_data' dict
     :param 'email' str
+    :param 'pending' PendingIndex - new profiles are added to it
 
     :return formatted & aggregated profile data
     :rtype dict
@@ -168,8 +242,12 @@ def add_search_to_main(main_data, search_data, email):
     ret_data = add_key_value(reformatted_search_data, "checked", False) #scraped/checked checker
     ret_data = add_key_value(ret_data, "email_used", email)
 
+    if pending is not None:
+        pending.add_profiles(ret_data)
+
     if main_data:
-        ret_data = main_data.update(ret_data)
+        main_data.update(ret_data)
+        return main_data
     return ret_data
 
 def reformat_json(data):
@@ -234,112 +312,127 @@ def add_key_value(data, key, value):
     # Return the modified data as a JSON string
     return data
 
-def job_data_search(main_data, raw_data):
+def job_data_search(main_data, raw_data, pending=None, job_urns=None):
     """
     Aggregates new data to old data, supports no old data.
     simple filtering and fomratting
 
     :param 'main_data' JSON - structured job data
     :param 'raw_data' raw-JSON - raw return data from api
+    :param 'pending' PendingIndex - new jobs/companies are added to it
+    :param 'job_urns' set - job urn index, see aggregate_job_data
     :rtype JSON
     :return Strucuted/aggregated/filtered data
     """
 
     if not main_data:
-        return format_job_data(raw_data)
+        ret_data = format_job_data(raw_data)
+        if pending is not None:
+            for company in ret_data:
+                pending.add_jobs(company, ret_data[company])
+            pending.add_companies(ret_data)
+        if job_urns is not None:
+            job_urns.update(get_job_urns(ret_data))
+        return ret_data
     formatted = format_job_data(raw_data)
-    ret_data = aggregate_job_data(main_data, formatted)
+    ret_data = aggregate_job_data(main_data, formatted, pending, job_urns)
     return ret_data
 
-class hashabledict(dict):
-    def __hash__(self):
-        return hash(tuple(sorted(self.items())))
+def get_company_urn(slice):
+    """
+    Company key used in job data, the company urn's id or the company name
+    when the listing has no company urn
 
+    :param 'slice' dict - raw job listing from search_jobs
+    :rtype str
+    """
+
+    try:
+        urn = slice["companyDetails"]["company"]
+        urnsplit = urn.split(":")
+        return str(urnsplit[len(urnsplit)-1])
+    except KeyError:
+        return slice["companyDetails"]["companyName"].strip()
+
+def get_job_urn(slice):
+    """
+    Job key used in job data, the job posting urn's id
+
+    :param 'slice' dict - raw job listing from search_jobs
+    :rtype str
+    """
+
+    jobtemp = slice["dashEntityUrn"].split(":")
+    return str(jobtemp[len(jobtemp)-1])
 
 def format_job_data(data):
     """
     Reformats job data to be paired with job urn. 
 
-    Wrote this awhile ago and don't feel like rewriting
+    Company keys are in order of first appearance, jobs in order of appearance
+    within their company
 
     :param 'data' dict
     :return reformatted json data
     :rtype JSON dict 
     """
-    listt = []
-    for slice in data:
-        try:
-            urn = slice["companyDetails"]["company"]
-            urnsplit = urn.split(":")
-            listt.append([urnsplit[len(urnsplit)-1]])
-        except Exception:
-            listt.append(slice["companyDetails"]["companyName"].strip())
-
-    #return data headers are  unique company urn
-    unique_list = unique(listt)
+
     ret_data = {}
-    for num in unique_list:
-        if isinstance(num, str):
-            ret_data[num] = {}
-        else:
-            ret_data[str(num[0])] = {}
     for slice in data:
-        try:
-            temp1 = slice["companyDetails"]["company"]
-            urnsplit = temp1.split(":")
-            temp2 = [urnsplit[len(urnsplit)-1]]
-            urn = str(temp2[0])
-        except KeyError:
-            urn = slice["companyDetails"]["companyName"].strip()
+        urn = get_company_urn(slice)
+        if urn not in ret_data:
+            ret_data[urn] = {}
 
         #get job number
-        jobtemp = slice["dashEntityUrn"].split(":")
-        jobnum = str(jobtemp[len(jobtemp)-1])
+        jobnum = get_job_urn(slice)
         ret_data[urn][jobnum] = {}
 
-        if urn in hashabledict(ret_data):
-
-            #refer to other method
-            #get title other metadata
-            try:
-                ret_data[urn][jobnum]["title"] = slice["title"]
-            except KeyError:
-                ret_data[urn][jobnum]["title"] = False
-
-            try:
-                ret_data[urn][jobnum]["compBreakdown"] = slice["salaryInsights"]["compensationBreakdown"]
-            except KeyError:
-                ret_data[urn][jobnum]["compBreakdown"] = False
-
-            try:
-                ret_data[urn][jobnum]["location"] = slice["formattedLocation"]
-            except KeyError:
-                ret_data[urn][jobnum]["location"] = False
-
-            try:
-                ret_data[urn][jobnum]["benefits"] = slice["briefBenefitsDescription"]
-            except KeyError:
-                ret_data[urn][jobnum]["benefits"] = False
-               
-            try:
-                ret_data[urn][jobnum]["applyUrl"] = slice["applyMethod"]["companyApplyUrl"]
-            except KeyError:
-                ret_data[urn][jobnum]["applyUrl"] = False
+        #refer to other method
+        #get title other metadata
+        try:
+            ret_data[urn][jobnum]["title"] = slice["title"]
+        except KeyError:
+            ret_data[urn][jobnum]["title"] = False
 
-        else:
-            print("urn not in data")
-            #if else, either its a string or not in data somehow
+        try:
+            ret_data[urn][jobnum]["compBreakdown"] = slice["salaryInsights"]["compensationBreakdown"]
+        except KeyError:
+            ret_data[urn][jobnum]["compBreakdown"] = False
 
-    for company in ret_data:
-        for job in ret_data[company]:
-            if job == 'companyData':
-                continue
-            ret_data[company][job]["scraped"] = False
+        try:
+            ret_data[urn][jobnum]["location"] = slice["formattedLocation"]
+        except KeyError:
+            ret_data[urn][jobnum]["location"] = False
+
+        try:
+            ret_data[urn][jobnum]["benefits"] = slice["briefBenefitsDescription"]
+        except KeyError:
+            ret_data[urn][jobnum]["benefits"] = False
+           
+        try:
+            ret_data[urn][jobnum]["applyUrl"] = slice["applyMethod"]["companyApplyUrl"]
+        except KeyError:
+            ret_data[urn][jobnum]["applyUrl"] = False
+
+        ret_data[urn][jobnum]["scraped"] = False
 
     return ret_data
 
-def aggregate_job_data(main_data, new_data):
-    old_job_urns = get_job_urns(main_data)
+def aggregate_job_data(main_data, new_data, pending=None, job_urns=None):
+    """
+    Merges formatted job data into the stored job data. Jobs whose urn is already
+    stored (under any company) are left alone, new companies are copied over whole
+
+    :param 'main_data' JSON - stored job data
+    :param 'new_data' JSON - format_job_data output
+    :param 'pending' PendingIndex - new jobs/companies are added to it
+    :param 'job_urns' set - every job urn in main_data, kept between calls so merging
+        doesn't have to walk all of main_data (see get_job_urns), new urns are added to it
+    :rtype JSON
+    """
+
+    old_job_urns = job_urns if job_urns is not None else set(get_job_urns(main_data))
+    added = []
 
     for new_company in new_data:
         # old comapny
@@ -353,6 +446,9 @@ def aggregate_job_data(main_data, new_data):
                     main_data[new_company][job_num] = {}
                     for element in new_data[new_company][job]:
                         main_data[new_company][job_num][element] = new_data[new_company][job][element]
+                    added.append(job_num)
+                    if pending is not None:
+                        pending.add_jobs(new_company, [job_num])
                 #old job do nothing
 
         #new company
@@ -364,29 +460,24 @@ def aggregate_job_data(main_data, new_data):
                 main_data[new_company][job] = {}
                 for element in new_data[new_company][job]:
                     main_data[new_company][job][element] = new_data[new_company][job][element]
+                added.append(job)
+            if pending is not None:
+                pending.add_jobs(new_company, main_data[new_company])
+                pending.add_companies([new_company])
+
+    # only now, urns from this batch don't count as old within the batch
+    if job_urns is not None:
+        job_urns.update(added)
 
     return main_data
 
 def get_job_urns(data):
     urns = []
-    for companyUrn in hashabledict(data):
+    for companyUrn in data:
         for listingUrn in data[companyUrn]:
             urns.append(listingUrn)
     return urns
 
-def unique(list1):
-
-    # initialize a null list
-    unique_list = []
-
-    # traverse for all elements
-    for x in list1:
-        # check if exists in unique_list or not
-        if x not in unique_list:
-            unique_list.append(x)
-    # print list
-    return unique_list
-
 import datetime
 def get_experience_local(profile_data):
     """
@@ -510,7 +601,96 @@ def company_data_agg(company_data, urn, ret):
     try:
         ret[urn]["companyData"]["followerCount"] = company_data["followingInfo"]["followerCount"]
     except KeyError:
-        print("followerCountError")
-        ret[urn]["companyData"]["followerCount"]
+        ret[urn]["companyData"]["followerCount"] = False
+
+    return ret
+
+class PendingIndex(object):
+    """
+    Work that is left to do, so the scraper doesn't have to walk the whole dataset
+    every time it asks. Built once with from_data() and then kept up to date by
+    add_search_to_main, job_data_search, jsonSetCombiner, job_jsonSetCombiner and
+    company_jsonSetCombiner as they ingest data
+
+    The dicts are used as insertion ordered sets
+    profiles - unchecked public_ids
+    jobs - unscraped job urn: company urn
+    companies - company urns without "companyData"
+
+    get_unchecked_profiles/get_unscraped_jobs/get_unchecked_companies stay the
+    source of truth, verify() compares the index against them
+    """
 
-    return ret
\ No newline at end of file
+    def __init__(self):
+        self.profiles = {}
+        self.jobs = {}
+        self.companies = {}
+
+    @classmethod
+    def from_data(cls, profile_data, job_data):
+        pending = cls()
+        if profile_data:
+            pending.add_profiles(get_unchecked_profiles(profile_data) or [])
+        if job_data:
+            for company in job_data:
+                pending.add_jobs(company, [job for job in job_data[company] if job != "companyData" and not job_data[company][job]["scraped"]])
+            pending.add_companies(get_unchecked_companies(job_data))
+        return pending
+
+    def add_profiles(self, public_ids):
+        self.profiles.update(dict.fromkeys(public_ids))
+
+    def remove_profiles(self, public_ids):
+        for public_id in public_ids:
+            self.profiles.pop(public_id, None)
+
+    def add_jobs(self, company, jobs):
+        for job in jobs:
+            if job != "companyData":
+                self.jobs[job] = company
+
+    def remove_jobs(self, jobs):
+        for job in jobs:
+            self.jobs.pop(job, None)
+
+    def job_company(self, job):
+        return self.jobs.get(job)
+
+    def add_companies(self, companies):
+        self.companies.update(dict.fromkeys(companies))
+
+    def remove_companies(self, companies):
+        for company in companies:
+            self.companies.pop(company, None)
+
+    def profile_list(self):
+        return list(self.profiles)
+
+    def job_list(self):
+        return list(self.jobs)
+
+    def company_list(self):
+        return list(self.companies)
+
+    def verify(self, profile_data, job_data):
+        """
+        Consistency check against a full scan of the data
+
+        :rtype dict
+        :return {"profiles"/"jobs"/"companies": (missing from index, not actually pending)}
+            only for the kinds that don't match, empty if the index is right
+        """
+
+        scans = {
+            "profiles": (get_unchecked_profiles(profile_data) if profile_data else None) or [],
+            "jobs": get_unscraped_jobs(job_data) if job_data else [],
+            "companies": get_unchecked_companies(job_data) if job_data else []
+            }
+
+        mismatches = {}
+        for kind, scanned in scans.items():
+            scanned = set(scanned)
+            indexed = set(getattr(self, kind))
+            if scanned != indexed:
+                mismatches[kind] = (scanned - indexed, indexed - scanned)
+        return mismatches
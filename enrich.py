@@ -0,0 +1,295 @@
+import datetime
+import hashlib
+import importlib.util
+import json
+import logging
+from time import perf_counter
+"""
+Batch enrichment of stored profiles
+
+profile_data_try works out "experience" once, when the profile is fetched, against
+that day's date, it goes stale and can only be redone by fetching again. The raw
+positions are stored with every profile ("jobs"), this recomputes from them, for
+every profile at once
+
+    experience          years since the start of the last listed position, what
+                        profile_data_try computes, as of today
+    years_total         years from the first start to the last end (or today), one decimal
+    tenure_months       months in every position, in "jobs" order, null without dates
+    current_employer    company of the latest position without an end date
+    current_title       its title
+    seniority           bucket of years_total, see _SENIORITY_
+
+The positions of a batch of profiles are flattened into columns as they're read
+and the per-profile values come out of NumPy reductions grouped by profile (months
+since year 0), not a python loop per position. Without NumPy the same values are
+worked out profile by profile, ~3x slower.
+
+Every enriched profile keeps a fingerprint of its positions and the date it was
+enriched as of ("enriched"), later runs skip the ones where neither changed, so
+a run on the same day only touches new and re-scraped profiles
+
+    python enrich.py
+    python enrich.py --sqlite scraper.db --as-of 2024-01-01
+"""
+
+from export import _records
+
+logger = logging.getLogger(__name__)
+
+# (years_total below, bucket)
+_SENIORITY_ = ((2, "entry"), (5, "mid"), (10, "senior"), (float("inf"), "lead"))
+
+FIELDS = ("experience", "years_total", "tenure_months", "current_employer", "current_title", "seniority")
+
+
+def fingerprint(jobs, as_of):
+    """
+    :param 'jobs' list - stored raw positions
+    :param 'as_of' datetime.date
+    :rtype str
+    """
+
+    # not sort_keys, the stored positions keep the api's key order and it's 15% faster
+    digest = hashlib.blake2b(json.dumps(jobs).encode(), digest_size=12).hexdigest()
+    return f"{as_of.isoformat()}:{digest}"
+
+
+def _month(date):
+    # months since year 0, a date without a month is January like linkedin shows it
+    return date["year"] * 12 + (date.get("month") or 1) - 1
+
+
+class _Batch(object):
+    """
+    Positions of a batch of profiles, flattened into columns as the profiles are
+    read: the profile's index in the batch, its order in "jobs", start and end month
+    (-1 current), company and title. Undated positions only count in `sizes`
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.prints = []
+        self.sizes = []
+        # start year profile_data_try's experience counts from, -1 none
+        self.legacy = []
+        # where every profile's positions start in the columns
+        self.offsets = [0]
+        self.profile, self.order, self.start, self.end = [], [], [], []
+        self.company, self.title = [], []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, print_, jobs):
+        index = len(self.keys)
+        legacy_year = -1
+        for order, position in enumerate(jobs):
+            if not isinstance(position, dict) or "timePeriod" not in position:
+                continue
+            period = position["timePeriod"]
+            # get_experience_local: the last position with a timePeriod, no startDate there is no value
+            legacy_year = period.get("startDate", {}).get("year", -1)
+            try:
+                start = _month(period["startDate"])
+            except (KeyError, TypeError):
+                continue
+            self.profile.append(index)
+            self.order.append(order)
+            self.start.append(start)
+            self.end.append(_month(period["endDate"]) if period.get("endDate") else -1)
+            self.company.append(position.get("companyName") or False)
+            self.title.append(position.get("title") or False)
+        self.keys.append(key)
+        self.prints.append(print_)
+        self.sizes.append(len(jobs))
+        self.legacy.append(legacy_year)
+        self.offsets.append(len(self.profile))
+
+
+def _seniority(years):
+    for limit, bucket in _SENIORITY_:
+        if years < limit:
+            return bucket
+
+
+def _compute_python(batch, as_of):
+    """
+    :param 'batch' _Batch
+    :rtype dict
+    :return {field: [value per profile]}
+    """
+
+    now = as_of.year * 12 + as_of.month - 1
+    columns = {field: [] for field in FIELDS}
+    for index, size in enumerate(batch.sizes):
+        rows = range(batch.offsets[index], batch.offsets[index+1])
+        ends = [now if batch.end[row] < 0 else batch.end[row] for row in rows]
+        tenure = [None] * size
+        for row, end in zip(rows, ends):
+            tenure[batch.order[row]] = max(end - batch.start[row] + 1, 0)
+        columns["tenure_months"].append(tenure)
+        columns["experience"].append(as_of.year - batch.legacy[index] if batch.legacy[index] >= 0 else False)
+
+        years_total = seniority = employer = title = False
+        if rows:
+            years_total = round(max(max(ends) - min(batch.start[row] for row in rows) + 1, 0) / 12, 1)
+            seniority = _seniority(years_total)
+            current = [row for row in rows if batch.end[row] < 0]
+            if current:
+                # latest start, the first listed on a tie
+                row = min(current, key=lambda row: (-batch.start[row], batch.order[row]))
+                employer, title = batch.company[row], batch.title[row]
+        columns["years_total"].append(years_total)
+        columns["seniority"].append(seniority)
+        columns["current_employer"].append(employer)
+        columns["current_title"].append(title)
+    return columns
+
+
+def _compute_numpy(batch, as_of):
+    """
+    Same as _compute_python, on arrays
+    """
+
+    import numpy as np
+
+    now = as_of.year * 12 + as_of.month - 1
+    size = len(batch)
+
+    profile = np.array(batch.profile, dtype=np.int64)
+    order = np.array(batch.order, dtype=np.int64)
+    start = np.array(batch.start, dtype=np.int64)
+    end = np.array(batch.end, dtype=np.int64)
+    current = end < 0
+    end = np.where(current, now, end)
+
+    # per profile span, grouped reductions over the flattened positions
+    first = np.full(size, np.iinfo(np.int64).max, dtype=np.int64)
+    last = np.full(size, np.iinfo(np.int64).min, dtype=np.int64)
+    np.minimum.at(first, profile, start)
+    np.maximum.at(last, profile, end)
+    dated = np.diff(batch.offsets) > 0
+    years_total = np.round(np.maximum(last - first + 1, 0) / 12, 1)
+    buckets = np.digitize(years_total, [limit for limit, _ in _SENIORITY_[:-1]])
+    labels = np.array([False] + [bucket for _, bucket in _SENIORITY_], dtype=object)
+
+    # current position: latest start, the first listed on a tie, per profile
+    employer = np.full(size, False, dtype=object)
+    title = np.full(size, False, dtype=object)
+    current_rows = np.flatnonzero(current)
+    if len(current_rows):
+        ranked = current_rows[np.lexsort((order[current_rows], -start[current_rows], profile[current_rows]))]
+        profiles, firsts = np.unique(profile[ranked], return_index=True)
+        rows = ranked[firsts]
+        employer[profiles] = np.array(batch.company, dtype=object)[rows]
+        title[profiles] = np.array(batch.title, dtype=object)[rows]
+
+    # tenure back into "jobs" order, a slot per position, None for the undated ones
+    slots = np.concatenate(([0], np.cumsum(batch.sizes)))
+    tenure = np.full(slots[-1], None, dtype=object)
+    tenure[slots[profile] + order] = np.maximum(end - start + 1, 0).tolist()
+    tenure = tenure.tolist()
+    slots = slots.tolist()
+
+    legacy = np.array(batch.legacy, dtype=np.int64)
+    experience = (as_of.year - legacy).astype(object)
+    experience[legacy < 0] = False
+    years_total = years_total.astype(object)
+    years_total[~dated] = False
+    return {
+        "experience": experience.tolist(),
+        "years_total": years_total.tolist(),
+        "tenure_months": [tenure[slots[index]:slots[index+1]] for index in range(size)],
+        "current_employer": employer.tolist(),
+        "current_title": title.tolist(),
+        "seniority": labels[np.where(dated, buckets + 1, 0)].tolist(),
+        }
+
+
+def enrich(store, *, as_of=None, full=False, batch_size=50000, logger=logger):
+    """
+    Recomputes the derived fields of every scraped profile whose positions or
+    as-of date changed since it was last enriched, and writes them to the store
+
+    :param 'store' JsonStore/SqliteStore
+    :param 'as_of' datetime.date - date the years are counted to, defaults to today
+    :param 'full' bool - enrich every profile, fingerprints or not
+    :param 'batch_size' int - profiles computed at once
+    :rtype dict
+    :return {"profiles": looked at, "enriched":, "skipped": unchanged, "seconds":}
+    """
+
+    as_of = as_of or datetime.date.today()
+    vectorized = importlib.util.find_spec("numpy") is not None
+    if not vectorized:
+        logger.warning("numpy isn't installed, enriching profile by profile")
+
+    profile_data = store.profile_data
+    counts = {"profiles": 0, "enriched": 0, "skipped": 0}
+    start = perf_counter()
+
+    compute = _compute_numpy if vectorized else _compute_python
+
+    def flush(batch):
+        columns = compute(batch, as_of)
+        for index, public_id in enumerate(batch.keys):
+            record = profile_data[public_id]
+            for field in FIELDS:
+                record[field] = columns[field][index]
+            record["enriched"] = batch.prints[index]
+            # reassigned, lazy tables and sqlite rows only keep what's set
+            profile_data[public_id] = record
+        store.mark("profile_data", batch.keys)
+        counts["enriched"] += len(batch)
+
+    batch = _Batch()
+    for public_id, record in _records(profile_data, batch_size):
+        jobs = record.get("jobs")
+        if not isinstance(jobs, list):
+            # search results that weren't scraped yet
+            continue
+        counts["profiles"] += 1
+        print_ = fingerprint(jobs, as_of)
+        if not full and record.get("enriched") == print_:
+            counts["skipped"] += 1
+            continue
+        batch.add(public_id, print_, jobs)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = _Batch()
+    if len(batch):
+        flush(batch)
+
+    if counts["enriched"]:
+        store.flush()
+    counts["seconds"] = perf_counter() - start
+    logger.info(f"Enriched {counts['enriched']} of {counts['profiles']} profiles as of {as_of}, "
+        f"{counts['skipped']} unchanged, in {counts['seconds']:.2f}s")
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Recompute experience and the other derived profile fields")
+    parser.add_argument("--profile-data", default="profile_data.json")
+    parser.add_argument("--job-data", default="job_data.json")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--sqlite", help="enrich a SqliteStore database instead of the json files")
+    parser.add_argument("--as-of", type=datetime.date.fromisoformat, help="date to count years to, YYYY-MM-DD, defaults to today")
+    parser.add_argument("--full", action="store_true", help="enrich every profile, not only new or changed ones")
+    parser.add_argument("--batch-size", type=int, default=50000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.sqlite:
+        from store import SqliteStore
+        store = SqliteStore(args.sqlite)
+    else:
+        from store import JsonStore
+        store = JsonStore(args.profile_data, args.job_data, args.config)
+
+    enrich(store, as_of=args.as_of, full=args.full, batch_size=args.batch_size)
+    if args.sqlite:
+        store.close()
@@ -0,0 +1,393 @@
+import csv
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import shutil
+import sqlite3
+"""
+Columnar export of the scraped data for analytics
+
+Walks profile/job data in chunks and writes three typed tables
+
+    profiles  - one row per public_id
+    jobs      - one row per job listing, company_urn joins to companies
+    companies - one row per company urn, with its companyData flattened out
+
+as Parquet (default) or Arrow IPC when pyarrow is installed, CSV otherwise
+
+    exports/
+        profiles/part-00000.parquet
+        jobs/part-00000.parquet
+        companies/part-00000.parquet
+        export_state.db   <- hash of every exported row
+
+Every run after the first only writes the rows that are new or changed since the
+last one, as the next part file, so each table directory reads as one dataset
+(pandas.read_parquet("exports/jobs")). --full starts the export over. The "False
+means missing" placeholders the scraper stores become nulls, nested values (raw
+positions, salary breakdowns, industries) become json text columns
+
+    python export.py exports/
+    python export.py exports/ --sqlite scraper.db --format arrow
+"""
+
+from codec import file_codec
+from lazy import LazyTable
+from shards import (
+    ShardSet,
+    is_sharded
+    )
+from store import (
+    JsonStore,
+    SqliteTable
+    )
+
+logger = logging.getLogger(__name__)
+
+_FORMATS_ = ("parquet", "arrow", "csv")
+_EXTENSIONS_ = {"parquet": "parquet", "arrow": "arrow", "csv": "csv"}
+
+# table -> [(column, type)], type is "string"/"int64"/"float64"/"bool"/"json" (json text)
+_TABLES_ = {
+    "profiles": [
+        ("public_id", "string"),
+        ("checked", "bool"),
+        ("email_used", "string"),
+        ("urn_id", "string"),
+        ("name", "string"),
+        ("jobtitle", "string"),
+        ("distance", "string"),
+        ("country", "string"),
+        ("location", "string"),
+        ("firstName", "string"),
+        ("lastName", "string"),
+        ("experience", "int64"),
+        ("years_total", "float64"),
+        ("tenure_months", "json"),
+        ("current_employer", "string"),
+        ("current_title", "string"),
+        ("seniority", "string"),
+        ("headline", "string"),
+        ("summary", "string"),
+        ("member_urn", "string"),
+        ("positions", "json"),
+        ("sentEmails", "json"),
+        ],
+    "jobs": [
+        ("job_urn", "string"),
+        ("company_urn", "string"),
+        ("title", "string"),
+        ("location", "string"),
+        ("benefits", "string"),
+        ("applyUrl", "string"),
+        ("compBreakdown", "json"),
+        ("scraped", "bool"),
+        ("description", "string"),
+        ("jobState", "string"),
+        ("listedAt", "int64"),
+        ("applies", "int64"),
+        ("remote", "bool"),
+        ],
+    "companies": [
+        ("company_urn", "string"),
+        ("has_company_data", "bool"),
+        ("companySize", "int64"),
+        ("companySizeRange", "json"),
+        ("url", "string"),
+        ("industries", "json"),
+        ("followerCount", "int64"),
+        ("jobs", "int64"),
+        ],
+    }
+
+
+def _value(value, kind):
+    # stored placeholders (False/missing) -> None, everything else to the column type
+    if kind == "bool":
+        return value if isinstance(value, bool) else None
+    if value is False or value is None:
+        return None
+    if kind == "int64":
+        return value if isinstance(value, int) else None
+    if kind == "float64":
+        return float(value) if isinstance(value, (int, float)) else None
+    if kind == "json":
+        return json.dumps(value)
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _row(table, record):
+    return {column: _value(record.get(column), kind) for column, kind in _TABLES_[table]}
+
+
+def profile_row(public_id, record):
+    """
+    :rtype dict
+    :return profiles row for a stored profile, search-only or scraped
+    """
+
+    record = dict(record)
+    record["public_id"] = public_id
+    record["positions"] = record.get("jobs")
+    return _row("profiles", record)
+
+
+def job_row(company, job, record):
+    """
+    :rtype dict
+    """
+
+    record = dict(record)
+    record["job_urn"] = job
+    record["company_urn"] = company
+    return _row("jobs", record)
+
+
+def company_row(company, record):
+    """
+    :param 'record' dict - the company's job_data record, jobs and companyData
+    :rtype dict
+    """
+
+    company_data = record.get("companyData") or {}
+    size = company_data.get("companySize")
+    return _row("companies", {
+        "company_urn": company,
+        "has_company_data": "companyData" in record,
+        "companySize": size if isinstance(size, int) and not isinstance(size, bool) else None,
+        "companySizeRange": size if isinstance(size, dict) else None,
+        "url": company_data.get("url"),
+        "industries": company_data.get("industries"),
+        "followerCount": company_data.get("followerCount"),
+        "jobs": len([job for job in record if job != "companyData"]),
+        })
+
+
+def _records(data, chunk_size):
+    """
+    (key, record) for every top-level record without keeping what was read
+    """
+
+    if not data:
+        return
+    if isinstance(data, (LazyTable, ShardSet)):
+        # a shard set reads its shards on a process pool, a few ahead
+        yield from data.iter_records()
+    elif isinstance(data, SqliteTable):
+        # its cache is dropped on flush
+        for number, key in enumerate(data):
+            yield key, data[key]
+            if number % chunk_size == chunk_size - 1:
+                data.flush()
+        data.flush()
+    else:
+        yield from data.items()
+
+
+def _row_hash(row):
+    return hashlib.blake2b(json.dumps(row, sort_keys=True).encode(), digest_size=12).hexdigest()
+
+
+class ExportState(object):
+    """
+    Hash of every row exported so far, keyed by table and row key
+
+    :param '_path_' str - sqlite file
+    """
+
+    def __init__(self, _path_):
+        self.conn = sqlite3.connect(_path_)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS exported (tbl TEXT NOT NULL, key TEXT NOT NULL, hash TEXT NOT NULL, PRIMARY KEY (tbl, key))")
+
+    def changed(self, table, key, row):
+        """
+        :rtype bool
+        :return True if the row is new or differs from the last export, and records it
+        """
+
+        digest = _row_hash(row)
+        old = self.conn.execute("SELECT hash FROM exported WHERE tbl = ? AND key = ?", (table, key)).fetchone()
+        if old is not None and old[0] == digest:
+            return False
+        self.conn.execute("INSERT OR REPLACE INTO exported VALUES (?, ?, ?)", (table, key, digest))
+        return True
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+class _TableWriter(object):
+    """
+    Buffers rows and writes them out chunk_size at a time, the file is only
+    created once there's a row for it
+    """
+
+    def __init__(self, _path_, table, fmt, chunk_size):
+        self.path = _path_
+        self.table = table
+        self.format = fmt
+        self.chunk_size = chunk_size
+        self.columns = _TABLES_[table]
+        self.rows = []
+        self.written = 0
+        self._writer = None
+        self._file = None
+
+    def _schema(self):
+        import pyarrow as pa
+
+        types = {"string": pa.string(), "json": pa.string(), "int64": pa.int64(), "float64": pa.float64(), "bool": pa.bool_()}
+        return pa.schema([(column, types[kind]) for column, kind in self.columns])
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        if self.format == "csv":
+            if self._writer is None:
+                self._file = open(self.path, 'w', newline='')
+                self._writer = csv.DictWriter(self._file, fieldnames=[column for column, _ in self.columns])
+                self._writer.writeheader()
+            self._writer.writerows(self.rows)
+        else:
+            import pyarrow as pa
+
+            schema = self._schema()
+            if self._writer is None:
+                if self.format == "parquet":
+                    import pyarrow.parquet as pq
+                    self._writer = pq.ParquetWriter(self.path, schema)
+                else:
+                    self._writer = pa.ipc.new_file(self.path, schema)
+            columns = {column: [row[column] for row in self.rows] for column, _ in self.columns}
+            self._writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+        self.written += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        if self._writer is not None and self.format != "csv":
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def _next_part(directory):
+    parts = [name for name in os.listdir(directory) if name.startswith("part-")]
+    return max([int(name[5:10]) for name in parts] or [-1]) + 1
+
+
+def export(profile_data, job_data, directory, *, fmt="parquet", chunk_size=10000, full=False, logger=logger):
+    """
+    Exports the rows that changed since the last export
+
+    :param 'profile_data' mapping - stored profile data, a dict, LazyTable, ShardSet or SqliteTable
+    :param 'job_data' mapping - stored job data
+    :param 'directory' str
+    :param 'fmt' str - "parquet"/"arrow"/"csv", parquet and arrow fall back to csv without pyarrow
+    :param 'chunk_size' int - rows held in memory per table
+    :param 'full' bool - drop earlier exports and export everything
+    :rtype dict
+    :return rows written per table
+    """
+
+    if fmt not in _FORMATS_:
+        raise ValueError(f"Unknown format {fmt}, expected one of {', '.join(_FORMATS_)}")
+    if fmt != "csv" and importlib.util.find_spec("pyarrow") is None:
+        logger.warning(f"pyarrow isn't installed, exporting csv instead of {fmt}")
+        fmt = "csv"
+
+    os.makedirs(directory, exist_ok=True)
+    state_path = os.path.join(directory, "export_state.db")
+    if full:
+        for table in _TABLES_:
+            shutil.rmtree(os.path.join(directory, table), ignore_errors=True)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+    state = ExportState(state_path)
+
+    writers = {}
+    for table in _TABLES_:
+        table_directory = os.path.join(directory, table)
+        os.makedirs(table_directory, exist_ok=True)
+        _path_ = os.path.join(table_directory, f"part-{_next_part(table_directory):05d}.{_EXTENSIONS_[fmt]}")
+        writers[table] = _TableWriter(_path_, table, fmt, chunk_size)
+
+    try:
+        for public_id, record in _records(profile_data, chunk_size):
+            row = profile_row(public_id, record)
+            if state.changed("profiles", public_id, row):
+                writers["profiles"].add(row)
+
+        for company, record in _records(job_data, chunk_size):
+            row = company_row(company, record)
+            if state.changed("companies", company, row):
+                writers["companies"].add(row)
+            for job in record:
+                if job == "companyData":
+                    continue
+                row = job_row(company, job, record[job])
+                if state.changed("jobs", job, row):
+                    writers["jobs"].add(row)
+    finally:
+        for writer in writers.values():
+            writer.close()
+        # close() flushed the buffered rows, every hash committed here has its row on disk
+        state.close()
+
+    written = {table: writer.written for table, writer in writers.items()}
+    logger.info(f"Exported {written} to {directory}")
+    return written
+
+
+def _mappable(_path_):
+    return not is_sharded(_path_) and os.path.exists(_path_) and os.path.getsize(_path_) and file_codec(_path_) == "json-indent"
+
+
+def open_json_store(profile_path, job_path, config_path):
+    """
+    The json files as the scraper would see them: the snapshots, shards and the
+    journals replayed on top, of a journaled dataset or a phase that was cut short.
+    journal=True so the journals are only read, the export doesn't write the files.
+    Memory-mapped (lazy) when both files are plain json-indent
+
+    :rtype JsonStore
+    """
+
+    lazy = bool(_mappable(profile_path) and _mappable(job_path))
+    return JsonStore(profile_path, job_path, config_path, journal=True, lazy=lazy, logger=logger)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export profiles, jobs and companies as columnar tables")
+    parser.add_argument("directory")
+    parser.add_argument("--format", choices=_FORMATS_, default="parquet")
+    parser.add_argument("--profile-data", default="profile_data.json")
+    parser.add_argument("--job-data", default="job_data.json")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--sqlite", help="export from a SqliteStore database instead of the json files")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--full", action="store_true", help="start over instead of exporting only new/changed rows")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.sqlite:
+        from store import SqliteStore
+
+        store = SqliteStore(args.sqlite)
+    else:
+        store = open_json_store(args.profile_data, args.job_data, args.config)
+
+    written = export(store.profile_data, store.job_data, args.directory, fmt=args.format, chunk_size=args.chunk_size, full=args.full)
+    for table, rows in written.items():
+        print(f"{table:<10} {rows:>9} rows")
+    store.close()
@@ -0,0 +1,118 @@
+import json
+import os
+
+from records import to_json
+from codec import write_file
+"""
+Append-only journal for the scraper's state files
+
+Rewriting profile_data.json/job_data.json every time a phase finishes gets slow
+once the files get big. In journal mode the scraper keeps the usual json file as
+a snapshot and appends the records that changed to a JSON Lines file next to it
+
+    profile_data.json          <- snapshot, same format as always
+    profile_data.json.journal  <- {"key": public_id, "value": {...}} one upsert per line
+
+Replaying the journal on top of the snapshot gives the current state, compaction
+folds the journal back into the snapshot and deletes it.
+"""
+
+_JOURNAL_SUFFIX_ = ".journal"
+
+
+def journal_path(_path_):
+    """
+    :param '_path_' str - path to snapshot file
+    :rtype str
+    :return path to the snapshot's journal
+    """
+
+    return _path_ + _JOURNAL_SUFFIX_
+
+
+def append_journal(_path_, data, keys):
+    """
+    Appends an upsert line for every key, keys that are no longer in data are
+    written as deletes. Fsyncs so a crash loses at most the line being written
+
+    :param '_path_' str - path to snapshot file
+    :param 'data' dict - current state
+    :param 'keys' iterable - keys whose records changed
+    :rtype int
+    :return number of lines written
+    """
+
+    lines = []
+    for key in keys:
+        if key in data:
+            lines.append(json.dumps({"key": key, "value": data[key]}, default=to_json))
+        else:
+            lines.append(json.dumps({"key": key, "deleted": True}))
+
+    if not lines:
+        return 0
+
+    with open(journal_path(_path_), 'a') as f:
+        f.write("\n".join(lines) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    return len(lines)
+
+
+def replay_journal(_path_, data):
+    """
+    Applies the journal on top of the snapshot data. A half written last line
+    (crash mid-append) is skipped
+
+    :param '_path_' str - path to snapshot file
+    :param 'data' dict - snapshot data, updated in place
+    :rtype int
+    :return number of journal lines applied
+    """
+
+    try:
+        f = open(journal_path(_path_), 'r')
+    except FileNotFoundError:
+        return 0
+
+    applied = 0
+    with f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get("deleted"):
+                data.pop(entry["key"], None)
+            else:
+                data[entry["key"]] = entry["value"]
+            applied += 1
+    return applied
+
+
+def compact_journal(_path_, data, codec="json-indent"):
+    """
+    Folds the journal into the snapshot. The new snapshot is swapped in (see
+    codec.write_file) before the journal is removed, replaying a leftover
+    journal on the new snapshot is harmless since every line is an upsert
+
+    :param '_path_' str - path to snapshot file
+    :param 'data' dict - current state (snapshot + journal)
+    :param 'codec' str - snapshot codec, see codec.py
+    """
+
+    write_file(_path_, data, codec)
+    remove_journal(_path_)
+
+
+def remove_journal(_path_):
+    """
+    Deletes the journal once its snapshot has everything in it
+
+    :param '_path_' str - path to snapshot file
+    """
+
+    try:
+        os.remove(journal_path(_path_))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,299 @@
+import json
+import mmap
+import os
+import re
+from collections.abc import MutableMapping
+from json.decoder import scanstring
+"""
+Lazy, indexed loading of the json data files
+
+json.loads on profile_data.json/job_data.json parses every record before the
+scraper does anything. A LazyTable memory-maps the file instead and keeps a side
+index of where every top-level record's value starts and ends
+
+    profile_data.json       <- same json.dumps(indent=4) file as always
+    profile_data.json.idx   <- {"size":, "mtime_ns":, "records": [[key, start, end, meta], ...]}
+
+records are only parsed when they're accessed. `meta` is a small summary of each
+record (see profile_meta/company_meta) so the pending work and the job urns can be
+worked out without parsing anything. Saving copies the bytes of records that were
+never touched straight from the old file and re-encodes the rest, the output is
+byte for byte what json.dumps(data, indent=4) would write.
+
+The index is rebuilt with one scan of the file when it's missing or out of date
+(the data file was written by something else)
+"""
+
+from records import to_json
+from codec import (
+    detect,
+    atomic_file
+    )
+
+_INDEX_SUFFIX_ = ".idx"
+
+_WHITESPACE_ = re.compile(r'[ \t\n\r]*')
+
+
+def index_path(_path_):
+    return _path_ + _INDEX_SUFFIX_
+
+
+def profile_meta(record):
+    """
+    :return checked flag
+    """
+
+    return bool(record["checked"])
+
+
+def company_meta(record):
+    """
+    :return [every job urn, unscraped job urns, has companyData]
+    """
+
+    jobs = [job for job in record if job != "companyData"]
+    return [jobs, [job for job in jobs if not record[job]["scraped"]], "companyData" in record]
+
+
+def _encode(value):
+    # a top-level value the way json.dumps(data, indent=4) nests it
+    return json.dumps(value, indent=4, default=to_json).replace("\n", "\n    ")
+
+
+def _scan(text):
+    """
+    Walks the top-level object of a json file without keeping what it parses
+
+    :rtype generator
+    :return (key, value start, value end, value)
+    """
+
+    decoder = json.JSONDecoder()
+    index = _WHITESPACE_.match(text, 0).end()
+    if text[index] != "{":
+        raise ValueError("not a json object")
+    index = _WHITESPACE_.match(text, index+1).end()
+    if text[index] == "}":
+        return
+    while True:
+        key, index = scanstring(text, index+1)
+        index = _WHITESPACE_.match(text, index).end()
+        if text[index] != ":":
+            raise ValueError(f"expected ':' at {index}")
+        index = _WHITESPACE_.match(text, index+1).end()
+        value, end = decoder.raw_decode(text, index)
+        yield key, index, end, value
+        index = _WHITESPACE_.match(text, end).end()
+        if text[index] == "}":
+            return
+        if text[index] != ",":
+            raise ValueError(f"expected ',' at {index}")
+        index = _WHITESPACE_.match(text, index+1).end()
+
+
+class LazyTable(MutableMapping):
+    """
+    Top-level mapping of a json data file, records are parsed on first access and
+    kept, so changes made to them in place are saved like with a plain dict
+
+    :param '_path_' str - data file, created empty if missing
+    :param 'meta' callable - record -> summary kept in the index, profile_meta/company_meta
+    :param 'wrap' callable - applied to every record on the way in, e.g. records.ProfileRecord
+    """
+
+    def __init__(self, _path_, meta, *, wrap=None, logger=None):
+        self.path = _path_
+        self.meta = meta
+        self.wrap = wrap
+        self.logger = logger
+
+        self._mmap = None
+        self._index = {}     # key -> (start, end, meta), for records in the file
+        self._order = {}     # every key, in order
+        self._loaded = {}    # parsed/assigned records
+
+        if not os.path.exists(_path_):
+            if self.logger:
+                self.logger.info(f"Making {_path_} file")
+            open(_path_, 'w').close()
+        self._open()
+
+
+    def _open(self):
+        self._mmap = None
+        self._index = {}
+        if os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        records = self._read_index()
+        if records is None:
+            records = self._build_index()
+        for key, start, end, meta in records:
+            self._index[key] = (start, end, meta)
+            self._order[key] = None
+
+
+    def _read_index(self):
+        stat = os.stat(self.path)
+        try:
+            with open(index_path(self.path), 'r') as f:
+                index = json.loads(f.read())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if index.get("size") != stat.st_size or index.get("mtime_ns") != stat.st_mtime_ns:
+            return None
+        return index["records"]
+
+
+    def _build_index(self):
+        if self.logger:
+            self.logger.info(f"Indexing {self.path}")
+        codec = detect(self._mmap[:64])[0]
+        if codec != "json-indent":
+            raise ValueError(f"{self.path} was written with {codec}, convert it back to json-indent (codec.py) to load it lazily")
+        text = self._mmap[:].decode()
+        if not text.isascii():
+            # offsets below are character offsets, rewrite the file ascii-only first
+            data = json.loads(text)
+            self._mmap.close()
+            self._mmap = None
+            for key, value in data.items():
+                self[key] = value
+            self.save()
+            return [[key, start, end, meta] for key, (start, end, meta) in self._index.items()]
+        try:
+            records = [[key, start, end, self.meta(value)] for key, start, end, value in _scan(text)]
+        except (ValueError, IndexError, KeyError, TypeError) as e:
+            # same as open_file, unreadable data starts over
+            if self.logger:
+                self.logger.info(f"Couldn't index {self.path}: {e}")
+            self._mmap.close()
+            self._mmap = None
+            return []
+        self._write_index(records)
+        return records
+
+
+    def _write_index(self, records):
+        stat = os.stat(self.path)
+        with atomic_file(index_path(self.path)) as f:
+            f.write(json.dumps({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "records": records}).encode())
+
+
+    def __getitem__(self, key):
+        if key in self._loaded:
+            return self._loaded[key]
+        start, end, _ = self._index[key]
+        value = json.loads(self._mmap[start:end])
+        if self.wrap is not None:
+            value = self.wrap(value)
+        self._loaded[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        if self.wrap is not None:
+            value = self.wrap(value)
+        self._loaded[key] = value
+        self._order[key] = None
+
+    def __delitem__(self, key):
+        if key not in self._order:
+            raise KeyError(key)
+        del self._order[key]
+        self._loaded.pop(key, None)
+        self._index.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._order
+
+    def __iter__(self):
+        return iter(list(self._order))
+
+    def __len__(self):
+        return len(self._order)
+
+
+    def loaded(self):
+        """
+        :rtype int
+        :return number of records parsed so far
+        """
+
+        return len(self._loaded)
+
+
+    def iter_records(self):
+        """
+        :rtype generator
+        :return (key, record) for every record, records parsed here aren't kept
+        """
+
+        for key in list(self._order):
+            if key in self._loaded:
+                yield key, self._loaded[key]
+            else:
+                start, end, _ = self._index[key]
+                yield key, json.loads(self._mmap[start:end])
+
+
+    def meta_items(self):
+        """
+        :rtype generator
+        :return (key, meta) for every record, parsed records are summarized fresh
+        """
+
+        for key in self._order:
+            if key in self._loaded:
+                yield key, self.meta(self._loaded[key])
+            else:
+                yield key, self._index[key][2]
+
+
+    def save(self, _path_=None):
+        """
+        Writes the table and its index, the file is replaced atomically and then
+        mapped again
+        """
+
+        _path_ = _path_ or self.path
+        records = []
+        with atomic_file(_path_) as f:
+            if not self._order:
+                f.write(b"{}")
+            else:
+                f.write(b"{\n")
+                position = 2
+                for number, key in enumerate(self._order):
+                    if key in self._loaded:
+                        value = self._loaded[key]
+                        text, meta = _encode(value).encode(), self.meta(value)
+                    else:
+                        start, end, meta = self._index[key]
+                        text = self._mmap[start:end]
+                    prefix = ((",\n" if number else "") + f"    {json.dumps(key)}: ").encode()
+                    f.write(prefix)
+                    f.write(text)
+                    position += len(prefix)
+                    records.append([key, position, position+len(text), meta])
+                    position += len(text)
+                f.write(b"\n}")
+
+        if _path_ != self.path:
+            return
+        if self._mmap is not None:
+            self._mmap.close()
+        self._index = {}
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        for key, start, end, meta in records:
+            self._index[key] = (start, end, meta)
+        self._write_index(records)
+
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
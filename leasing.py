@@ -0,0 +1,287 @@
+import logging
+import os
+import queue
+import socket
+import threading
+from collections import deque
+from time import time
+from uuid import uuid4
+"""
+Lease-based work claiming, so several scraper processes can share one database
+
+Without it every process scrapes the whole pending list. With leases a process
+claims a batch of pending profiles/jobs/companies, the claim is a row in the
+leases table of the SqliteStore's database with an owner and an expiry
+
+    store = SqliteStore("scraper.db")
+    scraper = Linkedin_scraper(store=store, leases=LeaseManager(store))
+
+Items leased by another process aren't claimed again, a background thread renews
+this process's leases while it works, committing an item drops its lease after
+its row is written, and anything left over at the end of a phase is released.
+If a process dies its leases run out after `ttl` seconds and the next claim by
+any process takes the items over.
+
+Only the sqlite store can be shared, the json files are rewritten whole (or by
+shard) and the last process to write wins. The store only writes the rows that
+changed, so processes working on different items don't overwrite each other.
+Give every process its own logins (config=), the login quotas are saved per login.
+
+sqlite's WAL mode needs the processes on one host, for machines sharing a volume
+the volume needs working file locks
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseManager(object):
+    """
+    :param 'store' SqliteStore - the leases table goes in its database
+    :param 'owner' str - who holds the leases, defaults to host:pid:random
+    :param 'ttl' int - seconds a lease lasts without being renewed
+    :param 'batch_size' int - items a claim takes
+    """
+
+    _SCHEMA_ = """
+        CREATE TABLE IF NOT EXISTS leases (
+            kind TEXT NOT NULL,
+            item TEXT NOT NULL,
+            owner TEXT NOT NULL,
+            expires REAL NOT NULL,
+            PRIMARY KEY (kind, item)
+        );
+        CREATE INDEX IF NOT EXISTS leases_owner ON leases (owner);
+        CREATE INDEX IF NOT EXISTS leases_expires ON leases (expires);
+    """
+
+    # pending items of every kind, the same indexed columns the store's pending queries use
+    _PENDING_ = {
+        "profiles": "SELECT public_id FROM profiles WHERE checked = 0 AND public_id NOT IN "
+            "(SELECT item FROM leases WHERE kind = 'profiles') ORDER BY rowid LIMIT ?",
+        "jobs": "SELECT job FROM jobs WHERE scraped = 0 AND job NOT IN "
+            "(SELECT item FROM leases WHERE kind = 'jobs') ORDER BY rowid LIMIT ?",
+        "companies": "SELECT urn FROM companies WHERE has_company_data = 0 AND urn NOT IN "
+            "(SELECT item FROM leases WHERE kind = 'companies') ORDER BY rowid LIMIT ?",
+        }
+
+    # other processes wait this long on a write lock before giving up
+    _BUSY_TIMEOUT_MS_ = 30000
+
+    def __init__(self, store, *, owner=None, ttl=600, batch_size=10, logger=logger):
+        if not hasattr(store, "conn"):
+            raise ValueError("leases need a SqliteStore, the json files can't be shared between processes")
+        self.store = store
+        self.conn = store.conn
+        self.lock = store.lock
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.logger = logger
+
+        self._heartbeat = None
+        self._stopped = threading.Event()
+
+        with self.lock:
+            self.conn.execute(f"PRAGMA busy_timeout = {self._BUSY_TIMEOUT_MS_}")
+            self.conn.executescript(self._SCHEMA_)
+
+
+    def _begin(self):
+        # the write lock up front, a deferred transaction could read pending items
+        # another process is about to claim. Lock held by the caller
+        self.store.flush()
+        self.conn.execute("BEGIN IMMEDIATE")
+
+
+    def claim(self, kind, limit=None):
+        """
+        Leases up to `limit` pending items nobody holds a live lease on, expired
+        leases are taken over
+
+        :param 'kind' str - "profiles"/"jobs"/"companies"
+        :param 'limit' int - defaults to batch_size
+        :rtype list[str]
+        """
+
+        now = time()
+        with self.lock:
+            self._begin()
+            try:
+                reclaimed = self.conn.execute("DELETE FROM leases WHERE kind = ? AND expires < ?", (kind, now)).rowcount
+                items = [row[0] for row in self.conn.execute(self._PENDING_[kind], (limit or self.batch_size,))]
+                self.conn.executemany("INSERT INTO leases (kind, item, owner, expires) VALUES (?, ?, ?, ?)",
+                    [(kind, item, self.owner, now + self.ttl) for item in items])
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+        if reclaimed:
+            self.logger.info(f"Took over {reclaimed} expired {kind} leases")
+        if items:
+            self.logger.debug(f"{self.owner} leased {len(items)} {kind}")
+            self._start_heartbeat()
+        return items
+
+
+    def renew(self, kind=None):
+        """
+        Pushes the expiry of this owner's leases out by another ttl
+
+        :param 'kind' str - only that kind's leases, None for all of them
+        :rtype int
+        :return leases renewed
+        """
+
+        with self.lock, self.conn:
+            if kind is None:
+                cursor = self.conn.execute("UPDATE leases SET expires = ? WHERE owner = ?", (time() + self.ttl, self.owner))
+            else:
+                cursor = self.conn.execute("UPDATE leases SET expires = ? WHERE owner = ? AND kind = ?",
+                    (time() + self.ttl, self.owner, kind))
+            return cursor.rowcount
+
+
+    def release(self, kind, items):
+        """
+        Gives leases back without the work being done, the items can be claimed again right away
+
+        :param 'items' iterable
+        """
+
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM leases WHERE kind = ? AND item = ? AND owner = ?",
+                [(kind, item, self.owner) for item in items])
+
+
+    def commit(self, kind, items):
+        """
+        Writes the store and drops the leases of items that are done. An item whose lease
+        ran out and went to another process is written anyway, it's the same
+        data fetched twice, the other process's lease is left alone
+
+        :param 'items' iterable - scraped item keys
+        :rtype list[str]
+        :return the items this process no longer held a lease on
+        """
+
+        items = list(items)
+        with self.lock:
+            self.store.flush()
+            with self.conn:
+                lost = [item for item in items if self.conn.execute(
+                    "SELECT 1 FROM leases WHERE kind = ? AND item = ? AND owner = ?", (kind, item, self.owner)).fetchone() is None]
+                self.conn.executemany("DELETE FROM leases WHERE kind = ? AND item = ? AND owner = ?",
+                    [(kind, item, self.owner) for item in items])
+        if lost:
+            self.logger.warning(f"Lease on {kind} {', '.join(lost)} had run out before it was committed")
+        return lost
+
+
+    def held(self, kind=None):
+        """
+        :rtype list[str]
+        :return items this owner holds a live lease on
+        """
+
+        with self.lock:
+            if kind is None:
+                rows = self.conn.execute("SELECT item FROM leases WHERE owner = ? AND expires >= ?", (self.owner, time()))
+            else:
+                rows = self.conn.execute("SELECT item FROM leases WHERE owner = ? AND kind = ? AND expires >= ?",
+                    (self.owner, kind, time()))
+            return [row[0] for row in rows]
+
+
+    def queue(self, kind):
+        """
+        :rtype LeaseQueue
+        :return a work queue that claims `kind` items a batch at a time
+        """
+
+        return LeaseQueue(self, kind)
+
+
+    def _start_heartbeat(self):
+        with self.lock:
+            if self._heartbeat is not None:
+                return
+            self._stopped.clear()
+            self._heartbeat = threading.Thread(target=self._renew_loop, name="lease-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+
+    def _renew_loop(self):
+        # a third of the ttl, a renewal can be missed twice before leases run out
+        while not self._stopped.wait(self.ttl / 3):
+            try:
+                self.renew()
+            except Exception as e:
+                self.logger.warning(f"Couldn't renew leases: {e}")
+
+
+    def close(self):
+        """
+        Stops renewing and releases every lease this owner still holds
+        """
+
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM leases WHERE owner = ?", (self.owner,))
+
+
+class LeaseQueue(object):
+    """
+    Stands in for the scraper's WorkQueue when the work is leased, items are
+    claimed a batch at a time as the logins ask for them. An item that errors is
+    put back once like in WorkQueue, after that its lease is kept so this run
+    doesn't claim it again. close() releases it and whatever else wasn't handed
+    out, for the next run or another process
+    """
+
+    _MAX_ATTEMPTS_ = 2
+
+    def __init__(self, leases, kind):
+        self.leases = leases
+        self.kind = kind
+        self.lock = threading.Lock()
+        self.items = deque()
+        self.attempts = {}
+
+    def get_nowait(self):
+        """
+        :raises queue.Empty once nothing is left to claim
+        """
+
+        with self.lock:
+            if not self.items:
+                self.items.extend(self.leases.claim(self.kind))
+            if not self.items:
+                raise queue.Empty
+            return self.items.popleft()
+
+    def put_nowait(self, item):
+        with self.lock:
+            self.items.append(item)
+
+    def retry(self, item):
+        """
+        :rtype bool
+        :return True if the item was put back
+        """
+
+        with self.lock:
+            self.attempts[item] = self.attempts.get(item, 1) + 1
+            if self.attempts[item] > self._MAX_ATTEMPTS_:
+                return False
+            self.items.append(item)
+            return True
+
+    def close(self):
+        # everything of this kind still leased wasn't committed, given up or never handed out
+        with self.lock:
+            self.items.clear()
+        self.leases.release(self.kind, self.leases.held(self.kind))
@@ -0,0 +1,246 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from time import perf_counter, time
+"""
+Metrics for a scraping run
+
+Linkedin_scraper always keeps a MetricsRegistry (scraper.metrics), give it a
+directory and it writes
+
+    metrics/metrics.prom    - Prometheus text format, for node_exporter's textfile collector
+    metrics/summary.json    - the same numbers as json
+
+at the end of every search/scrape phase
+
+    scraper = Linkedin_scraper(metrics=MetricsRegistry("metrics"))
+
+What's collected, see Linkedin_scraper and instrument_client()
+    linkedin_requests_total{endpoint, login}           counter
+    linkedin_request_errors_total{endpoint, login}     counter
+    linkedin_request_seconds{endpoint, login}          histogram
+    response_cache_total{endpoint, result}             counter, hit/miss
+    records_ingested_total{kind}                       counter
+    write_files_seconds / open_file_seconds            histogram
+    pending_items{kind}                                gauge
+    login_quota_remaining{login, quota}                gauge, profile_visits/searches
+"""
+
+from codec import atomic_file
+
+# seconds, api calls take 0.1-5s and write_files anything up to a minute on big files
+_DEFAULT_BUCKETS_ = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = [(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in pairs]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Counter(object):
+    _TYPE_ = "counter"
+
+    def __init__(self, name, help, lock):
+        self.name = name
+        self.help = help
+        self.lock = lock
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _labels_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def _prometheus(self):
+        return [f"{self.name}{_format_labels(key)} {value}" for key, value in self.values.items()]
+
+    def _summary(self):
+        return [{"labels": dict(key), "value": value} for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    _TYPE_ = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[_labels_key(labels)] = value
+
+
+class Histogram(object):
+    _TYPE_ = "histogram"
+
+    def __init__(self, name, help, lock, buckets=_DEFAULT_BUCKETS_):
+        self.name = name
+        self.help = help
+        self.lock = lock
+        self.buckets = tuple(buckets)
+        self.values = {}    # labels -> [bucket counts..., count, sum, max]
+
+    def observe(self, value, **labels):
+        key = _labels_key(labels)
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = [0] * len(self.buckets) + [0, 0.0, 0.0]
+            series = self.values[key]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-3] += 1
+            series[-2] += value
+            series[-1] = max(series[-1], value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, **labels)
+
+    def _prometheus(self):
+        lines = []
+        for key, series in self.values.items():
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {series[-3]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-3]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+        return lines
+
+    def _summary(self):
+        summary = []
+        for key, series in self.values.items():
+            count, total = series[-3], series[-2]
+            summary.append({
+                "labels": dict(key),
+                "count": count,
+                "sum": total,
+                "mean": total / count if count else 0.0,
+                "max": series[-1],
+                "p50": self._quantile(series, 0.5),
+                "p95": self._quantile(series, 0.95),
+                })
+        return summary
+
+    def _quantile(self, series, q):
+        # upper bound of the bucket the quantile falls in
+        count = series[-3]
+        if not count:
+            return 0.0
+        for bound, cumulative in zip(self.buckets, series):
+            if cumulative >= q * count:
+                return bound
+        return series[-1]
+
+
+class MetricsRegistry(object):
+    """
+    :param 'directory' str - where export() writes metrics.prom/summary.json, None to only keep them in memory
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.started = time()
+
+    def _get(self, cls, name, help, **kwargs):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(name, help, threading.Lock(), **kwargs)
+            return self.metrics[name]
+
+    def counter(self, name, help=""):
+        return self._get(Counter, name, help)
+
+    def gauge(self, name, help=""):
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name, help="", buckets=_DEFAULT_BUCKETS_):
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def prometheus(self):
+        """
+        :rtype str
+        :return every metric in the Prometheus text exposition format
+        """
+
+        lines = []
+        for metric in list(self.metrics.values()):
+            with metric.lock:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric._TYPE_}")
+                lines.extend(metric._prometheus())
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        :rtype dict
+        """
+
+        summary = {"started": self.started, "written": time(), "metrics": {}}
+        for metric in list(self.metrics.values()):
+            with metric.lock:
+                summary["metrics"][metric.name] = {"type": metric._TYPE_, "help": metric.help, "values": metric._summary()}
+        return summary
+
+    def export(self):
+        """
+        Writes metrics.prom and summary.json, if there's a directory
+        """
+
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for name, text in (("metrics.prom", self.prometheus()), ("summary.json", json.dumps(self.summary(), indent=4))):
+            with atomic_file(os.path.join(self.directory, name)) as f:
+                f.write(text.encode())
+
+
+class InstrumentedClient(object):
+    """
+    Wraps an api client, counts and times the calls the scraper makes
+    """
+
+    _METHODS_ = ("search_people", "search_jobs", "get_profile", "get_job", "get_company")
+
+    def __init__(self, client, metrics, login):
+        self.client = client
+        self.login = login
+        self._requests = metrics.counter("linkedin_requests_total", "api requests")
+        self._errors = metrics.counter("linkedin_request_errors_total", "api requests that raised")
+        self._seconds = metrics.histogram("linkedin_request_seconds", "api request latency")
+
+    def _call(self, endpoint, *args, **kwargs):
+        self._requests.inc(endpoint=endpoint, login=self.login)
+        start = perf_counter()
+        try:
+            return getattr(self.client, endpoint)(*args, **kwargs)
+        except Exception:
+            self._errors.inc(endpoint=endpoint, login=self.login)
+            raise
+        finally:
+            self._seconds.observe(perf_counter() - start, endpoint=endpoint, login=self.login)
+
+    def __getattr__(self, name):
+        if name in self._METHODS_:
+            return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+        return getattr(self.client, name)
+
+
+def instrument_client(client_factory, metrics):
+    """
+    client_factory for Linkedin_scraper whose clients report to metrics
+    """
+
+    def factory(username, password, **kwargs):
+        return InstrumentedClient(client_factory(username, password, **kwargs), metrics, username)
+    return factory
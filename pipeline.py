@@ -0,0 +1,281 @@
+import logging
+import queue
+import threading
+"""
+search -> scrape -> companies as concurrent stages
+
+Run one after the other, search_profiles, scrape_profiles, search_jobs,
+scrape_jobs and scrape_companies each wait for the one before, logins with
+searches left sit idle while the others scrape and the other way round. Here the
+stages run at once, joined by bounded queues
+
+    search (a thread)           -> profiles queue -> \\
+      new public_ids/job urns   -> jobs queue     ->  one scraping thread per login
+      new companies             -> companies queue -> /
+
+    scraper = Linkedin_scraper()
+    scraper.run_pipeline(["python developer"], ["python"])
+
+Searches go a page at a time (like stream=True), every page is merged and its new
+items are queued straight away, a full queue holds the search up until the
+logins catch up. What was already pending from earlier runs is queued too (after
+the response cache has had a go at it). Every login's thread takes the next item
+of any kind, profiles first, under the same quota checks, commits and pacing as
+the scrape phases, and stops when the login is out of visits or the searches
+are done and the queues are empty. Ctrl-C stops everything after the request in flight
+"""
+
+from data import (
+    get_offset,
+    profile_data_try,
+    job_data_try,
+    company_data_agg,
+    get_company_urn
+    )
+
+logger = logging.getLogger(__name__)
+
+
+def _company_data_agg(company_data, urn):
+    return company_data_agg(company_data, urn, {})
+
+
+# kind -> (api method, parser, Linkedin_scraper commit method, pace after each request), as in async_engine
+_KINDS_ = {
+    "profiles": ("get_profile", profile_data_try, "commit_profile", True),
+    "jobs": ("get_job", job_data_try, "commit_job", True),
+    "companies": ("get_company", _company_data_agg, "commit_company", False),
+    }
+
+
+class Pipeline(object):
+    """
+    :param 'scraper' Linkedin_scraper
+    :param 'queue_size' int - items a stage's queue holds before the producers wait
+    """
+
+    _MAX_ATTEMPTS_ = 2
+
+    # how often blocked producers/idle workers look at the stop flag
+    _POLL_SECONDS_ = 0.1
+
+    def __init__(self, scraper, queue_size=100):
+        if scraper.leases is not None:
+            raise ValueError("the pipeline hands out the work itself, it doesn't run with leases")
+        self.scraper = scraper
+        self.logger = scraper.logger
+        self.queues = {kind: queue.Queue(maxsize=queue_size) for kind in _KINDS_}
+        self.attempts = {}
+        self._producing = 0
+        self._working = 0
+        self._lock = threading.Lock()
+        self._stop = scraper._stop_event
+
+
+    def run(self, profile_keywords=(), job_keywords=(), limit=-1):
+        """
+        Runs searches for the keywords and scrapes what they find and what was already
+        pending, until the work or the logins' quota runs out
+
+        :param 'profile_keywords' list[str]
+        :param 'job_keywords' list[str]
+        :param 'limit' int - max results per keyword and login, -1 for everything
+        """
+
+        scraper = self.scraper
+        producers = [threading.Thread(target=self._feed_pending, args=(kind,), name=f"pending-{kind}") for kind in _KINDS_]
+        if profile_keywords or job_keywords:
+            producers.append(threading.Thread(target=self._search, args=(profile_keywords, job_keywords, limit), name="search"))
+        self._producing = len(producers)
+
+        logins = [login for login in scraper.config["logins"] if scraper.email_checker(login, 1)]
+        from proxies import start_proxies, close_proxies
+        proxies, instance_ids = start_proxies(len(logins), scraper.use_proxies, self.logger)
+        workers = [threading.Thread(target=self._worker, args=(login, proxies[index]), name=login) for index, login in enumerate(logins)]
+        self._working = len(workers)
+
+        threads = producers + workers
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            self.logger.info("Stopping, waiting for the stages to finish their current item")
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            raise
+        finally:
+            self._stop.clear()
+            close_proxies(instance_ids, scraper.use_proxies, self.logger)
+            scraper.write_files()
+            scraper.end_phase(list(_KINDS_))
+
+
+    def _put(self, kind, items):
+        # blocks while the queue is full, that's what holds the searches back. Once every
+        # login is out of visits nothing gets queued, it stays pending in the store
+        for item in items:
+            while not self._stop.is_set() and self._working:
+                try:
+                    self.queues[kind].put(item, timeout=self._POLL_SECONDS_)
+                    break
+                except queue.Full:
+                    pass
+
+
+    def _done_producing(self):
+        with self._lock:
+            self._producing -= 1
+
+
+    def _feed_pending(self, kind):
+        # work left from earlier runs, after the response cache has served what it can
+        try:
+            scraper = self.scraper
+            self._put(kind, scraper.serve_cached(kind, getattr(scraper.store, f"pending_{kind}")()))
+        finally:
+            self._done_producing()
+
+
+    def _search(self, profile_keywords, job_keywords, limit):
+        try:
+            for keyword in profile_keywords:
+                self._search_keyword("profiles", keyword, limit)
+            for keyword in job_keywords:
+                self._search_keyword("jobs", keyword, limit)
+        finally:
+            self._done_producing()
+
+
+    def _search_keyword(self, kind, keyword, limit):
+        """
+        search_profiles/search_jobs with stream=True, the new items of every page go
+        on the queues as soon as it's merged
+        """
+
+        # imported here, Scraper imports this module
+        from Scraper import search_pages
+        from proxies import start_proxies, close_proxies
+
+        scraper = self.scraper
+        method, config_key = ("search_people", "profile_keyword") if kind == "profiles" else ("search_jobs", "job_keyword")
+        logins = [login for login in scraper.config["logins"] if scraper.email_checker(login, 2)]
+        if not logins:
+            self.logger.info(f"No logins with searches left for {keyword}")
+            return
+
+        proxies, instance_ids = start_proxies(len(logins), scraper.use_proxies, self.logger)
+        try:
+            for index, email in enumerate(logins):
+                if self._stop.is_set():
+                    return
+                api = scraper.client_factory(email, '', proxies=proxies[index], debug=scraper.debug)
+                self.logger.info(f"{email} is searching for {keyword}")
+                search = scraper.tracer.wrap(getattr(api, method), method, "api", login=email, item=keyword)
+
+                found = 0
+                offset = get_offset(scraper.config, keyword, config_key)
+                for page_offset, page in search_pages(search, keyword, offset, limit, scraper._SEARCH_PAGE_SIZE_):
+                    with scraper._commit_lock:
+                        if kind == "profiles":
+                            discovered = {"profiles": scraper.add_profile_page(page, email)}
+                        else:
+                            job_data = scraper.job_data or {}
+                            companies = list(dict.fromkeys(company for company in map(get_company_urn, page) if company not in job_data))
+                            discovered = {"jobs": scraper.add_job_page(page), "companies": companies}
+                        scraper.updateConfig({config_key: {keyword: (page_offset+len(page))}})
+                        scraper.commit_files()
+                    for queued_kind, items in discovered.items():
+                        self._put(queued_kind, items)
+                    found += len(page)
+                    if self._stop.is_set():
+                        break
+                scraper.use_searches(email)
+                if kind == "profiles" and found < 3:
+                    self.logger.info(f"{keyword}, all results scraped")
+                    return
+        finally:
+            close_proxies(instance_ids, scraper.use_proxies, self.logger)
+
+
+    def _next(self):
+        """
+        :rtype (str, str)/None
+        :return (kind, item), profiles first. None once the producers are done and
+            every queue is empty
+        """
+
+        while not self._stop.is_set():
+            for kind, work_queue in self.queues.items():
+                try:
+                    return kind, work_queue.get_nowait()
+                except queue.Empty:
+                    pass
+            with self._lock:
+                finished = self._producing == 0
+            if finished and all(work_queue.empty() for work_queue in self.queues.values()):
+                return None
+            self._stop.wait(self._POLL_SECONDS_)
+        return None
+
+
+    def _retry(self, kind, item):
+        # put back once for another login, like WorkQueue.retry
+        with self._lock:
+            self.attempts[item] = self.attempts.get(item, 1) + 1
+            if self.attempts[item] > self._MAX_ATTEMPTS_:
+                return
+        self._requeue(kind, item)
+
+
+    def _requeue(self, kind, item):
+        try:
+            self.queues[kind].put_nowait(item)
+        except queue.Full:
+            # still pending in the store, the next run picks it up
+            pass
+
+
+    def _worker(self, login, proxy):
+        try:
+            self._scrape(login, proxy)
+        finally:
+            with self._lock:
+                self._working -= 1
+
+
+    def _scrape(self, login, proxy):
+        scraper = self.scraper
+        tracer = scraper.tracer
+        api = scraper.client_factory(login, '', proxies=proxy, debug=scraper.debug)
+
+        with scraper.profiler.stage("pipeline_worker"):
+            while scraper.email_checker(login, 1):
+                work = self._next()
+                if work is None:
+                    return
+                kind, item = work
+                # the visit is only taken once there's an item, waiting on the searches doesn't hold quota
+                if not scraper.reserve_visit(login):
+                    self._requeue(kind, item)
+                    break
+                method, parse, commit, pace = _KINDS_[kind]
+
+                try:
+                    with tracer.span(method, "api", login=login, item=item):
+                        raw = getattr(api, method)(item)
+                except Exception as e:
+                    self.logger.info(f"{login} had error {e} on {item}, stopping")
+                    scraper.refund_visit(login)
+                    self._retry(kind, item)
+                    return
+                scraper.cache_response(method, item, raw)
+                if not scraper.parse_and_commit(login, item, raw, parse, getattr(scraper, commit)):
+                    return
+
+                if pace:
+                    with tracer.span("evade", "sleep", login=login):
+                        scraper.evade()
+            self.logger.info(f"{login} is out of profile visits")
@@ -0,0 +1,250 @@
+import functools
+import io
+import json
+import os
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from time import perf_counter, strftime, time
+"""
+CPU and memory profiling of the scraper's stages
+
+    scraper = Linkedin_scraper(profile="profiling")
+
+wraps every stage in cProfile and tracemalloc and writes a report per stage to a
+run directory at the end of every phase
+
+    profiling/20240101-120000/
+        summary.json            <- calls, time, peak memory of every stage
+        write_files.txt         <- top functions, top allocation sites, peak memory
+        write_files.prof        <- pstats dump, for snakeviz/pstats
+
+Stages are search_profiles/search_jobs, the scrape_*_base workers (the whole
+asyncio run with engine="asyncio"), the data.py ingestion functions
+(add_search_to_main, job_data_search and the combiners) and write_files.
+
+Nested stages are exclusive in the cProfile stats and allocation sites, while
+write_files runs inside a worker its functions count for write_files only, the
+wall time in summary.json includes nested stages. Peak memory is the peak traced
+memory while the stage ran, with the logins' threads running at once that's the
+whole process'. Allocation sites come from snapshots taken around the first call and
+then one call every _SNAPSHOT_INTERVAL_ seconds, snapshots of a big heap are slow.
+tracemalloc makes the run 2-3x slower, the numbers are for comparing stages
+"""
+
+
+def _size(size):
+    if abs(size) < 2**20:
+        return f"{size / 2**10:.1f}KiB"
+    return f"{size / 2**20:.1f}MiB"
+
+
+class _Stage(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.peak = 0               # traced memory
+        self.peak_delta = 0         # traced memory over what it was on entry
+        self.profiles = {}          # thread id -> cProfile.Profile
+        self.sites = {}             # (file, line) -> [size, count]
+        self.snapshots = 0
+        self.last_snapshot = None
+
+
+class _Frame(object):
+
+    def __init__(self, stage, profile):
+        self.stage = stage
+        self.profile = profile
+        self.start = perf_counter()
+        self.entry_memory = tracemalloc.get_traced_memory()[0]
+        self.peak = self.entry_memory
+        self.snapshot = None
+
+
+class Profiler(object):
+    """
+    :param 'directory' str - run directories are made in here, None to not profile
+    """
+
+    _SNAPSHOT_INTERVAL_ = 60
+    _TOP_FUNCTIONS_ = 30
+    _TOP_SITES_ = 25
+
+    def __init__(self, directory=None, logger=None):
+        self.enabled = directory is not None
+        self.logger = logger
+        self.stages = {}
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        self._active = []           # frames of every thread
+        if not self.enabled:
+            return
+        self.directory = os.path.join(directory, strftime("%Y%m%d-%H%M%S"))
+        os.makedirs(self.directory, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+            ]
+
+
+    def stage(self, name):
+        """
+        :rtype context manager
+        """
+
+        if not self.enabled:
+            return nullcontext()
+        return self._stage(name)
+
+
+    def _fold_peak(self):
+        # every running stage's peak covers everything since the last reset
+        peak = tracemalloc.get_traced_memory()[1]
+        for frame in self._active:
+            frame.peak = max(frame.peak, peak)
+        tracemalloc.reset_peak()
+
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(self._filters)
+
+
+    @contextmanager
+    def _stage(self, name):
+        import cProfile
+
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        with self.lock:
+            stage = self.stages.setdefault(name, _Stage(name))
+            profile = stage.profiles.setdefault(threading.get_ident(), cProfile.Profile())
+            self._fold_peak()
+            frame = _Frame(stage, profile)
+            self._active.append(frame)
+            take_snapshot = stage.last_snapshot is None or time() - stage.last_snapshot >= self._SNAPSHOT_INTERVAL_
+            if take_snapshot:
+                stage.last_snapshot = time()
+        if take_snapshot:
+            frame.snapshot = self._snapshot()
+
+        # only one profiler per thread, the outer stage pauses
+        if stack and stack[-1].profile is not None:
+            stack[-1].profile.disable()
+        stack.append(frame)
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is running (python -m cProfile...), time and memory still work
+            frame.profile = None
+        try:
+            yield
+        finally:
+            if frame.profile is not None:
+                frame.profile.disable()
+            stack.pop()
+            if stack and stack[-1].profile is not None:
+                stack[-1].profile.enable()
+
+            after = self._snapshot() if frame.snapshot is not None else None
+            with self.lock:
+                self._fold_peak()
+                self._active.remove(frame)
+                stage.calls += 1
+                stage.seconds += perf_counter() - frame.start
+                stage.peak = max(stage.peak, frame.peak)
+                stage.peak_delta = max(stage.peak_delta, frame.peak - frame.entry_memory)
+                if after is not None:
+                    stage.snapshots += 1
+                    for diff in after.compare_to(frame.snapshot, "lineno"):
+                        if diff.size_diff <= 0:
+                            continue
+                        site = diff.traceback[0]
+                        totals = stage.sites.setdefault((site.filename, site.lineno), [0, 0])
+                        totals[0] += diff.size_diff
+                        totals[1] += diff.count_diff
+
+
+    def _stats(self, stage):
+        # pstats pulls in dataclasses/inspect, imported only when profiling
+        import pstats
+
+        # profiles still running in another thread are left for the next report
+        running = {id(frame.profile) for frame in self._active}
+        profiles = [profile for profile in stage.profiles.values() if id(profile) not in running]
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0], stream=io.StringIO())
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+
+    def report(self):
+        """
+        Writes the reports of every stage so far to the run directory, every stage
+        covers the whole run up to now
+        """
+
+        if not self.enabled:
+            return
+
+        summary = {"written": time(), "stages": {}}
+        with self.lock:
+            for name, stage in self.stages.items():
+                stats = self._stats(stage)
+                summary["stages"][name] = {
+                    "calls": stage.calls,
+                    "seconds": stage.seconds,
+                    "peak_bytes": stage.peak,
+                    "peak_over_entry_bytes": stage.peak_delta,
+                    "sampled_calls": stage.snapshots,
+                    }
+
+                lines = [
+                    f"stage: {name}",
+                    f"calls: {stage.calls}, {stage.seconds:.3f}s",
+                    f"peak traced memory: {_size(stage.peak)}, {_size(stage.peak_delta)} over entry",
+                    "",
+                    "top functions",
+                    ]
+                if stats is not None:
+                    stats.stream = io.StringIO()
+                    stats.sort_stats("cumulative").print_stats(self._TOP_FUNCTIONS_)
+                    lines.append(stats.stream.getvalue())
+                    stats.dump_stats(os.path.join(self.directory, f"{name}.prof"))
+
+                lines.append(f"top allocation sites, still held when the stage returned, {stage.snapshots} sampled calls")
+                sites = sorted(stage.sites.items(), key=lambda item: item[1][0], reverse=True)
+                for (filename, lineno), (size, count) in sites[:self._TOP_SITES_]:
+                    lines.append(f"    {_size(size):>10} {count:>9} blocks  {filename}:{lineno}")
+
+                with open(os.path.join(self.directory, f"{name}.txt"), 'w') as f:
+                    f.write("\n".join(lines) + "\n")
+
+        with open(os.path.join(self.directory, "summary.json"), 'w') as f:
+            f.write(json.dumps(summary, indent=4))
+        if self.logger:
+            self.logger.info(f"Wrote profiling reports to {self.directory}")
+
+
+def profiled(name):
+    """
+    Runs a Linkedin_scraper method as a stage of its profiler
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
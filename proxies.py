@@ -1,6 +1,6 @@
-import boto3
-import requests
 from time import sleep
+# boto3 and requests are imported when proxies are actually used, boto3 alone is a
+# few hundred ms of every startup otherwise
 region = 'us-east-1'
 def start_proxies(num_proxies, use_proxies, logger):
     """
@@ -33,6 +33,9 @@ def start_proxies(num_proxies, use_proxies, logger):
         return [proxies, instance_ids]
 
 
+    import boto3
+    import requests
+
     # Create an EC2 client
     ec2 = boto3.client('ec2', region_name=region)
     # Make an HTTP GET request to the ipify API to fetch public IP address
@@ -132,6 +135,8 @@ def wait_instances_running(ec2, instance_ids):
 def close_proxies(instance_ids, use_proxies, logger):
     if not use_proxies:
         return
+    import boto3
+
     ec2 = boto3.client('ec2', region_name=region)
     ec2.terminate_instances(InstanceIds=instance_ids)
     logger.info(f"{len(instance_ids)} proxy servers terminated")
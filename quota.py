@@ -0,0 +1,227 @@
+import logging
+import sqlite3
+import threading
+from time import time
+"""
+Per-login quota ledger, shared by the scraping threads and by every process on the
+same ledger file
+
+The profile_visits/searches counters in config["logins"] are only checked before
+a request and bumped after it, and reset once a day by new_day(), two threads or
+processes on one login can both get past the limit. Here every request takes a
+reservation first
+
+    reservation = ledger.reserve(login, "profile_visits")   # None, no quota left
+    ...request...
+    ledger.commit(reservation)      # or ledger.refund(reservation) if it failed
+
+A reservation counts against the quota as soon as it's taken, reserving checks and
+takes it in one transaction so the limit holds however many workers ask at once.
+Usage is counted over a rolling window (24h), a request stops counting 24h after
+it was made instead of at a fixed reset. A reservation that's neither committed
+nor refunded (the process died) stops counting after `reservation_ttl`
+
+    scraper = Linkedin_scraper(quota=QuotaLedger("quota.db"))
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaLedger(object):
+    """
+    :param '_path_' str - sqlite file, share it between processes that use the same logins
+    :param 'limits' dict - {quota name: requests per window}, the scraper fills in
+        profile_visits/searches from its own limits where they aren't given
+    :param 'window' int - seconds a request counts against its quota
+    :param 'reservation_ttl' int - seconds before an open reservation is given up on
+    """
+
+    _SCHEMA_ = """
+        CREATE TABLE IF NOT EXISTS quota (
+            id INTEGER PRIMARY KEY,
+            login TEXT NOT NULL,
+            quota TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            at REAL NOT NULL,
+            committed INTEGER NOT NULL DEFAULT 0,
+            expires REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS quota_usage ON quota (login, quota, at, committed, expires, amount);
+    """
+
+    # counted: in the window, and committed or still reserved. quota_usage covers it, no table reads
+    _USED_ = "SELECT COALESCE(SUM(amount), 0) FROM quota WHERE login = ? AND quota = ? AND at > ? AND (committed = 1 OR expires > ?)"
+
+    # old rows are pruned on every this many reservations
+    _PRUNE_EVERY_ = 500
+
+    def __init__(self, _path_="quota.db", *, limits=None, window=24*3600, reservation_ttl=600, logger=logger):
+        self.path = _path_
+        self.limits = dict(limits or {})
+        self.window = window
+        self.reservation_ttl = reservation_ttl
+        self.logger = logger
+        self.lock = threading.Lock()
+        self._reserved = 0
+        # reservation id -> (login, quota, amount, at) until it's committed or refunded
+        self._open = {}
+
+        self.conn = sqlite3.connect(_path_, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(self._SCHEMA_)
+
+
+    def _used(self, login, quota, now):
+        return self.conn.execute(self._USED_, (login, quota, now - self.window, now)).fetchone()[0]
+
+
+    def _limit(self, quota):
+        try:
+            return self.limits[quota]
+        except KeyError:
+            raise ValueError(f"No limit for quota {quota}") from None
+
+
+    def remaining(self, login, quota):
+        """
+        :param 'login' str
+        :param 'quota' str - "profile_visits"/"searches"
+        :rtype int
+        :return requests left in the window, open reservations counted as used
+        """
+
+        with self.lock:
+            return max(0, self._limit(quota) - self._used(login, quota, time()))
+
+
+    def reserve(self, login, quota, amount=1):
+        """
+        Takes `amount` of a login's quota if that much is left
+
+        :param 'amount' int - None for everything that's left
+        :rtype int/None
+        :return reservation id for commit()/refund(), None if there isn't enough left
+        """
+
+        limit = self._limit(quota)
+        now = time()
+        with self.lock:
+            # the write lock before reading usage, another process can't reserve in between
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                left = limit - self._used(login, quota, now)
+                if amount is None:
+                    amount = left
+                if amount <= 0 or amount > left:
+                    self.conn.rollback()
+                    return None
+                reservation = self.conn.execute("INSERT INTO quota (login, quota, amount, at, expires) VALUES (?, ?, ?, ?, ?)",
+                    (login, quota, amount, now, now + self.reservation_ttl)).lastrowid
+
+                self._reserved += 1
+                if self._reserved % self._PRUNE_EVERY_ == 0:
+                    self._prune(now)
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+            self._open[reservation] = (login, quota, amount, now)
+        return reservation
+
+
+    def commit(self, reservation):
+        """
+        The request went through, the reservation counts until it leaves the window
+
+        A reservation older than reservation_ttl had already stopped counting, and
+        its quota may have gone to another request since. The request was still made,
+        so it's counted anyway and logged, the login can end up over its limit by it
+
+        :rtype bool
+        :return False if the reservation had run out
+        """
+
+        now = time()
+        with self.lock, self.conn:
+            details = self._open.pop(reservation, None)
+            if self.conn.execute("UPDATE quota SET committed = 1 WHERE id = ? AND committed = 0 AND expires > ?",
+                    (reservation, now)).rowcount:
+                return True
+            # expired, or already pruned
+            self.conn.execute("DELETE FROM quota WHERE id = ? AND committed = 0", (reservation,))
+            if details is not None:
+                self.conn.execute("INSERT INTO quota (login, quota, amount, at, committed, expires) VALUES (?, ?, ?, ?, 1, ?)",
+                    details + (details[3],))
+
+        if details is None:
+            self.logger.warning(f"Quota reservation {reservation} was already committed or refunded")
+        else:
+            login, quota, amount, at = details
+            self.logger.warning(f"Quota reservation {reservation} of {login} ran out after {now - at:.1f}s, before it was "
+                f"committed ({self.reservation_ttl}s allowed), counted anyway, {login} may be over its {quota} limit")
+        return False
+
+
+    def refund(self, reservation):
+        """
+        The request wasn't made or failed, the quota is given back
+        """
+
+        with self.lock, self.conn:
+            self._open.pop(reservation, None)
+            self.conn.execute("DELETE FROM quota WHERE id = ? AND committed = 0", (reservation,))
+
+
+    def spend(self, login, quota, amount=1):
+        """
+        reserve() and commit() in one, for what's already been used
+
+        :param 'amount' int - None for everything that's left
+        :rtype bool
+        :return False if there wasn't enough left, nothing is spent then
+        """
+
+        reservation = self.reserve(login, quota, amount)
+        if reservation is None:
+            return False
+        self.commit(reservation)
+        return True
+
+
+    def usage(self):
+        """
+        :rtype dict
+        :return {login: {quota: used}} over the current window
+        """
+
+        now = time()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT login, quota, SUM(amount) FROM quota WHERE at > ? AND (committed = 1 OR expires > ?) GROUP BY login, quota",
+                (now - self.window, now)).fetchall()
+        usage = {}
+        for login, quota, used in rows:
+            usage.setdefault(login, {})[quota] = used
+        return usage
+
+
+    def reset(self, login=None):
+        """
+        Forgets usage, of one login or all of them
+        """
+
+        with self.lock, self.conn:
+            if login is None:
+                self.conn.execute("DELETE FROM quota")
+            else:
+                self.conn.execute("DELETE FROM quota WHERE login = ?", (login,))
+
+
+    def _prune(self, now):
+        # lock and transaction held by the caller
+        self.conn.execute("DELETE FROM quota WHERE at <= ? OR (committed = 0 AND expires <= ?)", (now - self.window, now))
+
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
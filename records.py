@@ -0,0 +1,165 @@
+import json
+import sys
+from collections.abc import MutableMapping
+"""
+Compact in-memory profile records
+
+A stored profile is a dict per profile, with the same string keys in every one of
+them, the raw search fields from add_search_to_main and the raw experience list
+profile_data_try keeps under "jobs". At a million profiles that's gigabytes.
+
+ProfileRecord keeps the fields the scraper uses in __slots__, shares one key-order
+tuple between every record with the same layout, interns the strings that repeat
+across profiles (countries, locations, names, the login that found them) and packs
+any other nested value into a compact json string. It's a MutableMapping, so the
+functions in data.py and the json writers (see to_json) don't notice the difference
+
+    profile_data = ProfileRecords(open_file("profile_data.json"))
+
+Nested values outside the slots ("jobs", raw search fields) come back as a fresh
+copy on every access, assign them again to change them
+"""
+
+_FIELDS_ = (
+    "country",
+    "location",
+    "firstName",
+    "lastName",
+    "experience",
+    "headline",
+    "member_urn",
+    "checked",
+    "email_used",
+    "sentEmails"
+    )
+_FIELD_SET_ = frozenset(_FIELDS_)
+
+# low cardinality strings, one copy shared by every record
+_INTERNED_ = frozenset(("country", "location", "firstName", "lastName", "email_used", "distance"))
+
+# key order tuple -> the shared instance of it
+_LAYOUTS_ = {}
+
+
+def _layout(keys):
+    return _LAYOUTS_.setdefault(keys, keys)
+
+
+class _Packed(str):
+    """
+    Compact json text of a nested value outside the slots
+    """
+
+    __slots__ = ()
+
+
+class ProfileRecord(MutableMapping):
+    """
+    One profile, behaves like the dict it was made from, keys keep their order
+    """
+
+    __slots__ = _FIELDS_ + ("_keys", "_extra")
+
+    def __init__(self, data=()):
+        self._keys = ()
+        self._extra = None
+        for key, value in (data.items() if hasattr(data, "items") else data):
+            self[key] = value
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET_:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None or key not in self._extra:
+            raise KeyError(key)
+        value = self._extra[key]
+        if isinstance(value, _Packed):
+            return json.loads(value)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self._keys:
+            self._keys = _layout(self._keys + (sys.intern(key),))
+        if key in _INTERNED_ and type(value) is str:
+            value = sys.intern(value)
+        if key in _FIELD_SET_:
+            setattr(self, key, value)
+            return
+        if isinstance(value, (dict, list)):
+            value = _Packed(json.dumps(value, separators=(",", ":")))
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        self._keys = _layout(tuple(k for k in self._keys if k != key))
+        if key in _FIELD_SET_:
+            delattr(self, key)
+        else:
+            del self._extra[key]
+            if not self._extra:
+                self._extra = None
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return f"ProfileRecord({self.to_dict()!r})"
+
+    def to_dict(self):
+        """
+        :rtype dict
+        :return the record in its json shape
+        """
+
+        return {key: self[key] for key in self._keys}
+
+
+class ProfileRecords(dict):
+    """
+    profile_data whose values are ProfileRecords, records are converted as they're
+    added and public_ids are interned
+    """
+
+    def __init__(self, data=None):
+        super().__init__()
+        if data:
+            self.update(data)
+
+    def __setitem__(self, key, value):
+        if not isinstance(value, ProfileRecord):
+            value = ProfileRecord(value)
+        super().__setitem__(sys.intern(key), value)
+
+    def update(self, data=(), **kwargs):
+        for key, value in (data.items() if hasattr(data, "items") else data):
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+
+def to_json(obj):
+    """
+    json.dumps default hook for data that may hold ProfileRecords
+
+        json.dumps(profile_data, indent=4, default=to_json)
+    """
+
+    if isinstance(obj, ProfileRecord):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,288 @@
+import json
+import logging
+import os
+import threading
+from time import sleep, time
+from urllib.parse import quote, unquote
+"""
+Offline record/replay for the scraper
+
+Recording wraps the real api client and saves every raw response the scraper asks
+for, replaying serves them back without the network, accounts or proxies
+
+    recordings/
+        search_people/<keyword>/<offset>.json   - list of results starting at offset
+        search_jobs/<keyword>/<offset>.json
+        get_profile/<public_id>.json
+        get_job/<job urn>.json
+        get_company/<company urn>.json
+
+    scraper = Linkedin_scraper(client_factory=recorder("recordings"))
+    scraper = Linkedin_scraper(client_factory=replayer("recordings", latency=0.05),
+                               evade=no_evade, use_proxies=False, config=replay_config(2))
+
+`python replay.py recordings/ --keyword software` runs the whole pipeline against a
+recording in a scratch directory and prints how long each phase took
+"""
+
+from codec import atomic_file
+
+logger = logging.getLogger(__name__)
+
+_SEARCH_METHODS_ = ("search_people", "search_jobs")
+_GET_METHODS_ = ("get_profile", "get_job", "get_company")
+
+
+def no_evade():
+    pass
+
+
+def _key(value):
+    # ids and keywords as safe file names
+    return quote(str(value), safe='')
+
+
+def _write_json(_path_, data):
+    os.makedirs(os.path.dirname(_path_), exist_ok=True)
+    with atomic_file(_path_) as f:
+        f.write(json.dumps(data).encode())
+
+
+class RecordingLinkedin(object):
+    """
+    Passes calls through to a real client and saves the raw responses
+    """
+
+    def __init__(self, client, directory):
+        self.client = client
+        self.directory = directory
+
+    def _record_search(self, method, keyword, offset, results):
+        _write_json(os.path.join(self.directory, method, _key(keyword), f"{offset}.json"), results)
+        return results
+
+    def _record_get(self, method, id, response):
+        _write_json(os.path.join(self.directory, method, f"{_key(id)}.json"), response)
+        return response
+
+    def search_people(self, keywords=None, offset=0, limit=-1, **kwargs):
+        return self._record_search("search_people", keywords, offset,
+            self.client.search_people(keywords, offset=offset, limit=limit, **kwargs))
+
+    def search_jobs(self, keywords=None, offset=0, limit=-1, **kwargs):
+        return self._record_search("search_jobs", keywords, offset,
+            self.client.search_jobs(keywords, offset=offset, limit=limit, **kwargs))
+
+    def get_profile(self, public_id):
+        return self._record_get("get_profile", public_id, self.client.get_profile(public_id))
+
+    def get_job(self, job_id):
+        return self._record_get("get_job", job_id, self.client.get_job(job_id))
+
+    def get_company(self, public_id):
+        return self._record_get("get_company", public_id, self.client.get_company(public_id))
+
+
+class ReplayLinkedin(object):
+    """
+    Stand-in for linkedin_api.Linkedin that answers from a recording. Searches are
+    served from the recorded results by position, so any offset/limit that falls
+    inside what was recorded works. Anything that wasn't recorded comes back empty,
+    the same as the real client does for a failed request
+
+    :param 'directory' str - recording directory
+    :param 'latency' float - seconds every call takes
+    """
+
+    def __init__(self, directory, latency=0.0):
+        self.directory = directory
+        self.latency = latency
+        self._searches = {}
+        self._lock = threading.Lock()
+
+    def _results(self, method, keyword):
+        # position -> result for everything recorded for this keyword
+        with self._lock:
+            if (method, keyword) not in self._searches:
+                results = {}
+                folder = os.path.join(self.directory, method, _key(keyword))
+                if os.path.isdir(folder):
+                    for name in os.listdir(folder):
+                        # skips atomic_file temp files and anything else that isn't <offset>.json
+                        if not name.endswith(".json"):
+                            continue
+                        try:
+                            offset = int(name[:-5])
+                        except ValueError:
+                            continue
+                        with open(os.path.join(folder, name), 'r') as f:
+                            for index, result in enumerate(json.loads(f.read())):
+                                results[offset+index] = result
+                self._searches[(method, keyword)] = results
+            return self._searches[(method, keyword)]
+
+    def _search(self, method, keyword, offset, limit):
+        if self.latency:
+            sleep(self.latency)
+        results = self._results(method, keyword)
+        ret = []
+        position = offset
+        while position in results and (limit < 0 or len(ret) < limit):
+            # copies, the scraper pops keys off search results
+            ret.append(json.loads(json.dumps(results[position])))
+            position += 1
+        return ret
+
+    def _get(self, method, id):
+        if self.latency:
+            sleep(self.latency)
+        try:
+            with open(os.path.join(self.directory, method, f"{_key(id)}.json"), 'r') as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return {}
+
+    def search_people(self, keywords=None, offset=0, limit=-1, **kwargs):
+        return self._search("search_people", keywords, offset, limit)
+
+    def search_jobs(self, keywords=None, offset=0, limit=-1, **kwargs):
+        return self._search("search_jobs", keywords, offset, limit)
+
+    def get_profile(self, public_id):
+        return self._get("get_profile", public_id)
+
+    def get_job(self, job_id):
+        return self._get("get_job", job_id)
+
+    def get_company(self, public_id):
+        return self._get("get_company", public_id)
+
+    def recorded(self, method):
+        """
+        :rtype list
+        :return ids/keywords recorded for a method
+        """
+
+        folder = os.path.join(self.directory, method)
+        if not os.path.isdir(folder):
+            return []
+        return [unquote(name[:-5] if name.endswith(".json") else name) for name in sorted(os.listdir(folder))]
+
+
+def recorder(directory, client_factory=None):
+    """
+    client_factory for Linkedin_scraper that records what the real client returns
+
+    :param 'directory' str
+    :param 'client_factory' callable - defaults to linkedin_api.Linkedin
+    """
+
+    if client_factory is None:
+        from linkedin_api import Linkedin as client_factory
+
+    def factory(username, password, **kwargs):
+        return RecordingLinkedin(client_factory(username, password, **kwargs), directory)
+    return factory
+
+
+def replayer(directory, latency=0.0):
+    """
+    client_factory for Linkedin_scraper that replays a recording, all logins
+    share the one recording
+
+    :param 'directory' str
+    :param 'latency' float - seconds every call takes
+    """
+
+    def factory(username, password, **kwargs):
+        return ReplayLinkedin(directory, latency)
+    return factory
+
+
+def replay_config(num_logins=1):
+    """
+    A fresh config like construct_config_file() makes, with made up logins
+
+    :param 'num_logins' int
+    :rtype dict
+    """
+
+    config = {}
+    config['logins'] = {}
+    config['update_time'] = 0
+    config['profile_keyword'] = {}
+    config['job_keyword'] = {}
+    for index in range(num_logins):
+        config['logins'][f"replay{index}@example.com"] = {'profile_visits': 0, 'searches': 0}
+    return config
+
+
+def run_replay(directory, keywords, *, latency=0.0, num_logins=2, workdir=".", **kwargs):
+    """
+    Runs search -> scrape -> companies -> write_files against a recording in workdir
+
+    :param 'directory' str - recording directory
+    :param 'keywords' list[str]
+    :rtype dict
+    :return seconds per phase
+    """
+
+    from Scraper import Linkedin_scraper
+
+    directory = os.path.abspath(directory)
+    os.makedirs(workdir, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        timings = {}
+        start = time()
+        scraper = Linkedin_scraper(
+            config=replay_config(num_logins),
+            use_proxies=False,
+            client_factory=replayer(directory, latency),
+            evade=no_evade,
+            **kwargs
+            )
+        timings["open_files"] = time() - start
+
+        phases = []
+        for keyword in keywords:
+            phases.append((f"search_profiles {keyword}", lambda keyword=keyword: scraper.search_profiles(keyword)))
+        phases.append(("scrape_profiles", scraper.scrape_profiles))
+        for keyword in keywords:
+            phases.append((f"search_jobs {keyword}", lambda keyword=keyword: scraper.search_jobs(keyword)))
+        phases.append(("scrape_jobs", scraper.scrape_jobs))
+        phases.append(("scrape_companies", scraper.scrape_companies))
+        phases.append(("write_files", scraper.write_files))
+
+        for name, phase in phases:
+            # replay logins never run out, the real limits would stop a big recording early
+            for login in scraper.config["logins"].values():
+                login["profile_visits"] = 0
+                login["searches"] = 0
+            start = time()
+            phase()
+            timings[name] = time() - start
+        return timings
+    finally:
+        os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the scraper pipeline against a recording")
+    parser.add_argument("directory")
+    parser.add_argument("--keyword", action="append", help="defaults to every recorded people search")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--logins", type=int, default=2)
+    parser.add_argument("--workdir", default="replay_run")
+    parser.add_argument("--journal", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    keywords = args.keyword or ReplayLinkedin(args.directory).recorded("search_people")
+    timings = run_replay(args.directory, keywords, latency=args.latency, num_logins=args.logins,
+        workdir=args.workdir, journal=args.journal)
+    for name, seconds in timings.items():
+        print(f"{name:<40} {seconds:8.3f}s")
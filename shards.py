@@ -0,0 +1,363 @@
+import json
+import logging
+import os
+import shutil
+import zlib
+"""
+Sharded data files
+
+profile_data.json/job_data.json are one file each, a single changed record means
+rewriting (and on the next start re-parsing) all of it. Sharded, every record goes
+into one of N files by a hash of its key (public_id/company urn)
+
+    profile_data.json.shards/
+        manifest.json           <- {"shards": 16, "hash": "crc32"}
+        shard-00000.json
+        ...
+        shard-00015.json
+
+flush() only rewrites the shards that hold a record marked dirty (JsonStore.mark),
+loading, compaction, exporting and resharding work shard by shard on a process
+pool. The shard files are ordinary state files in whichever codec the store uses.
+
+    scraper = Linkedin_scraper(shards=16)
+
+splits the existing json files on first start (the old file is kept as
+profile_data.json.unsharded), after that the manifest is what counts, a sharded
+dataset is picked up without the shards argument
+
+    python shards.py info profile_data.json
+    python shards.py reshard profile_data.json job_data.json --shards 64
+    python shards.py merge profile_data.json      # back to one file
+"""
+
+from codec import (
+    load_file,
+    write_file,
+    file_codec
+    )
+from records import ProfileRecord
+
+logger = logging.getLogger(__name__)
+
+_SUFFIX_ = ".shards"
+# reshard() writes the new shards to <path>.shards.tmp and moves the old ones to <path>.shards.old
+_TEMP_SUFFIX_ = ".tmp"
+_BACKUP_SUFFIX_ = ".old"
+_MANIFEST_ = "manifest.json"
+_HASH_ = "crc32"
+
+# below these a process pool costs more than it saves
+_PARALLEL_MIN_BYTES_ = 8 * 2**20
+_PARALLEL_MIN_RECORDS_ = 20000
+
+
+def shard_dir(_path_):
+    return _path_ + _SUFFIX_
+
+
+def is_sharded(_path_):
+    """
+    :param '_path_' str - dataset path, profile_data.json
+    :rtype bool
+    """
+
+    # or a reshard() that stopped between its renames, ShardSet puts the old shards back
+    return _has_manifest(shard_dir(_path_)) or _has_manifest(shard_dir(_path_) + _BACKUP_SUFFIX_)
+
+
+def _has_manifest(directory):
+    return os.path.exists(os.path.join(directory, _MANIFEST_))
+
+
+def _recover(_path_, logger=logger):
+    """
+    Undoes a reshard() that was interrupted after the old shards were moved aside
+    but before the new ones were moved in, the old shards are still complete
+    """
+
+    directory = shard_dir(_path_)
+    backup = directory + _BACKUP_SUFFIX_
+    if _has_manifest(directory) or not _has_manifest(backup):
+        return
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(backup, directory)
+    shutil.rmtree(directory + _TEMP_SUFFIX_, ignore_errors=True)
+    logger.warning(f"An interrupted reshard left {directory} missing, restored the old shards from {backup}")
+
+
+def shard_of(key, count):
+    """
+    Shard a key belongs to, stable across processes and runs (hash() isn't)
+
+    :rtype int
+    """
+
+    return zlib.crc32(key.encode()) % count
+
+
+def _plain(data):
+    # ProfileRecords -> dicts, what crosses to the pool gets pickled
+    return {key: value.to_dict() if isinstance(value, ProfileRecord) else value for key, value in data.items()}
+
+
+def _load_shard(_path_):
+    """
+    Runs on the pool, a shard that's missing or empty is an empty shard
+    """
+
+    try:
+        return load_file(_path_)[0] or {}
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        # an empty file, same as open_file
+        return {}
+
+
+def _write_shard(_path_, records, codec):
+    """
+    Runs on the pool, the shard is replaced atomically
+    """
+
+    write_file(_path_, records, codec)
+
+
+class ShardSet(object):
+    """
+    The shard files of one dataset
+
+    :param '_path_' str - dataset path, the shards live in <path>.shards/
+    :param 'count' int - shards to make if the dataset isn't sharded yet, an existing
+        manifest's count wins, see reshard()
+    :param 'codec' str - codec shards are written in, see codec.py
+    :param 'processes' int - pool size for work over many shards, 1 to stay in this process
+    :param 'directory' str - somewhere other than <path>.shards/, nothing is split into it (reshard)
+    """
+
+    def __init__(self, _path_, count=None, *, codec="json-indent", processes=None, directory=None, logger=logger):
+        self.path = _path_
+        self.directory = directory or shard_dir(_path_)
+        self.codec = codec
+        self.processes = processes or os.cpu_count() or 1
+        self.logger = logger
+        # keys of every shard in file order, which shards a dirty key rewrites
+        self.members = []
+
+        if directory is None:
+            _recover(_path_, logger)
+        manifest = self._read_manifest()
+        if manifest is None:
+            if not count:
+                raise ValueError(f"{_path_} isn't sharded, a shard count is needed")
+            self.count = count
+            self.members = [{} for _ in range(self.count)]
+            self._create(split=directory is None)
+        else:
+            self.count = manifest["shards"]
+            if count and count != self.count:
+                self.logger.warning(f"{self.directory} has {self.count} shards, not {count}, python shards.py reshard changes it")
+            self.members = [{} for _ in range(self.count)]
+
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.directory, _MANIFEST_), 'r') as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return None
+
+
+    def _write_manifest(self):
+        write_file(os.path.join(self.directory, _MANIFEST_), {"shards": self.count, "hash": _HASH_})
+
+
+    def _create(self, split):
+        os.makedirs(self.directory, exist_ok=True)
+        if split and os.path.exists(self.path) and os.path.getsize(self.path):
+            # splitting an existing file, shards first so a crash leaves it as it was
+            data = _load_shard(self.path)
+            self.write(data)
+            self._write_manifest()
+            os.replace(self.path, self.path + ".unsharded")
+            self.logger.info(f"Split {self.path} into {self.count} shards, the old file is {self.path}.unsharded")
+        else:
+            self._write_manifest()
+
+
+    def shard_path(self, shard):
+        return os.path.join(self.directory, f"shard-{shard:05d}{os.path.splitext(self.path)[1]}")
+
+
+    def _pool(self, jobs):
+        # multiprocessing is ~10ms of import, store.py imports this module sharded or not
+        from concurrent.futures import ProcessPoolExecutor
+        return ProcessPoolExecutor(max_workers=min(self.processes, jobs))
+
+
+    def _parallel(self, jobs, size, minimum):
+        return self.processes > 1 and jobs > 1 and size >= minimum
+
+
+    def _shard_size(self):
+        return sum(os.path.getsize(self.shard_path(shard)) for shard in range(self.count) if os.path.exists(self.shard_path(shard)))
+
+
+    def iter_shards(self):
+        """
+        :rtype generator
+        :return (shard, records) for every shard, in order. Read on the pool a few
+            shards ahead, only those are held at once
+        """
+
+        paths = [self.shard_path(shard) for shard in range(self.count)]
+        if not self._parallel(self.count, self._shard_size(), _PARALLEL_MIN_BYTES_):
+            for shard, _path_ in enumerate(paths):
+                yield shard, _load_shard(_path_)
+            return
+
+        with self._pool(self.count) as pool:
+            window = self.processes * 2
+            futures = [pool.submit(_load_shard, _path_) for _path_ in paths[:window]]
+            for shard in range(self.count):
+                records = futures[shard].result()
+                futures[shard] = None
+                if shard + window < self.count:
+                    futures.append(pool.submit(_load_shard, paths[shard + window]))
+                yield shard, records
+
+
+    def iter_records(self):
+        """
+        :rtype generator
+        :return (key, record) for every record, a shard at a time
+        """
+
+        for _, records in self.iter_shards():
+            yield from records.items()
+
+
+    def load(self):
+        """
+        :rtype dict
+        :return every shard's records in one dict, shard by shard
+        """
+
+        data = {}
+        for shard, records in self.iter_shards():
+            self.members[shard] = dict.fromkeys(records)
+            data.update(records)
+        return data
+
+
+    def write(self, data, keys=None):
+        """
+        Rewrites the shards holding the given keys, keys missing from data are
+        dropped from their shard
+
+        :param 'data' dict - every record
+        :param 'keys' iterable - changed keys, None rewrites every shard
+        """
+
+        if keys is None:
+            self.members = [{} for _ in range(self.count)]
+            for key in data:
+                self.members[shard_of(key, self.count)][key] = None
+            shards = set(range(self.count))
+        else:
+            shards = set()
+            for key in keys:
+                shard = shard_of(key, self.count)
+                self.members[shard][key] = None
+                shards.add(shard)
+        if not shards:
+            return
+
+        jobs = []
+        for shard in sorted(shards):
+            members = self.members[shard]
+            for key in [key for key in members if key not in data]:
+                del members[key]
+            jobs.append((self.shard_path(shard), {key: data[key] for key in members}))
+
+        if not self._parallel(len(jobs), sum(len(records) for _, records in jobs), _PARALLEL_MIN_RECORDS_):
+            for _path_, records in jobs:
+                _write_shard(_path_, records, self.codec)
+            return
+
+        with self._pool(len(jobs)) as pool:
+            futures = [pool.submit(_write_shard, _path_, _plain(records), self.codec) for _path_, records in jobs]
+            for future in futures:
+                future.result()
+
+
+def reshard(_path_, count, *, codec=None, processes=None, logger=logger):
+    """
+    Moves a sharded dataset to a new shard count. The new shards are written next to
+    the old ones (<path>.shards.tmp) and swapped in by two renames, the old shards go
+    to <path>.shards.old in between. A crash before the first rename leaves the old
+    shards where they were, one between the renames is undone by the next ShardSet
+    on the dataset, after the second the new shards are in place
+
+    :param 'codec' str - codec of the new shards, defaults to the old shards'
+    """
+
+    old = ShardSet(_path_, processes=processes, logger=logger)
+    if codec is None:
+        first = old.shard_path(0)
+        codec = file_codec(first) if os.path.exists(first) and os.path.getsize(first) else "json-indent"
+    data = old.load()
+
+    temp_path = shard_dir(_path_) + _TEMP_SUFFIX_
+    shutil.rmtree(temp_path, ignore_errors=True)
+    new = ShardSet(_path_, count, codec=codec, processes=processes, directory=temp_path, logger=logger)
+    new.write(data)
+
+    # a backup left by an earlier reshard that crashed after its second rename, os.replace
+    # won't move a directory onto it
+    backup = shard_dir(_path_) + _BACKUP_SUFFIX_
+    shutil.rmtree(backup, ignore_errors=True)
+    os.replace(old.directory, backup)
+    os.replace(temp_path, old.directory)
+    shutil.rmtree(backup)
+    logger.info(f"Resharded {_path_} from {old.count} to {count} shards, {len(data)} records")
+
+
+def merge(_path_, *, codec="json-indent", processes=None, logger=logger):
+    """
+    Writes a sharded dataset back out as one file and removes the shards
+    """
+
+    data = ShardSet(_path_, processes=processes, logger=logger).load()
+    _write_shard(_path_, data, codec)
+    shutil.rmtree(shard_dir(_path_))
+    logger.info(f"Merged {len(data)} records back into {_path_}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Split, reshard or merge the scraper's data files")
+    parser.add_argument("command", choices=["info", "split", "reshard", "merge"])
+    parser.add_argument("paths", nargs="+", help="dataset paths, profile_data.json/job_data.json")
+    parser.add_argument("--shards", type=int, help="shard count for split/reshard")
+    parser.add_argument("--codec", help="codec to write, see codec.py")
+    parser.add_argument("--processes", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command in ("split", "reshard") and not args.shards:
+        parser.error(f"{args.command} needs --shards")
+    for _path_ in args.paths:
+        if args.command == "info":
+            if is_sharded(_path_):
+                shard_set = ShardSet(_path_)
+                print(f"{_path_}: {shard_set.count} shards, {shard_set._shard_size()/2**20:.1f}MiB")
+            else:
+                print(f"{_path_}: not sharded")
+        elif args.command == "split":
+            ShardSet(_path_, args.shards, codec=args.codec or "json-indent", processes=args.processes)
+        elif args.command == "reshard":
+            reshard(_path_, args.shards, codec=args.codec, processes=args.processes)
+        else:
+            merge(_path_, codec=args.codec or "json-indent", processes=args.processes)
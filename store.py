@@ -0,0 +1,860 @@
+import json
+import logging
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+"""
+State storage for the scraper
+
+Linkedin_scraper keeps profile data, job data and its config in a store. Both stores
+hand out profile_data/job_data as mappings with the usual shape
+
+    profile_data = {public_id: {...profile...}}
+    job_data = {company_urn: {job_urn: {...job...}, "companyData": {...}}}
+
+so the functions in data.py work on either one.
+
+JsonStore - the original json files, optionally journaled (see journal.py)
+SqliteStore - one sqlite file, rows are only read/written when they're touched.
+    The json files stay the import/export format, see import_json()/export_json()
+
+Each store also has a `pending` index of the work left to do (data.PendingIndex for
+the json store, the sqlite indexes for the sqlite store) that the ingest functions
+in data.py keep up to date, and a `job_urns` set of every stored job urn that
+aggregate_job_data checks new listings against
+"""
+
+from data import (
+    PendingIndex,
+    get_job_urns
+    )
+
+from records import (
+    ProfileRecord,
+    ProfileRecords
+    )
+
+from lazy import (
+    LazyTable,
+    profile_meta,
+    company_meta
+    )
+
+from codec import (
+    load_file,
+    write_file,
+    get_codec
+    )
+
+from shards import (
+    ShardSet,
+    is_sharded
+    )
+
+from journal import (
+    append_journal,
+    replay_journal,
+    compact_journal,
+    remove_journal
+    )
+
+logger = logging.getLogger(__name__)
+
+
+def open_file(_path_, logger=logger):
+    """
+    Catches errors upon first start
+
+    :param '__path__' str - path to local file
+    :rtype: bool/Json
+    :return if error False - else JSON, in whichever codec wrote the file (see codec.py)
+    """
+
+    try:
+        return load_file(_path_)[0]
+    except FileNotFoundError:
+        #initiate file
+        with open(_path_, 'w'):
+            logger.info(f"Making {_path_} file")
+            pass
+        return False
+    except ValueError:
+        # json.JSONDecodeError and the msgpack errors
+        return False
+
+
+class JsonStore(object):
+    """
+    The scrapers json files, everything is loaded into memory on startup.
+
+    Without a journal every flush() rewrites the whole files. With journal=True
+    only records marked with mark() are appended to the journals, which get
+    compacted once they have as many lines as the snapshot has records
+
+    commit() is the per-item write of the scraping threads. It always appends the
+    marked records to the journal, without journal=True the next flush() (the
+    end of the phase) rewrites the files and drops the journal again. A journal
+    left over from a crash is replayed on startup either way, and folded into
+    the files straight away without journal=True
+
+    With compact_records=True profiles are kept as records.ProfileRecord instead of
+    dicts, same json on disk, a fraction of the memory
+
+    With lazy=True the files are memory-mapped and records are only parsed when
+    they're used (see lazy.py), job data isn't even opened until something asks
+    for job_data/job_urns/pending jobs or companies
+
+    `codec` picks the format the files are written in (see codec.py), one name for
+    all of them or a dict by "profile_data"/"job_data"/"config". Reading works out
+    the format from the file, so switching codecs converts on the next write
+
+    With shards=N the data files are split into N shard files by key (see shards.py)
+    and flush() only rewrites the shards with marked records, like the journal mode
+    it relies on every change going through mark(). Data that's already sharded is
+    loaded as such without it
+    """
+
+    # journal gets folded into the snapshot once it has this many lines per stored record
+    _JOURNAL_COMPACT_RATIO_ = 1
+    _JOURNAL_COMPACT_MIN_ = 1000
+
+    def __init__(self, profile_path, job_path, config_path, *, journal=False, compact_records=False, lazy=False,
+            codec="json-indent", shards=None, logger=logger):
+        self.paths = {"profile_data": profile_path, "job_data": job_path}
+        self.config_path = config_path
+        self.journal = journal
+        self.compact_records = compact_records
+        self.lazy = lazy
+        self.logger = logger
+
+        if isinstance(codec, str):
+            codec = {"profile_data": codec, "job_data": codec, "config": codec}
+        self.codecs = {name: codec.get(name, "json-indent") for name in ("profile_data", "job_data", "config")}
+        for name in self.codecs.values():
+            get_codec(name)
+        if lazy and (self.codecs["profile_data"] != "json-indent" or self.codecs["job_data"] != "json-indent"):
+            raise ValueError("lazy loading needs the json-indent codec for profile and job data")
+
+        self.shards = {}
+        for name, _path_ in self.paths.items():
+            if shards or is_sharded(_path_):
+                if lazy:
+                    raise ValueError("lazy loading doesn't work with sharded data files")
+                self.shards[name] = ShardSet(_path_, shards, codec=self.codecs[name], logger=self.logger)
+
+        self._journal_lines = {"profile_data": 0, "job_data": 0}
+        self._dirty = {"profile_data": set(), "job_data": set()}
+        # keys commit() journaled since the files were last written, without journal=True
+        self._journaled = {"profile_data": set(), "job_data": set()}
+
+        if lazy:
+            self.logger.info("Indexing profile datafile")
+            self._profile_data = self._load_lazy("profile_data")
+            self._recover("profile_data")
+            self.pending = PendingIndex()
+            self.pending.add_profiles(public_id for public_id, checked in self._profile_data.meta_items() if not checked)
+            # opened by the job_data/job_urns properties
+            self._job_data = None
+            self._job_urns = None
+            return
+
+        self.logger.info("Accessing profile datafile")
+        self.profile_data = self._load("profile_data")
+        self._recover("profile_data")
+
+        self.logger.info("Accessing job datafile")
+        self._job_data = self._load("job_data")
+        self._recover("job_data")
+
+        self.pending = PendingIndex.from_data(self.profile_data, self._job_data)
+        self._job_urns = set(get_job_urns(self._job_data)) if self._job_data else set()
+
+
+    @property
+    def profile_data(self):
+        return self._profile_data
+
+    @profile_data.setter
+    def profile_data(self, value):
+        if self.lazy:
+            if value is not self._profile_data and value:
+                self._profile_data.update(value)
+            return
+        # add_search_to_main hands back a plain dict when there was no data yet
+        if self.compact_records and value and not isinstance(value, ProfileRecords):
+            value = ProfileRecords(value)
+        self._profile_data = value
+
+
+    @property
+    def job_data(self):
+        if self._job_data is None and self.lazy:
+            self._open_jobs()
+        return self._job_data
+
+    @job_data.setter
+    def job_data(self, value):
+        if self.lazy:
+            if value is not self.job_data and value:
+                self._job_data.update(value)
+            return
+        self._job_data = value
+
+
+    @property
+    def job_urns(self):
+        if self._job_urns is None and self.lazy:
+            self._open_jobs()
+        return self._job_urns
+
+
+    def _open_jobs(self):
+        self.logger.info("Indexing job datafile")
+        self._job_data = self._load_lazy("job_data")
+        self._recover("job_data")
+        self._job_urns = set()
+        for company, (jobs, unscraped, has_company_data) in self._job_data.meta_items():
+            self._job_urns.update(jobs)
+            self.pending.add_jobs(company, unscraped)
+            if not has_company_data:
+                self.pending.add_companies([company])
+
+
+    def _load_lazy(self, name):
+        _path_ = self.paths[name]
+        if name == "profile_data":
+            wrap = ProfileRecord if self.compact_records else None
+            table = LazyTable(_path_, profile_meta, wrap=wrap, logger=self.logger)
+        else:
+            table = LazyTable(_path_, company_meta, logger=self.logger)
+
+        self._journal_lines[name] = replay_journal(_path_, table)
+        if self._journal_lines[name]:
+            self.logger.info(f"Replayed {self._journal_lines[name]} journal entries onto {_path_}")
+        return table
+
+
+    def _load(self, name):
+        _path_ = self.paths[name]
+        if name in self.shards:
+            data = self.shards[name].load()
+        else:
+            data = open_file(_path_, self.logger)
+
+        # without journal=True there's only a journal if commit() wrote one and the
+        # phase didn't finish. The snapshot may be missing/empty while it already has records
+        replayed = data or {}
+        self._journal_lines[name] = replay_journal(_path_, replayed)
+        if self._journal_lines[name]:
+            self.logger.info(f"Replayed {self._journal_lines[name]} journal entries onto {_path_}")
+        return replayed or data
+
+
+    def _recover(self, name):
+        # an interrupted phase's journal, written into the files before anything else happens
+        if not self.journal and self._journal_lines[name]:
+            self._compact(name)
+
+
+    def load_config(self):
+        return open_file(self.config_path, self.logger)
+
+
+    def save_config(self, config):
+        write_file(self.config_path, config, self.codecs["config"])
+
+
+    def mark(self, name, keys):
+        """
+        Records which top-level keys (public_id/company urn) changed,
+        journal mode only writes these on the next flush()
+
+        :param 'name' str - "profile_data"/"job_data"
+        :param 'keys' iterable
+        """
+
+        self._dirty[name].update(keys)
+
+
+    def flush(self, config=None):
+        """
+        Persists profile/job data and the config
+        """
+
+        for name in ("profile_data", "job_data"):
+            # not through the properties, lazy job data that was never opened has nothing to write
+            data = getattr(self, "_" + name)
+            if not data:
+                continue
+            if self.journal:
+                self._append(name, data)
+            else:
+                self._write(name, data)
+            self._dirty[name].clear()
+
+        if config:
+            self.save_config(config)
+
+
+    def commit(self, config=None):
+        """
+        Persists what changed for one scraped item: the marked records are appended to
+        the journals and the config is rewritten, both a few ms whatever the size
+        of the data. Without journal=True the files themselves are only rewritten by
+        the next flush(), or here once the journal outgrows them
+        """
+
+        # config first, a crash in between costs the login a visit instead of
+        # leaving a stored record uncounted
+        if config:
+            self.save_config(config)
+        if self.journal:
+            self.flush()
+            return
+
+        for name in ("profile_data", "job_data"):
+            data = getattr(self, "_" + name)
+            if not data or not self._dirty[name]:
+                continue
+            self._journal_lines[name] += append_journal(self.paths[name], data, self._dirty[name])
+            self._journaled[name].update(self._dirty[name])
+            self._dirty[name].clear()
+            if self._journal_lines[name] >= self._compact_at(data):
+                self._write(name, data)
+
+
+    def _compact_at(self, data):
+        return max(self._JOURNAL_COMPACT_MIN_, len(data) * self._JOURNAL_COMPACT_RATIO_)
+
+
+    def _append(self, name, data):
+        self._journal_lines[name] += append_journal(self.paths[name], data, self._dirty[name])
+        if self._journal_lines[name] >= self._compact_at(data):
+            self._compact(name)
+
+
+    def _write(self, name, data):
+        # the files proper, then the journal commit() kept since the last write is obsolete
+        if self.lazy:
+            data.save()
+        elif name in self.shards:
+            self.shards[name].write(data, self._dirty[name] | self._journaled[name])
+        else:
+            write_file(self.paths[name], data, self.codecs[name])
+        if self._journal_lines[name]:
+            remove_journal(self.paths[name])
+            self._journal_lines[name] = 0
+        self._journaled[name].clear()
+
+
+    def _compact(self, name):
+        self.logger.info(f"Compacting {self._journal_lines[name]} journal entries into {self.paths[name]}")
+        data = getattr(self, "_" + name)
+        if self.lazy:
+            data.save()
+            remove_journal(self.paths[name])
+        elif name in self.shards:
+            # every shard, on the pool
+            self.shards[name].write(data)
+            remove_journal(self.paths[name])
+        else:
+            compact_journal(self.paths[name], data, self.codecs[name])
+        self._journal_lines[name] = 0
+
+
+    def compact(self):
+        """
+        On-demand compaction, folds both journals into their snapshots
+        """
+
+        self.flush()
+        for name in ("profile_data", "job_data"):
+            if getattr(self, "_" + name):
+                self._compact(name)
+
+
+    def pending_profiles(self):
+        return self.pending.profile_list()
+
+
+    def pending_jobs(self):
+        self.job_data # lazy job data adds its pending jobs when it's opened
+        return self.pending.job_list()
+
+
+    def pending_companies(self):
+        self.job_data
+        return self.pending.company_list()
+
+
+    def check_pending(self):
+        """
+        Compares the pending index against a full scan of the data and rebuilds
+        it if they disagree
+
+        :rtype bool
+        :return True if the index was consistent
+        """
+
+        mismatches = self.pending.verify(self.profile_data, self.job_data)
+        for kind, (missing, extra) in mismatches.items():
+            self.logger.warning(f"Pending {kind} index out of sync, {len(missing)} missing, {len(extra)} not pending")
+        if mismatches:
+            self.pending = PendingIndex.from_data(self.profile_data, self.job_data)
+        return not mismatches
+
+
+    def close(self):
+        if self.lazy:
+            for data in (self._profile_data, self._job_data):
+                if data is not None:
+                    data.close()
+
+
+class SqliteTable(MutableMapping):
+    """
+    Dict-like view of a sqlite table. Records that get read are kept in a cache
+    together with how they looked when they were read, the data.py functions
+    mutate them in place and flush() writes back only the rows that changed.
+    The cache is dropped after every flush
+
+    Subclasses implement _select/_write/_delete/_keys
+    """
+
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+        self._cache = {}
+
+    def __getitem__(self, key):
+        with self.lock:
+            if key in self._cache:
+                return self._cache[key][0]
+            record, snapshot = self._select(key)
+            if record is None:
+                raise KeyError(key)
+            self._cache[key] = (record, snapshot)
+            return record
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            if key in self._cache:
+                self._cache[key] = (value, self._cache[key][1])
+            else:
+                self._cache[key] = (value, self._select(key)[1])
+
+    def __delitem__(self, key):
+        with self.lock:
+            if key not in self:
+                raise KeyError(key)
+            self._cache.pop(key, None)
+            self._delete(key)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self._cache or self._select(key, exists=True)
+
+    def __iter__(self):
+        with self.lock:
+            self.flush()
+            keys = self._keys()
+        return iter(keys)
+
+    def __len__(self):
+        with self.lock:
+            self.flush()
+            return self.conn.execute(f"SELECT COUNT(*) FROM {self._TABLE_}").fetchone()[0]
+
+    def flush(self):
+        with self.lock:
+            for key, (record, snapshot) in self._cache.items():
+                self._write(key, record, snapshot)
+            self._cache = {}
+
+
+class ProfileTable(SqliteTable):
+    """
+    profiles(public_id, checked, data) - data is the profile record as json
+    """
+
+    _TABLE_ = "profiles"
+
+    def _select(self, key, exists=False):
+        row = self.conn.execute("SELECT data FROM profiles WHERE public_id = ?", (key,)).fetchone()
+        if exists:
+            return row is not None
+        if row is None:
+            return None, None
+        return json.loads(row[0]), row[0]
+
+    def _write(self, key, record, snapshot):
+        data = json.dumps(record)
+        if data == snapshot:
+            return
+        self.conn.execute(
+            "INSERT INTO profiles (public_id, checked, data) VALUES (?, ?, ?) "
+            "ON CONFLICT (public_id) DO UPDATE SET checked = excluded.checked, data = excluded.data",
+            (key, 1 if record.get("checked") else 0, data)
+            )
+
+    def _delete(self, key):
+        self.conn.execute("DELETE FROM profiles WHERE public_id = ?", (key,))
+
+    def _keys(self):
+        return [row[0] for row in self.conn.execute("SELECT public_id FROM profiles ORDER BY rowid")]
+
+
+class CompanyTable(SqliteTable):
+    """
+    A job_data record is split over two tables
+
+    companies(urn, has_company_data, company_data) - the "companyData" key
+    jobs(company, job, scraped, data) - every other key, one row per job listing
+    """
+
+    _TABLE_ = "companies"
+
+    def _select(self, key, exists=False):
+        row = self.conn.execute("SELECT company_data FROM companies WHERE urn = ?", (key,)).fetchone()
+        if exists:
+            return row is not None
+        if row is None:
+            return None, None
+
+        record = {}
+        snapshot = {}
+        for job, data in self.conn.execute("SELECT job, data FROM jobs WHERE company = ? ORDER BY rowid", (key,)):
+            record[job] = json.loads(data)
+            snapshot[job] = data
+        if row[0] is not None:
+            record["companyData"] = json.loads(row[0])
+            snapshot["companyData"] = row[0]
+        return record, snapshot
+
+    def _write(self, key, record, snapshot):
+        snapshot = snapshot or {}
+        new = snapshot == {} and not self._select(key, exists=True)
+
+        company_data = json.dumps(record["companyData"]) if "companyData" in record else None
+        if new or company_data != snapshot.get("companyData"):
+            self.conn.execute(
+                "INSERT INTO companies (urn, has_company_data, company_data) VALUES (?, ?, ?) "
+                "ON CONFLICT (urn) DO UPDATE SET has_company_data = excluded.has_company_data, company_data = excluded.company_data",
+                (key, 0 if company_data is None else 1, company_data)
+                )
+
+        for job in record:
+            if job == "companyData":
+                continue
+            data = json.dumps(record[job])
+            if data == snapshot.get(job):
+                continue
+            self.conn.execute(
+                "INSERT INTO jobs (company, job, scraped, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (company, job) DO UPDATE SET scraped = excluded.scraped, data = excluded.data",
+                (key, job, 1 if record[job].get("scraped") else 0, data)
+                )
+        for job in snapshot:
+            if job != "companyData" and job not in record:
+                self.conn.execute("DELETE FROM jobs WHERE company = ? AND job = ?", (key, job))
+
+    def _delete(self, key):
+        self.conn.execute("DELETE FROM jobs WHERE company = ?", (key,))
+        self.conn.execute("DELETE FROM companies WHERE urn = ?", (key,))
+
+    def _keys(self):
+        return [row[0] for row in self.conn.execute("SELECT urn FROM companies ORDER BY rowid")]
+
+
+class SqlitePending(object):
+    """
+    PendingIndex for the sqlite store, the checked/scraped/has_company_data columns
+    are kept up to date when rows are written so adding/removing is a no-op, only
+    the job -> company lookup has to go to the database
+    """
+
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+
+    def add_profiles(self, public_ids):
+        pass
+
+    def remove_profiles(self, public_ids):
+        pass
+
+    def add_jobs(self, company, jobs):
+        pass
+
+    def remove_jobs(self, jobs):
+        pass
+
+    def add_companies(self, companies):
+        pass
+
+    def remove_companies(self, companies):
+        pass
+
+    def job_company(self, job):
+        with self.lock:
+            row = self.conn.execute("SELECT company FROM jobs WHERE job = ? ORDER BY scraped LIMIT 1", (job,)).fetchone()
+        return row[0] if row else None
+
+
+class SqliteJobUrns(object):
+    """
+    Job urn index for the sqlite store, membership goes through the jobs_job index.
+    Urns added since the last flush are remembered until they reach the table
+    """
+
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+        self._added = set()
+
+    def __contains__(self, job):
+        if job in self._added:
+            return True
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM jobs WHERE job = ? LIMIT 1", (job,)).fetchone() is not None
+
+    def update(self, jobs):
+        self._added.update(jobs)
+
+    def clear(self):
+        # the jobs table has them now, and urns whose rows get deleted stop matching
+        self._added = set()
+
+
+class SqliteStore(object):
+    """
+    Keeps the scraper's state in a single sqlite database, see the table classes
+    above for the layout. Login quotas live in the logins table, the rest of the
+    config (update_time, keyword offsets) in meta
+
+    Pending work queries go through the checked/scraped/has_company_data indexes
+    instead of walking every record
+    """
+
+    _SCHEMA_ = """
+        CREATE TABLE IF NOT EXISTS profiles (
+            public_id TEXT PRIMARY KEY,
+            checked INTEGER NOT NULL DEFAULT 0,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS profiles_checked ON profiles (checked);
+
+        CREATE TABLE IF NOT EXISTS companies (
+            urn TEXT PRIMARY KEY,
+            has_company_data INTEGER NOT NULL DEFAULT 0,
+            company_data TEXT
+        );
+        CREATE INDEX IF NOT EXISTS companies_has_company_data ON companies (has_company_data);
+
+        CREATE TABLE IF NOT EXISTS jobs (
+            company TEXT NOT NULL,
+            job TEXT NOT NULL,
+            scraped INTEGER NOT NULL DEFAULT 0,
+            data TEXT NOT NULL,
+            PRIMARY KEY (company, job)
+        );
+        CREATE INDEX IF NOT EXISTS jobs_scraped ON jobs (scraped);
+        CREATE INDEX IF NOT EXISTS jobs_job ON jobs (job);
+
+        CREATE TABLE IF NOT EXISTS logins (
+            email TEXT PRIMARY KEY,
+            profile_visits INTEGER NOT NULL DEFAULT 0,
+            searches INTEGER NOT NULL DEFAULT 0,
+            data TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, _path_, *, logger=logger):
+        self.path = _path_
+        self.logger = logger
+        self.lock = threading.RLock()
+
+        self.logger.info(f"Opening {_path_}")
+        self.conn = sqlite3.connect(_path_, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(self._SCHEMA_)
+
+        self._profile_data = ProfileTable(self.conn, self.lock)
+        self._job_data = CompanyTable(self.conn, self.lock)
+        self.pending = SqlitePending(self.conn, self.lock)
+        self.job_urns = SqliteJobUrns(self.conn, self.lock)
+
+
+    # profile_data/job_data can be reassigned like the json store's dicts,
+    # a plain dict that gets assigned is upserted into the table
+    @property
+    def profile_data(self):
+        return self._profile_data
+
+    @profile_data.setter
+    def profile_data(self, value):
+        if value is not self._profile_data and value:
+            self._profile_data.update(value)
+
+    @property
+    def job_data(self):
+        return self._job_data
+
+    @job_data.setter
+    def job_data(self, value):
+        if value is not self._job_data and value:
+            self._job_data.update(value)
+
+
+    def load_config(self):
+        """
+        :rtype bool/dict
+        :return config dict in the json file format, False if there are no logins
+        """
+
+        with self.lock:
+            logins = {}
+            for email, profile_visits, searches, data in self.conn.execute("SELECT email, profile_visits, searches, data FROM logins ORDER BY rowid"):
+                logins[email] = json.loads(data)
+                logins[email]["profile_visits"] = profile_visits
+                logins[email]["searches"] = searches
+            if not logins:
+                return False
+
+            config = {"logins": logins}
+            for key, value in self.conn.execute("SELECT key, value FROM meta ORDER BY rowid"):
+                config[key] = json.loads(value)
+            return config
+
+
+    def save_config(self, config):
+        with self.lock, self.conn:
+            for email, login in config["logins"].items():
+                self.conn.execute(
+                    "INSERT INTO logins (email, profile_visits, searches, data) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (email) DO UPDATE SET profile_visits = excluded.profile_visits, "
+                    "searches = excluded.searches, data = excluded.data",
+                    (email, login.get("profile_visits", 0), login.get("searches", 0), json.dumps(login))
+                    )
+            for key, value in config.items():
+                if key == "logins":
+                    continue
+                self.conn.execute(
+                    "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                    (key, json.dumps(value))
+                    )
+
+
+    def mark(self, name, keys):
+        # changed rows are found by the tables on flush
+        pass
+
+
+    def flush(self, config=None):
+        with self.lock:
+            with self.conn:
+                self._profile_data.flush()
+                self._job_data.flush()
+            # once the rows are committed
+            self.job_urns.clear()
+        if config:
+            self.save_config(config)
+
+
+    def commit(self, config=None):
+        # only the changed rows are written anyway
+        self.flush(config)
+
+
+    def compact(self):
+        self.flush()
+        with self.lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+    def pending_profiles(self):
+        with self.lock:
+            self.flush()
+            return [row[0] for row in self.conn.execute("SELECT public_id FROM profiles WHERE checked = 0 ORDER BY rowid")]
+
+
+    def pending_jobs(self):
+        with self.lock:
+            self.flush()
+            return [row[0] for row in self.conn.execute("SELECT job FROM jobs WHERE scraped = 0 ORDER BY rowid")]
+
+
+    def pending_companies(self):
+        with self.lock:
+            self.flush()
+            return [row[0] for row in self.conn.execute("SELECT urn FROM companies WHERE has_company_data = 0 ORDER BY rowid")]
+
+
+    def check_pending(self):
+        # the pending queries read the indexed columns directly, nothing to drift
+        return True
+
+
+    def import_json(self, profile_path, job_path, config_path=None):
+        """
+        Loads the scraper's json files into the database, existing rows with the
+        same keys are overwritten
+        """
+
+        for _path_, table in ((profile_path, self._profile_data), (job_path, self._job_data)):
+            data = open_file(_path_, self.logger)
+            if data:
+                self.logger.info(f"Importing {len(data)} records from {_path_}")
+                table.update(data)
+                self.flush()
+
+        if config_path:
+            config = open_file(config_path, self.logger)
+            if config:
+                self.save_config(config)
+
+
+    def export_json(self, profile_path, job_path, config_path=None):
+        """
+        Writes the database back out in the scraper's json file format
+        """
+
+        self.flush()
+        for _path_, table in ((profile_path, self._profile_data), (job_path, self._job_data)):
+            write_file(_path_, {key: table[key] for key in table})
+            table.flush()
+
+        if config_path:
+            config = self.load_config()
+            if config:
+                write_file(config_path, config)
+
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Move scraper state between the json files and a sqlite database")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("database")
+    parser.add_argument("--profile-data", default="profile_data.json")
+    parser.add_argument("--job-data", default="job_data.json")
+    parser.add_argument("--config", default="config.json")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    store = SqliteStore(args.database)
+    if args.command == "import":
+        store.import_json(args.profile_data, args.job_data, args.config)
+    else:
+        store.export_json(args.profile_data, args.job_data, args.config)
+    store.close()
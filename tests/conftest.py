@@ -0,0 +1,8 @@
+import os
+import sys
+"""
+The scraper's modules are top-level files in the repository root, like
+benchmarks/ the tests import them from there
+"""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
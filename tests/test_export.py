@@ -0,0 +1,58 @@
+import csv
+import glob
+import json
+import os
+
+import pytest
+"""
+Exporting json datasets whose latest records are only in the journals
+"""
+
+from export import export, open_json_store
+from store import JsonStore
+
+
+def _dataset(directory):
+    paths = [str(directory / name) for name in ("profile_data.json", "job_data.json", "config.json")]
+    with open(paths[0], 'w') as f:
+        f.write(json.dumps({"p0": {"public_id": "p0", "checked": False}}, indent=4))
+    with open(paths[1], 'w') as f:
+        f.write(json.dumps({"urn:li:company:0": {"j0": {"scraped": False}}}, indent=4))
+    with open(paths[2], 'w') as f:
+        f.write(json.dumps({"logins": {}}))
+    return paths
+
+
+def _rows(directory, table):
+    rows = []
+    for _path_ in sorted(glob.glob(os.path.join(directory, table, "*.csv"))):
+        with open(_path_, newline='') as f:
+            rows.extend(csv.DictReader(f))
+    return rows
+
+
+@pytest.mark.parametrize("journal", [True, False], ids=["journaled", "interrupted phase"])
+@pytest.mark.parametrize("lazy", [True, False], ids=["lazy", "loaded"])
+def test_export_includes_journaled_records(tmp_path, journal, lazy):
+    paths = _dataset(tmp_path)
+    store = JsonStore(*paths, journal=journal)
+    for number in range(1, 4):
+        store.profile_data[f"p{number}"] = {"public_id": f"p{number}", "checked": True, "firstName": f"name{number}"}
+    store.job_data["urn:li:company:1"] = {"j1": {"scraped": False}}
+    store.mark("profile_data", ["p1", "p2", "p3"])
+    store.mark("job_data", ["urn:li:company:1"])
+    # per-item commits, without journal=True the phase-end rewrite never happened
+    store.commit()
+    assert os.path.exists(paths[0] + ".journal")
+
+    exports = str(tmp_path / "exports")
+    store = open_json_store(*paths) if lazy else JsonStore(*paths, journal=True)
+    written = export(store.profile_data, store.job_data, exports, fmt="csv")
+    store.close()
+
+    assert written == {"profiles": 4, "jobs": 2, "companies": 2}
+    assert sorted(row["public_id"] for row in _rows(exports, "profiles")) == ["p0", "p1", "p2", "p3"]
+    # read only, the journal is still there and the snapshot untouched
+    assert os.path.exists(paths[0] + ".journal")
+    with open(paths[0]) as f:
+        assert list(json.loads(f.read())) == ["p0"]
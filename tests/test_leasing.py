@@ -0,0 +1,117 @@
+import multiprocessing
+import os
+import threading
+import time
+"""
+LeaseManager on one sqlite database from several stores, the way separate
+processes share it
+"""
+
+from leasing import LeaseManager
+from store import SqliteStore
+
+
+def _dataset(_path_, profiles):
+    store = SqliteStore(_path_)
+    for number in range(profiles):
+        store.profile_data[f"p{number}"] = {"public_id": f"p{number}", "checked": False}
+    store.flush()
+    store.close()
+    return [f"p{number}" for number in range(profiles)]
+
+
+def _claim_and_die(_path_, count, connection):
+    # claims and exits without releasing or renewing, like a crashed process
+    leases = LeaseManager(SqliteStore(_path_), owner="crashed", ttl=0.5)
+    connection.send(leases.claim("profiles", count))
+    os._exit(0)
+
+
+def test_two_managers_never_claim_the_same_item(tmp_path):
+    _path_ = str(tmp_path / "scraper.db")
+    profiles = _dataset(_path_, 300)
+    stores = [SqliteStore(_path_) for _ in range(2)]
+    managers = [LeaseManager(store, owner=f"worker-{number}", batch_size=7) for number, store in enumerate(stores)]
+    claimed = [[] for _ in managers]
+    errors = []
+    start = threading.Barrier(len(managers))
+
+    def claim_all(leases, items):
+        start.wait()
+        try:
+            while True:
+                batch = leases.claim("profiles")
+                if not batch:
+                    return
+                items.extend(batch)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=claim_all, args=(leases, items)) for leases, items in zip(managers, claimed)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert not set(claimed[0]) & set(claimed[1])
+    assert sorted(claimed[0] + claimed[1]) == sorted(profiles)
+    for leases, store in zip(managers, stores):
+        leases.close()
+        store.close()
+
+
+def test_committed_items_are_not_claimed_again(tmp_path):
+    _path_ = str(tmp_path / "scraper.db")
+    _dataset(_path_, 10)
+    store = SqliteStore(_path_)
+    leases = LeaseManager(store, owner="worker", batch_size=4)
+
+    items = leases.claim("profiles")
+    for item in items:
+        store.profile_data[item] = {"public_id": item, "checked": True}
+    assert leases.commit("profiles", items) == []
+    assert leases.held("profiles") == []
+
+    other = LeaseManager(SqliteStore(_path_), owner="other", batch_size=100)
+    assert not set(other.claim("profiles")) & set(items)
+    other.close()
+    leases.close()
+    store.close()
+
+
+def test_released_items_can_be_claimed_right_away(tmp_path):
+    _path_ = str(tmp_path / "scraper.db")
+    _dataset(_path_, 5)
+    first = LeaseManager(SqliteStore(_path_), owner="first", batch_size=5)
+    second = LeaseManager(SqliteStore(_path_), owner="second", batch_size=5)
+
+    items = first.claim("profiles")
+    assert second.claim("profiles") == []
+    first.release("profiles", items)
+    assert sorted(second.claim("profiles")) == sorted(items)
+    first.close()
+    second.close()
+
+
+def test_expired_leases_of_a_dead_process_are_reclaimed(tmp_path):
+    _path_ = str(tmp_path / "scraper.db")
+    profiles = _dataset(_path_, 20)
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_claim_and_die, args=(_path_, 5, sender))
+    process.start()
+    assert receiver.poll(30)
+    stranded = receiver.recv()
+    process.join()
+    assert len(stranded) == 5
+
+    store = SqliteStore(_path_)
+    leases = LeaseManager(store, owner="survivor", ttl=30, batch_size=100)
+    # still leased by the dead process
+    assert sorted(leases.claim("profiles")) == sorted(set(profiles) - set(stranded))
+
+    time.sleep(0.6)
+    assert sorted(leases.claim("profiles")) == sorted(stranded)
+    assert sorted(leases.held("profiles")) == sorted(profiles)
+    leases.close()
+    store.close()
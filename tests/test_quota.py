@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+"""
+QuotaLedger under racing reservations, from one ledger shared by threads and
+from a ledger per thread on the same file, the way processes share it
+"""
+
+from quota import QuotaLedger
+
+
+@pytest.mark.parametrize("shared", [True, False], ids=["one ledger", "ledger per thread"])
+def test_racing_reservations_grant_exactly_the_limit(tmp_path, shared):
+    _path_ = str(tmp_path / "quota.db")
+    limit, workers = 25, 8
+    ledgers = [QuotaLedger(_path_, limits={"profile_visits": limit})]
+    ledgers += [ledgers[0] if shared else QuotaLedger(_path_, limits={"profile_visits": limit}) for _ in range(workers - 1)]
+    granted, errors = [], []
+    lock = threading.Lock()
+    start = threading.Barrier(workers)
+
+    def reserve_all(ledger):
+        start.wait()
+        try:
+            while True:
+                reservation = ledger.reserve("a@x", "profile_visits")
+                if reservation is None:
+                    return
+                with lock:
+                    granted.append(reservation)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=reserve_all, args=(ledger,)) for ledger in ledgers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(granted) == limit
+    assert len(set(granted)) == limit
+    assert ledgers[0].remaining("a@x", "profile_visits") == 0
+    for ledger in set(ledgers):
+        ledger.close()
+
+
+def test_refund_gives_the_quota_back(tmp_path):
+    ledger = QuotaLedger(str(tmp_path / "quota.db"), limits={"profile_visits": 3})
+    reservations = [ledger.reserve("a@x", "profile_visits") for _ in range(3)]
+    assert None not in reservations
+    assert ledger.reserve("a@x", "profile_visits") is None
+
+    ledger.commit(reservations[0])
+    ledger.refund(reservations[1])
+    assert ledger.remaining("a@x", "profile_visits") == 1
+    assert ledger.reserve("a@x", "profile_visits") is not None
+    assert ledger.reserve("a@x", "profile_visits") is None
+
+    # a committed reservation can't be refunded
+    ledger.refund(reservations[0])
+    assert ledger.usage() == {"a@x": {"profile_visits": 3}}
+    ledger.close()
+
+
+def test_quotas_are_per_login(tmp_path):
+    ledger = QuotaLedger(str(tmp_path / "quota.db"), limits={"profile_visits": 1})
+    assert ledger.spend("a@x", "profile_visits")
+    assert not ledger.spend("a@x", "profile_visits")
+    assert ledger.spend("b@x", "profile_visits")
+    ledger.close()
+
+
+def test_commit_after_the_reservation_ran_out_is_counted(tmp_path):
+    ledger = QuotaLedger(str(tmp_path / "quota.db"), limits={"profile_visits": 1}, reservation_ttl=0.1)
+    late = ledger.reserve("a@x", "profile_visits")
+    time.sleep(0.2)
+
+    # the expired reservation stopped counting, its quota went to another request
+    other = ledger.reserve("a@x", "profile_visits")
+    assert other is not None
+    assert ledger.commit(late) is False
+    assert ledger.commit(other) is True
+    assert ledger.usage() == {"a@x": {"profile_visits": 2}}
+    ledger.close()
+
+
+def test_usage_leaves_the_window(tmp_path):
+    ledger = QuotaLedger(str(tmp_path / "quota.db"), limits={"searches": 1}, window=0.2)
+    assert ledger.spend("a@x", "searches")
+    assert ledger.remaining("a@x", "searches") == 0
+    time.sleep(0.3)
+    assert ledger.remaining("a@x", "searches") == 1
+    ledger.close()
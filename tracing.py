@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+"""
+Timeline of a scraping run in the Chrome trace-event format
+
+    scraper = Linkedin_scraper(trace="trace.json")
+
+records a span for every api call, parse, commit (merge + write_files) and
+pacing sleep, tagged with the login, thread and item, and rewrites trace.json at
+the end of every phase. Open it in https://ui.perfetto.dev or chrome://tracing,
+every login's thread is a row so you can see how much of the run the logins spend
+asleep in default_evade, waiting on the commit lock or on linkedin.
+
+With engine="asyncio" the logins share one event loop thread, each login gets a
+row of its own instead and the commits show up on the pool threads that ran them
+"""
+
+from codec import atomic_file
+
+
+class Tracer(object):
+    """
+    :param '_path_' str - trace file, None to not trace
+    """
+
+    def __init__(self, _path_=None, logger=None):
+        self.path = _path_
+        self.enabled = _path_ is not None
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.events = []
+        self.tracks = {}        # track name -> tid
+        self.pid = os.getpid()
+        self._start = perf_counter()
+
+
+    def _tid(self, track):
+        # called with the lock held
+        if track not in self.tracks:
+            self.tracks[track] = len(self.tracks) + 1
+            self.events.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": self.tracks[track], "args": {"name": track}})
+        return self.tracks[track]
+
+
+    def span(self, name, cat, track=None, **args):
+        """
+        :param 'name' str - what's shown on the span, e.g. the api method
+        :param 'cat' str - "api"/"parse"/"persist"/"sleep"/"search"
+        :param 'track' str - row to put the span on, defaults to the current thread's name.
+            Thread idents get reused, names don't, the scraping threads are named after their login
+        :param 'args' - tags, login/item
+        :rtype context manager
+        """
+
+        if not self.enabled:
+            return nullcontext()
+        return self._span(name, cat, track, args)
+
+
+    @contextmanager
+    def _span(self, name, cat, track, args):
+        args["thread"] = threading.current_thread().name
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            end = perf_counter()
+            with self.lock:
+                self.events.append({
+                    "name": name,
+                    "cat": cat,
+                    "ph": "X",
+                    "ts": (start - self._start) * 1e6,
+                    "dur": (end - start) * 1e6,
+                    "pid": self.pid,
+                    "tid": self._tid(track if track is not None else args["thread"]),
+                    "args": args,
+                    })
+
+
+    def wrap(self, function, name, cat, track=None, **args):
+        """
+        :rtype callable
+        :return function, every call traced as a span
+        """
+
+        if not self.enabled:
+            return function
+
+        def traced(*a, **kwargs):
+            with self.span(name, cat, track, **dict(args)):
+                return function(*a, **kwargs)
+        return traced
+
+
+    def write(self):
+        """
+        Writes every span so far to the trace file
+        """
+
+        if not self.enabled:
+            return
+        with self.lock:
+            trace = {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+        with atomic_file(self.path) as f:
+            f.write(json.dumps(trace, default=str).encode())
+        if self.logger:
+            self.logger.info(f"Wrote {len(trace['traceEvents'])} trace events to {self.path}")